@@ -0,0 +1 @@
+"""Throughput benchmarks for target-clickhouse, see `benchmarks.run`."""
@@ -0,0 +1,347 @@
+"""An in-process stand-in for the ClickHouse HTTP interface.
+
+`FakeClickhouse` answers the queries target-clickhouse sends while loading data:
+the server version, `EXISTS TABLE`, `DESCRIBE TABLE` and DDL, keeping a catalog of
+the columns of created tables. INSERT bodies are counted and checksummed, then
+discarded. Other queries get an empty result and are recorded in `unhandled`.
+Request bodies sent with a `Content-Encoding` are decompressed first.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import TracebackType
+from urllib.parse import parse_qs, urlparse
+
+from target_clickhouse.rowbinary import split_type
+
+SERVER_VERSION = "24.3.1.1"
+
+CREATE_TABLE_RE = re.compile(
+    r"^CREATE TABLE (?:IF NOT EXISTS )?(?P<table>[^\s(]+)",
+    re.IGNORECASE,
+)
+ALTER_COLUMN_RE = re.compile(
+    r"(?P<action>ADD|MODIFY) COLUMN (?:IF (?:NOT )?EXISTS )?(?P<column>.+)",
+    re.IGNORECASE,
+)
+# Column definition clauses following the type.
+COLUMN_CLAUSE_RE = re.compile(
+    r"\s+(?:DEFAULT|MATERIALIZED|ALIAS|EPHEMERAL|CODEC|COMMENT|TTL|AFTER|FIRST)\b",
+    re.IGNORECASE,
+)
+# Type aliases in DDL, by the type name the server reports.
+TYPE_ALIASES = {
+    "BIGINT": "Int64",
+    "BOOLEAN": "Bool",
+    "DATE": "Date",
+    "DATETIME": "DateTime",
+    "DECIMAL": "Decimal(10, 0)",
+    "DOUBLE": "Float64",
+    "FLOAT": "Float32",
+    "INTEGER": "Int32",
+    "TEXT": "String",
+    "VARCHAR": "String",
+}
+TYPE_ALIAS_RE = re.compile(rf"\b({'|'.join(TYPE_ALIASES)})\b(\()?")
+DESCRIBE_COLUMNS = [
+    ("name", "String"),
+    ("type", "String"),
+    ("default_type", "String"),
+    ("default_expression", "String"),
+    ("comment", "String"),
+    ("codec_expression", "String"),
+    ("ttl_expression", "String"),
+]
+
+
+def _table_key(name: str) -> str:
+    """Return the unqualified, unquoted name of a table."""
+    return name.rsplit(".", 1)[-1].strip('`"')
+
+
+def _split_columns(definitions: str) -> list[str]:
+    """Split a column list on its top-level commas."""
+    return split_type(f"Columns({definitions})")[1]
+
+
+def _column_list(text: str) -> str:
+    """Return the text inside the first top-level parentheses."""
+    start = text.find("(")
+    depth = 0
+    for end in range(start, len(text)):
+        depth += {"(": 1, ")": -1}.get(text[end], 0)
+        if depth == 0:
+            return text[start + 1 : end]
+    return text[start + 1 :]
+
+
+def _canonical_type(match: re.Match) -> str:
+    """Return the type name reported for a type alias, keeping its arguments."""
+    type_name = TYPE_ALIASES[match.group(1)]
+    if match.group(2):
+        return type_name.partition("(")[0] + "("
+    return type_name
+
+
+def _parse_column(definition: str) -> tuple[str, str] | None:
+    """Return the name and type of a column definition."""
+    name, _, rest = definition.strip().partition(" ")
+    if name.upper() in {"INDEX", "CONSTRAINT", "PROJECTION"} or not rest:
+        return None
+    clause = COLUMN_CLAUSE_RE.search(rest)
+    type_name = rest[: clause.start()] if clause else rest
+    type_name = TYPE_ALIAS_RE.sub(_canonical_type, type_name.strip())
+    return name.strip('`"'), type_name
+
+
+def _tsv_result(columns: list[tuple[str, str]], rows: list[list[str]]) -> bytes:
+    """Return a `TabSeparatedWithNamesAndTypes` result."""
+    lines = [
+        [name for name, _ in columns],
+        [type_name for _, type_name in columns],
+        *rows,
+    ]
+    return "".join("\t".join(line) + "\n" for line in lines).encode()
+
+
+@dataclass
+class FakeClickhouseStats:
+    """What a `FakeClickhouse` server received."""
+
+    queries: int = 0
+    inserts: int = 0
+    # The size of the INSERT bodies, excluding the query text.
+    insert_bytes: int = 0
+    # The sum of the CRC-32 of each INSERT body, modulo 2**32, so it does not
+    # depend on the order of concurrent inserts.
+    checksum: int = 0
+    # Queries answered with an empty result.
+    unhandled: list[str] = field(default_factory=list)
+    # The size of all request bodies as received, before decompression.
+    wire_bytes: int = 0
+    # CPU time spent by the server's threads handling requests.
+    cpu_seconds: float = 0.0
+
+
+class FakeClickhouse:
+    """A ClickHouse HTTP endpoint serving from a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """Create the server. It is started by `start` or by entering the context.
+
+        Args:
+            host: The address to listen on.
+            port: The port to listen on, 0 for any free port.
+
+        """
+        self.tables: dict[str, list[tuple[str, str]]] = {}
+        self.stats = FakeClickhouseStats()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        """Return the port the server listens on."""
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="fake-clickhouse",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> FakeClickhouse:  # noqa: PYI034
+        """Start the server."""
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Stop the server."""
+        self.stop()
+
+    def handle(self, query: str, data: bytes) -> bytes:
+        """Answer a query.
+
+        Args:
+            query: The query text, without inline INSERT data.
+            data: The INSERT data, empty for other queries.
+
+        Returns:
+            The response body.
+
+        """
+        statement = " ".join(query.split())
+        keyword = statement.split(" ", 1)[0].upper()
+        with self._lock:
+            self.stats.queries += 1
+            if keyword == "INSERT":
+                self.stats.inserts += 1
+                self.stats.insert_bytes += len(data)
+                self.stats.checksum = (
+                    self.stats.checksum + zlib.crc32(data)
+                ) % 2**32
+                return b""
+            handler = {
+                "SELECT": self._select,
+                "EXISTS": self._exists,
+                "DESCRIBE": self._describe,
+                "CREATE": self._create,
+                "ALTER": self._alter,
+                "DROP": self._drop,
+            }.get(keyword)
+            response = handler(statement) if handler is not None else None
+            if response is None:
+                self.stats.unhandled.append(statement)
+                return b""
+            return response
+
+    def _select(self, statement: str) -> bytes | None:
+        lowered = statement.lower()
+        if lowered.startswith("select version()"):
+            return _tsv_result([("version()", "String")], [[SERVER_VERSION]])
+        if lowered.startswith("select currentdatabase()"):
+            return _tsv_result([("currentDatabase()", "String")], [["default"]])
+        if " from system." in lowered:
+            # No mutations, parts or other system table rows.
+            return _tsv_result([("name", "String")], [])
+        return None
+
+    def _exists(self, statement: str) -> bytes:
+        table = _table_key(statement.split(" ")[-1])
+        return _tsv_result([("result", "UInt8")], [[str(int(table in self.tables))]])
+
+    def _describe(self, statement: str) -> bytes:
+        table = _table_key(statement.split(" ")[-1])
+        rows = [
+            [name, type_name, "", "", "", "", ""]
+            for name, type_name in self.tables.get(table, [])
+        ]
+        return _tsv_result(DESCRIBE_COLUMNS, rows)
+
+    def _create(self, statement: str) -> bytes | None:
+        match = CREATE_TABLE_RE.match(statement)
+        if match is None:
+            return b"" if statement.upper().startswith("CREATE DATABASE") else None
+        columns = [
+            column
+            for column in map(
+                _parse_column,
+                _split_columns(_column_list(statement[match.end() :])),
+            )
+            if column is not None
+        ]
+        self.tables[_table_key(match.group("table"))] = columns
+        return b""
+
+    def _alter(self, statement: str) -> bytes:
+        table = _table_key(statement.split(" ")[2])
+        columns = self.tables.setdefault(table, [])
+        for clause in _split_columns(statement.split(" ", 3)[3]):
+            match = ALTER_COLUMN_RE.match(clause.strip())
+            column = _parse_column(match.group("column")) if match else None
+            if column is None:
+                continue
+            names = [name for name, _ in columns]
+            if column[0] in names:
+                columns[names.index(column[0])] = column
+            else:
+                columns.append(column)
+        return b""
+
+    def _drop(self, statement: str) -> bytes:
+        if statement.upper().startswith("DROP TABLE"):
+            self.tables.pop(_table_key(statement.split(" ")[-1]), None)
+        return b""
+
+
+def _split_insert(query: str, body: bytes) -> tuple[str, bytes]:
+    """Return the query and data of a request, splitting inline VALUES data."""
+    if query:
+        return query, body
+    text = body.decode("utf-8", errors="replace")
+    match = re.search(r"\bVALUES\b", text, re.IGNORECASE)
+    if text.lstrip().upper().startswith("INSERT") and match is not None:
+        return text[: match.end()], body[len(text[: match.end()].encode()) :]
+    return text, b""
+
+
+def _decompress(body: bytes, encoding: str | None) -> bytes:
+    if not encoding:
+        return body
+    if encoding == "gzip":
+        return zlib.decompress(body, wbits=16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    if encoding == "lz4":
+        import lz4.frame
+
+        return lz4.frame.decompress(body)
+    msg = f"Unsupported Content-Encoding '{encoding}'."
+    raise ValueError(msg)
+
+
+def _make_handler(server: FakeClickhouse) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        # Keep connections open between requests, as ClickHouse does.
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:  # noqa: N802
+            start = time.thread_time()
+            if self.headers.get("Transfer-Encoding") == "chunked":
+                body = self._read_chunked()
+            else:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            wire_bytes = len(body)
+            body = _decompress(body, self.headers.get("Content-Encoding"))
+            params = parse_qs(urlparse(self.path).query)
+            query, data = _split_insert(params.get("query", [""])[0], body)
+            response = server.handle(query, data)
+            with server._lock:  # noqa: SLF001
+                server.stats.wire_bytes += wire_bytes
+                server.stats.cpu_seconds += time.thread_time() - start
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def _read_chunked(self) -> bytes:
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    # Skip trailers up to the final empty line.
+                    while self.rfile.readline().strip():
+                        pass
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+            """Do not log requests."""
+
+    return Handler
@@ -0,0 +1,149 @@
+"""Synthetic Singer streams for benchmarks.
+
+Records are generated deterministically from the record number, so runs with the
+same `StreamSpec` read the same input.
+"""
+
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass
+from typing import IO, Iterator
+
+import simplejson as json
+
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Column kinds cycled through by the scalar columns of a record.
+SCALAR_KINDS = ("integer", "number", "string", "boolean")
+
+
+@dataclass(frozen=True)
+class StreamSpec:
+    """Shape of a synthetic stream."""
+
+    stream: str = "benchmark"
+    records: int = 100_000
+    # The number of scalar columns, besides the `id` key property.
+    width: int = 20
+    # The nesting depth of the `nested` object column, 0 for none.
+    depth: int = 0
+    # The fraction of scalar columns that are date-time strings.
+    timestamp_ratio: float = 0.2
+
+    @property
+    def timestamp_columns(self) -> int:
+        """Return the number of date-time columns."""
+        return round(self.width * self.timestamp_ratio)
+
+
+def _nested_schema(depth: int) -> dict:
+    properties: dict = {
+        "code": {"type": ["string", "null"]},
+        "value": {"type": ["number", "null"]},
+    }
+    if depth > 1:
+        properties["child"] = _nested_schema(depth - 1)
+    return {"type": ["object", "null"], "properties": properties}
+
+
+def _nested_value(depth: int, number: int) -> dict:
+    value: dict = {"code": f"c{number % 97}", "value": number / 8}
+    if depth > 1:
+        value["child"] = _nested_value(depth - 1, number + 1)
+    return value
+
+
+def get_schema(spec: StreamSpec) -> dict:
+    """Return the JSON schema of a synthetic stream.
+
+    Args:
+        spec: The stream's shape.
+
+    Returns:
+        The schema, with an `id` key property, `timestamp_columns` date-time
+        columns `ts_<i>`, scalar columns `col_<i>` and an optional `nested` column.
+
+    """
+    properties: dict = {"id": {"type": "integer"}}
+    for i in range(spec.timestamp_columns):
+        properties[f"ts_{i}"] = {"type": ["string", "null"], "format": "date-time"}
+    for i in range(spec.width - spec.timestamp_columns):
+        properties[f"col_{i}"] = {"type": [SCALAR_KINDS[i % len(SCALAR_KINDS)], "null"]}
+    if spec.depth > 0:
+        properties["nested"] = _nested_schema(spec.depth)
+    return {"type": "object", "properties": properties}
+
+
+def get_record(spec: StreamSpec, number: int) -> dict:
+    """Return the record with the given number.
+
+    Args:
+        spec: The stream's shape.
+        number: The record number, also its `id`.
+
+    Returns:
+        The record.
+
+    """
+    record: dict = {"id": number}
+    for i in range(spec.timestamp_columns):
+        timestamp = EPOCH + datetime.timedelta(seconds=number * 7 + i)
+        record[f"ts_{i}"] = timestamp.isoformat()
+    for i in range(spec.width - spec.timestamp_columns):
+        kind = SCALAR_KINDS[i % len(SCALAR_KINDS)]
+        if kind == "integer":
+            record[f"col_{i}"] = number * (i + 1)
+        elif kind == "number":
+            record[f"col_{i}"] = number / (i + 1)
+        elif kind == "string":
+            record[f"col_{i}"] = f"value-{number % 1000}-{i}"
+        else:
+            record[f"col_{i}"] = number % 2 == 0
+    if spec.depth > 0:
+        record["nested"] = _nested_value(spec.depth, number)
+    return record
+
+
+def generate_messages(spec: StreamSpec) -> Iterator[dict]:
+    """Generate the Singer messages of a synthetic stream.
+
+    Args:
+        spec: The stream's shape.
+
+    Yields:
+        A SCHEMA message, the RECORD messages and a final STATE message.
+
+    """
+    yield {
+        "type": "SCHEMA",
+        "stream": spec.stream,
+        "schema": get_schema(spec),
+        "key_properties": ["id"],
+    }
+    for number in range(spec.records):
+        yield {
+            "type": "RECORD",
+            "stream": spec.stream,
+            "record": get_record(spec, number),
+        }
+    yield {"type": "STATE", "value": {"bookmarks": {spec.stream: spec.records}}}
+
+
+def write_messages(spec: StreamSpec, file: IO[str]) -> int:
+    """Write the messages of a synthetic stream as JSON lines.
+
+    Args:
+        spec: The stream's shape.
+        file: The text file to write to.
+
+    Returns:
+        The number of bytes written.
+
+    """
+    size = 0
+    for message in generate_messages(spec):
+        line = json.dumps(message) + "\n"
+        file.write(line)
+        size += len(line.encode())
+    return size
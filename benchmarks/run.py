@@ -0,0 +1,291 @@
+"""Run throughput benchmarks of TargetClickhouse.
+
+Each driver, batch size and compression combination runs in its own process, so
+peak RSS is measured per run. Without a `host` in `--config`, runs insert into an
+in-process `FakeClickhouse`, which only speaks HTTP; the native driver needs a
+server.
+
+    python -m benchmarks.run --records 200000 --batch-sizes 10000 100000
+    python -m benchmarks.run --compressions none gzip zstd lz4
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import itertools
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from benchmarks.fake_clickhouse import FakeClickhouse
+from benchmarks.generator import StreamSpec, write_messages
+
+# Methods timed as phases, with the phase they are counted in.
+PHASE_METHODS = [
+    ("target_clickhouse.sinks", "ClickhouseSink", "_validate_and_parse", "validate"),
+    ("target_clickhouse.sinks", "ClickhouseSink", "process_batch", "batch"),
+    ("target_clickhouse.sinks", "ClickhouseSink", "bulk_insert_records", "insert"),
+    ("target_clickhouse.connectors", "ClickhouseConnector", "prepare_table", "ddl"),
+]
+
+
+class PhaseTimer:
+    """Accumulates the time spent in the methods of `PHASE_METHODS`."""
+
+    def __init__(self) -> None:
+        """Create a timer with no recorded time."""
+        self.seconds: dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def _timed(self, method: Callable, phase: str) -> Callable:
+        @functools.wraps(method)
+        def timed(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.seconds[phase] += elapsed
+
+        return timed
+
+    @contextlib.contextmanager
+    def patch(self) -> Iterator[None]:
+        """Time the phase methods while the context is active."""
+        originals = []
+        for module_name, class_name, method_name, phase in PHASE_METHODS:
+            cls = getattr(sys.modules[module_name], class_name)
+            method = getattr(cls, method_name)
+            originals.append((cls, method_name, method))
+            setattr(cls, method_name, self._timed(method, phase))
+        try:
+            yield
+        finally:
+            for cls, method_name, method in originals:
+                setattr(cls, method_name, method)
+
+    def phases(self, total: float) -> dict[str, float]:
+        """Return the exclusive time of each phase.
+
+        Args:
+            total: The wall time of the run.
+
+        Returns:
+            Seconds by phase: `read` (parsing messages and SDK bookkeeping),
+            `validate`, `ddl`, `transform` (batch preparation) and `insert`.
+
+        """
+        seconds = dict(self.seconds)
+        batch = seconds.pop("batch", 0.0)
+        seconds["transform"] = max(0.0, batch - seconds.get("insert", 0.0))
+        seconds["read"] = max(0.0, total - sum(seconds.values()))
+        return {
+            phase: round(seconds.get(phase, 0.0), 3)
+            for phase in ("read", "validate", "ddl", "transform", "insert")
+        }
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process, in MiB."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def run_once(
+    spec: StreamSpec,
+    driver: str,
+    batch_size: int,
+    config: dict,
+) -> dict:
+    """Load a synthetic stream with TargetClickhouse and measure it.
+
+    Args:
+        spec: The stream to load.
+        driver: "http" or "native".
+        batch_size: The `batch_size_rows` setting.
+        config: Other target settings. Without a `host`, the run inserts into a
+            `FakeClickhouse`.
+
+    Returns:
+        The run's measurements.
+
+    """
+    import target_clickhouse.connectors
+    import target_clickhouse.sinks  # noqa: F401
+    from target_clickhouse.target import TargetClickhouse
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = Path(directory) / "input.singer"
+        with input_path.open("w") as file:
+            input_bytes = write_messages(spec, file)
+
+        with contextlib.ExitStack() as stack:
+            fake = None
+            config = {**config, "driver": driver, "batch_size_rows": batch_size}
+            if "host" not in config:
+                fake = stack.enter_context(FakeClickhouse())
+                config.update(
+                    host="127.0.0.1",
+                    port=fake.port,
+                    username="default",
+                    password="",
+                    database="default",
+                )
+            target = TargetClickhouse(config=config)
+            timer = PhaseTimer()
+            stack.enter_context(timer.patch())
+
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            with input_path.open() as file:
+                target.listen(file)
+            elapsed = time.perf_counter() - start
+            cpu_seconds = time.process_time() - cpu_start
+
+    result = {
+        "driver": driver,
+        "batch_size": batch_size,
+        "compression": config.get("compression"),
+        "records": spec.records,
+        "seconds": round(elapsed, 3),
+        "records_per_sec": round(spec.records / elapsed),
+        "input_mb_per_sec": round(input_bytes / elapsed / 2**20, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "phases": timer.phases(elapsed),
+        "cpu_seconds": round(cpu_seconds, 3),
+    }
+    if fake is not None:
+        result.update(
+            # The fake server runs in-process, its CPU time is not the target's.
+            cpu_seconds=round(cpu_seconds - fake.stats.cpu_seconds, 3),
+            insert_requests=fake.stats.inserts,
+            insert_mb=round(fake.stats.insert_bytes / 2**20, 2),
+            wire_mb=round(fake.stats.wire_bytes / 2**20, 2),
+            checksum=fake.stats.checksum,
+            unhandled_queries=fake.stats.unhandled,
+        )
+    return result
+
+
+def _format_row(result: dict) -> str:
+    phases = " ".join(f"{name}={value}" for name, value in result["phases"].items())
+    wire_mb = result.get("wire_mb", "-")
+    return (
+        f"{result['driver']:<7}{result['compression'] or 'none':<6}"
+        f"{result['batch_size']:>9}"
+        f"{result['records_per_sec']:>12}{result['input_mb_per_sec']:>9}"
+        f"{result['cpu_seconds']:>9}{wire_mb:>9}"
+        f"{result['peak_rss_mb']:>10}  {phases}"
+    )
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=StreamSpec.records)
+    parser.add_argument("--width", type=int, default=StreamSpec.width)
+    parser.add_argument("--depth", type=int, default=StreamSpec.depth)
+    parser.add_argument(
+        "--timestamp-ratio",
+        type=float,
+        default=StreamSpec.timestamp_ratio,
+    )
+    parser.add_argument("--drivers", nargs="+", default=["http"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[10_000])
+    parser.add_argument(
+        "--compressions",
+        nargs="+",
+        default=["none"],
+        help="`compression` settings to compare, `none` for uncompressed.",
+    )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        help="JSON file of target settings, e.g. a `host` to use a real server.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON lines.")
+    parser.add_argument("--result-file", type=Path, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the benchmarks given on the command line, one process per run.
+
+    Args:
+        argv: The command line arguments, without the program name.
+
+    """
+    args = _parse_args(argv)
+    config = json.loads(args.config.read_text()) if args.config else {}
+    spec = StreamSpec(
+        records=args.records,
+        width=args.width,
+        depth=args.depth,
+        timestamp_ratio=args.timestamp_ratio,
+    )
+
+    if args.result_file:
+        # A single run in a child process. The target writes state to stdout.
+        if args.compressions[0] != "none":
+            config["compression"] = args.compressions[0]
+        result = run_once(spec, args.drivers[0], args.batch_sizes[0], config)
+        args.result_file.write_text(json.dumps(result))
+        return
+
+    if not args.json:
+        print(  # noqa: T201
+            f"{'driver':<7}{'comp':<6}{'batch':>9}{'records/s':>12}{'MiB/s':>9}"
+            f"{'CPU s':>9}{'wire MiB':>9}{'RSS MiB':>10}  phase seconds",
+        )
+    for driver in args.drivers:
+        if driver == "native" and "host" not in config:
+            print(  # noqa: T201
+                "Skipping the native driver, it needs a server `host` in --config.",
+                file=sys.stderr,
+            )
+            continue
+        for batch_size, compression in itertools.product(
+            args.batch_sizes,
+            args.compressions,
+        ):
+            with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+                child_args = [
+                    arg
+                    for arg in (argv if argv is not None else sys.argv[1:])
+                    if arg != "--json"
+                ]
+                subprocess.run(
+                    [  # noqa: S603
+                        sys.executable,
+                        "-m",
+                        "benchmarks.run",
+                        *child_args,
+                        "--drivers",
+                        driver,
+                        "--batch-sizes",
+                        str(batch_size),
+                        "--compressions",
+                        compression,
+                        "--result-file",
+                        result_file.name,
+                    ],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                )
+                result = json.loads(Path(result_file.name).read_text())
+            print(json.dumps(result) if args.json else _format_row(result))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare the throughput of the record validators.
+
+Validates synthetic records with the SDK's generic `jsonschema` validator and
+with each `record_validation` mode of `RecordValidator`, for a few stream shapes,
+and reports records/sec and the speedup over `jsonschema`.
+
+    python -m benchmarks.validation --records 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import time
+
+from singer_sdk.sinks.core import BaseJSONSchemaValidator, JSONSchemaValidator
+
+from benchmarks.generator import StreamSpec, get_record, get_schema
+from target_clickhouse.validation import (
+    DEFAULT_VALIDATION_SAMPLE_INTERVAL,
+    RecordValidator,
+)
+
+# Stream shapes validated, by name.
+SHAPES = {
+    "narrow": StreamSpec(width=10),
+    "wide": StreamSpec(width=100),
+    "nested": StreamSpec(width=20, depth=3),
+}
+
+
+def _validators(schema: dict) -> dict[str, BaseJSONSchemaValidator]:
+    return {
+        "jsonschema": JSONSchemaValidator(schema),
+        "compiled": RecordValidator(schema),
+        "sampled": RecordValidator(
+            schema,
+            sample_interval=DEFAULT_VALIDATION_SAMPLE_INTERVAL,
+        ),
+    }
+
+
+def compare_validators(spec: StreamSpec) -> dict:
+    """Validate a stream's records with each validator.
+
+    Args:
+        spec: The stream's shape, with the number of records to validate.
+
+    Returns:
+        The records/sec of each validator, by `record_validation` mode.
+
+    """
+    schema = get_schema(spec)
+    records = [get_record(spec, number) for number in range(spec.records)]
+    results = {}
+    for mode, validator in _validators(schema).items():
+        start = time.perf_counter()
+        for record in records:
+            validator.validate(record)
+        results[mode] = spec.records / (time.perf_counter() - start)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the validation benchmarks given on the command line.
+
+    Args:
+        argv: The command line arguments, without the program name.
+
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--json", action="store_true", help="Print JSON lines.")
+    args = parser.parse_args(argv)
+
+    if not args.json:
+        print(  # noqa: T201
+            f"{'shape':<8}{'mode':<12}{'records/s':>12}{'speedup':>9}",
+        )
+    for shape, spec in SHAPES.items():
+        results = compare_validators(dataclasses.replace(spec, records=args.records))
+        for mode, records_per_second in results.items():
+            speedup = records_per_second / results["jsonschema"]
+            if args.json:
+                row = {
+                    "shape": shape,
+                    "mode": mode,
+                    "records_per_second": records_per_second,
+                    "speedup": speedup,
+                }
+                print(json.dumps(row))  # noqa: T201
+            else:
+                print(  # noqa: T201
+                    f"{shape:<8}{mode:<12}{records_per_second:>12.0f}"
+                    f"{speedup:>8.1f}x",
+                )
+
+
+if __name__ == "__main__":
+    main()
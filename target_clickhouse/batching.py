@@ -0,0 +1,194 @@
+"""Byte-aware, adaptive batch sizing for ClickhouseSink.
+
+A batch is drained when it reaches its row limit, or, with `batch_max_bytes`,
+when its estimated size reaches it, so wide streams send fewer rows per insert
+than narrow ones. Sizes are estimated from the JSON size of one in
+`RECORD_SAMPLE_INTERVAL` records, corrected by the ratio of bytes actually sent
+to estimated bytes of the previous inserts, where the driver measures them.
+
+With `adaptive_batching`, the row limit of each table starts at `batch_size_rows`
+and is tuned after every insert: it shrinks when inserts take longer than
+`adaptive_batch_target_seconds`, and grows when full batches insert in less than
+half of it, or when a partition of the table has many active parts, since
+ClickHouse prefers fewer, larger inserts.
+"""
+
+from __future__ import annotations
+
+import threading
+
+# Records whose JSON size is measured, one in this many.
+RECORD_SAMPLE_INTERVAL = 100
+# Weight of the latest observation in the moving averages of sizes.
+EWMA_WEIGHT = 0.3
+
+# No byte limit unless `batch_max_bytes` is set.
+DEFAULT_BATCH_MAX_BYTES = 0
+DEFAULT_ADAPTIVE_BATCH_MIN_ROWS = 1000
+DEFAULT_ADAPTIVE_BATCH_MAX_ROWS = 1_000_000
+DEFAULT_ADAPTIVE_BATCH_TARGET_SECONDS = 5.0
+# Active parts in a partition above which batches grow. ClickHouse delays
+# inserts at `parts_to_delay_insert` active parts, and rejects them at
+# `parts_to_throw_insert`.
+PARTS_PRESSURE_THRESHOLD = 100
+
+
+def moving_average(average: float | None, value: float) -> float:
+    """Return an exponentially weighted moving average updated with a value.
+
+    Args:
+        average: The previous average, None before the first value.
+        value: The new value.
+
+    Returns:
+        The updated average.
+
+    """
+    if average is None:
+        return value
+    return average + EWMA_WEIGHT * (value - average)
+
+
+class BatchSizeController:
+    """Decides when a table's batch is full, and tunes its row limit."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        row_limit: int,
+        max_bytes: int = DEFAULT_BATCH_MAX_BYTES,
+        *,
+        adaptive: bool = False,
+        min_rows: int = DEFAULT_ADAPTIVE_BATCH_MIN_ROWS,
+        max_rows: int = DEFAULT_ADAPTIVE_BATCH_MAX_ROWS,
+        target_seconds: float = DEFAULT_ADAPTIVE_BATCH_TARGET_SECONDS,
+    ) -> None:
+        """Create a controller.
+
+        Args:
+            row_limit: The initial number of rows of a full batch.
+            max_bytes: The estimated size of a full batch, 0 for no limit.
+            adaptive: Whether to tune the row limit from insert feedback.
+            min_rows: The lowest row limit tuning can set.
+            max_rows: The highest row limit tuning can set.
+            target_seconds: The insert latency tuning aims for.
+
+        """
+        self.row_limit = row_limit
+        self.max_bytes = max_bytes
+        self.adaptive = adaptive
+        self.min_rows = min(min_rows, row_limit)
+        self.max_rows = max(max_rows, row_limit)
+        self.target_seconds = target_seconds
+        # Moving average of the JSON size of sampled records.
+        self.record_bytes: float | None = None
+        # Moving average of sent bytes per estimated byte.
+        self.wire_ratio = 1.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict, row_limit: int) -> BatchSizeController:
+        """Create a controller from the target's config.
+
+        Args:
+            config: The target config, with the `batch_max_bytes`,
+                `adaptive_batching`, `adaptive_batch_max_rows` and
+                `adaptive_batch_target_seconds` settings.
+            row_limit: The initial row limit, from `batch_size_rows`.
+
+        Returns:
+            The controller.
+
+        """
+        max_bytes = config.get("batch_max_bytes")
+        return cls(
+            row_limit,
+            DEFAULT_BATCH_MAX_BYTES if max_bytes is None else max_bytes,
+            adaptive=bool(config.get("adaptive_batching", False)),
+            max_rows=config.get("adaptive_batch_max_rows")
+            or DEFAULT_ADAPTIVE_BATCH_MAX_ROWS,
+            target_seconds=config.get("adaptive_batch_target_seconds")
+            or DEFAULT_ADAPTIVE_BATCH_TARGET_SECONDS,
+        )
+
+    def observe_record(self, size: int) -> None:
+        """Add the JSON size of a sampled record to the size estimate.
+
+        Args:
+            size: The record's size in bytes.
+
+        """
+        with self._lock:
+            self.record_bytes = moving_average(self.record_bytes, size)
+
+    def estimated_bytes(self, rows: int) -> int:
+        """Return the estimated size of a batch, 0 before any record was sampled.
+
+        Args:
+            rows: The number of rows in the batch.
+
+        Returns:
+            The estimated number of bytes sent to insert the batch.
+
+        """
+        if self.record_bytes is None:
+            return 0
+        return int(rows * self.record_bytes * self.wire_ratio)
+
+    def is_full(self, rows: int) -> bool:
+        """Return True if a batch reached the row limit or the byte limit.
+
+        Args:
+            rows: The number of rows in the batch.
+
+        Returns:
+            Whether the batch should be drained.
+
+        """
+        if rows >= self.row_limit:
+            return True
+        return bool(self.max_bytes) and self.estimated_bytes(rows) >= self.max_bytes
+
+    def batch_inserted(
+        self,
+        rows: int,
+        size: int,
+        insert_seconds: float,
+        active_parts: int | None = None,
+    ) -> int:
+        """Update the estimates and the row limit from an inserted batch.
+
+        Args:
+            rows: The number of rows inserted.
+            size: The number of bytes sent before compression, 0 if not
+                measured.
+            insert_seconds: The time the inserts took.
+            active_parts: The highest number of active parts in a partition of
+                the table after the insert, if known.
+
+        Returns:
+            The row limit of the next batches.
+
+        """
+        with self._lock:
+            if size and rows and self.record_bytes:
+                self.wire_ratio = moving_average(
+                    self.wire_ratio,
+                    size / (rows * self.record_bytes),
+                )
+            if not self.adaptive or not rows:
+                return self.row_limit
+
+            row_limit = self.row_limit
+            if active_parts is not None and active_parts >= PARTS_PRESSURE_THRESHOLD:
+                # Inserts into a partition with many parts are delayed by the
+                # server, so slow inserts are no reason to shrink batches then.
+                row_limit *= 2
+            elif insert_seconds > self.target_seconds:
+                row_limit = max(
+                    row_limit // 2,
+                    int(rows * self.target_seconds / insert_seconds),
+                )
+            elif rows >= row_limit and insert_seconds < self.target_seconds / 2:
+                row_limit *= 2
+            self.row_limit = max(self.min_rows, min(self.max_rows, row_limit))
+            return self.row_limit
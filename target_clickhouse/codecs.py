@@ -0,0 +1,163 @@
+"""Compression codec advice for the columns of new tables.
+
+The advisor applies each candidate codec's transform (`Delta`, `DoubleDelta` or
+`Gorilla`) to a column of the first batch locally, compresses the result with
+zlib as a stand-in for ZSTD, and picks the candidate producing the smallest
+output. Columns whose data does not compress noticeably better with a transform
+keep the server's default codec.
+"""
+
+from __future__ import annotations
+
+import datetime
+import zlib
+from array import array
+from typing import Any, Callable, Iterable, Sequence
+
+import sqlalchemy.types
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+# Columns with fewer non-null sample values are left to the server default.
+CODEC_MIN_SAMPLE = 1000
+# A transform must shrink the compressed sample by at least this fraction.
+CODEC_MIN_GAIN = 0.1
+GENERAL_PURPOSE_CODEC = "ZSTD(1)"
+
+UINT64_MASK = 2**64 - 1
+
+
+def _delta(values: list[int]) -> list[int]:
+    return values[:1] + [
+        (value - previous) & UINT64_MASK
+        for previous, value in zip(values, values[1:])
+    ]
+
+
+def _double_delta(values: list[int]) -> list[int]:
+    return _delta(_delta(values))
+
+
+def _gorilla(values: list[int]) -> list[int]:
+    return values[:1] + [
+        value ^ previous for previous, value in zip(values, values[1:])
+    ]
+
+
+# Candidate transforms by column kind, with the codec they stand for.
+CANDIDATES: dict[str, list[tuple[str, Callable[[list[int]], list[int]]]]] = {
+    "integer": [("Delta", _delta), ("DoubleDelta", _double_delta)],
+    "float": [("Gorilla", _gorilla)],
+}
+
+
+def get_codec_kind(sql_type: sqlalchemy.types.TypeEngine) -> str | None:
+    """Return the kind of codec candidates tried for a column type.
+
+    Args:
+        sql_type: The column type.
+
+    Returns:
+        "integer" for integer, date and datetime columns, "float" for floating
+        point columns, or None if no transform applies.
+
+    """
+    if isinstance(sql_type, clickhouse_sqlalchemy_types.Nullable):
+        return get_codec_kind(sql_type.nested_type)
+    if isinstance(
+        sql_type,
+        (sqlalchemy.types.Integer, sqlalchemy.types.Date, sqlalchemy.types.DateTime),
+    ):
+        return "integer"
+    if isinstance(sql_type, sqlalchemy.types.Float):
+        return "float"
+    return None
+
+
+def _to_int(value: Any) -> int | None:  # noqa: ANN401
+    """Return an integer representation of a value, as stored by ClickHouse."""
+    if isinstance(value, int):
+        return value & UINT64_MASK
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp() * 1_000_000) & UINT64_MASK
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    return None
+
+
+def _to_ints(values: list[Any]) -> list[int] | None:
+    integers = []
+    for value in values:
+        integer = _to_int(value)
+        if integer is None:
+            return None
+        integers.append(integer)
+    return integers
+
+
+def _to_float_bits(values: list[Any]) -> list[int] | None:
+    try:
+        floats = array("d", [float(value) for value in values])
+    except (TypeError, ValueError):
+        return None
+    return list(array("Q", floats.tobytes()))
+
+
+def _compressed_size(values: list[int]) -> int:
+    return len(zlib.compress(array("Q", values).tobytes(), 1))
+
+
+def advise_codec(values: Sequence[Any], kind: str) -> str | None:
+    """Return the best codec for a column's sample values, if better than default.
+
+    Args:
+        values: The column's values in the batch, in insert order.
+        kind: "integer" or "float", see `get_codec_kind`.
+
+    Returns:
+        A codec declaration, e.g. `DoubleDelta, ZSTD(1)`, or None.
+
+    """
+    sample = [value for value in values if value is not None]
+    if len(sample) < CODEC_MIN_SAMPLE or kind not in CANDIDATES:
+        return None
+    words = _to_ints(sample) if kind == "integer" else _to_float_bits(sample)
+    if words is None:
+        return None
+
+    baseline = _compressed_size(words)
+    best_codec, best_size = None, baseline * (1 - CODEC_MIN_GAIN)
+    for codec, transform in CANDIDATES[kind]:
+        size = _compressed_size(transform(words))
+        if size < best_size:
+            best_codec, best_size = codec, size
+    if best_codec is None:
+        return None
+    return f"{best_codec}, {GENERAL_PURPOSE_CODEC}"
+
+
+def advise_codecs(
+    records: Sequence[dict],
+    column_types: dict[str, sqlalchemy.types.TypeEngine],
+    skip: Iterable[str] = (),
+) -> dict[str, str]:
+    """Return codecs for the columns of a batch that compress better with one.
+
+    Args:
+        records: The batch of records.
+        column_types: The table's column types, by name.
+        skip: Columns not to advise on, e.g. with a configured codec.
+
+    Returns:
+        The advised codec declarations, by column name.
+
+    """
+    skipped = set(skip)
+    codecs = {}
+    for name, sql_type in column_types.items():
+        kind = get_codec_kind(sql_type)
+        if kind is None or name in skipped:
+            continue
+        codec = advise_codec([record.get(name) for record in records], kind)
+        if codec is not None:
+            codecs[name] = codec
+    return codecs
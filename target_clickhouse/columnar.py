@@ -0,0 +1,76 @@
+"""Helpers for the native driver's column-oriented block inserts."""
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Sequence
+
+import sqlalchemy.types
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+from sqlalchemy.sql.type_api import to_instance
+
+# SQLAlchemy type families that the native driver can encode from plain
+# python values without any help from the SQLAlchemy statement compiler.
+COLUMNAR_TYPES = (
+    sqlalchemy.types.Integer,
+    sqlalchemy.types.Float,
+    sqlalchemy.types.String,
+    sqlalchemy.types.Boolean,
+    sqlalchemy.types.Date,
+    sqlalchemy.types.DateTime,
+)
+
+
+def is_columnar_type(sql_type: sqlalchemy.types.TypeEngine) -> bool:
+    """Return True if values of this type can be sent in a columnar block.
+
+    Args:
+        sql_type: The SQLAlchemy type of the target column.
+
+    Returns:
+        True if the columnar encoder supports the type.
+
+    """
+    wrapper_types = (
+        clickhouse_sqlalchemy_types.Nullable,
+        clickhouse_sqlalchemy_types.LowCardinality,
+    )
+    if isinstance(sql_type, wrapper_types):
+        return is_columnar_type(sql_type.nested_type)
+    if isinstance(sql_type, clickhouse_sqlalchemy_types.Array):
+        return is_columnar_type(sql_type.item_type_impl)
+    if isinstance(sql_type, clickhouse_sqlalchemy_types.Map):
+        return all(
+            is_columnar_type(to_instance(nested_type))
+            for nested_type in (sql_type.key_type, sql_type.value_type)
+        )
+    if isinstance(sql_type, clickhouse_sqlalchemy_types.Tuple):
+        return all(
+            is_columnar_type(to_instance(nested_type))
+            for nested_type in sql_type.nested_types
+        )
+    return isinstance(sql_type, COLUMNAR_TYPES)
+
+
+def pivot_records(
+    records: Iterable[dict[str, Any]],
+    column_names: Sequence[str],
+) -> list[list[Any]]:
+    """Pivot row-oriented records into one list of values per column.
+
+    Missing properties are filled in with None, as in the row-oriented path.
+
+    Args:
+        records: The conformed input records.
+        column_names: The target column names, in insert order.
+
+    Returns:
+        A list of column value lists, in the same order as `column_names`.
+
+    """
+    columns: list[list[Any]] = [[] for _ in column_names]
+    appenders = [column.append for column in columns]
+    pairs = list(zip(column_names, appenders))
+    for record in records:
+        for name, append in pairs:
+            append(record.get(name))
+    return columns
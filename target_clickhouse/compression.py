@@ -0,0 +1,123 @@
+"""Compression of request bodies sent to ClickHouse.
+
+With `compression` set, the http driver sends POST bodies with a
+`Content-Encoding` the server decompresses, and asks for compressed responses
+with `enable_http_compression`. Bodies are compressed as a stream, chunk by
+chunk, so a streamed insert is never buffered whole. The native driver
+compresses its data blocks itself, with `lz4` or `zstd`.
+
+`gzip` uses the standard library. `zstd` and `lz4` require the optional
+`compression` extra: `zstandard` and `lz4` for the http driver, and `zstd`,
+`lz4` and `clickhouse-cityhash` for the native driver.
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Any, Iterable, Iterator, Protocol
+
+HTTP_ENCODINGS = ("gzip", "zstd", "lz4")
+NATIVE_ENCODINGS = ("lz4", "zstd")
+# Smaller bodies, e.g. most queries, are not worth compressing.
+MIN_COMPRESS_SIZE = 1024
+
+
+class Compressor(Protocol):
+    """A streaming compressor, as returned by `get_compressor`."""
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk, returning any compressed output ready so far."""
+
+    def flush(self) -> bytes:
+        """Return the remaining compressed output, ending the stream."""
+
+
+class _LZ4FrameCompressor:
+    """Adapts `lz4.frame.LZ4FrameCompressor` to the `Compressor` protocol."""
+
+    def __init__(self, compressor: Any) -> None:  # noqa: ANN401
+        self._compressor = compressor
+        self._header: bytes | None = compressor.begin()
+
+    def compress(self, data: bytes) -> bytes:
+        header, self._header = self._header or b"", None
+        return header + self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        header, self._header = self._header or b"", None
+        return header + self._compressor.flush()
+
+
+def get_compressor(encoding: str) -> Compressor:
+    """Return a new streaming compressor for an HTTP content encoding.
+
+    Args:
+        encoding: One of `HTTP_ENCODINGS`.
+
+    Returns:
+        The compressor.
+
+    Raises:
+        ImportError: if the encoding's optional dependency is not installed.
+        ValueError: if the encoding is not supported.
+
+    """
+    if encoding == "gzip":
+        return zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            msg = (
+                "`zstandard` is required for `compression: zstd`, install the "
+                "`compression` extra."
+            )
+            raise ImportError(msg) from e
+        return zstandard.ZstdCompressor().compressobj()
+    if encoding == "lz4":
+        try:
+            import lz4.frame
+        except ImportError as e:
+            msg = (
+                "`lz4` is required for `compression: lz4`, install the "
+                "`compression` extra."
+            )
+            raise ImportError(msg) from e
+        return _LZ4FrameCompressor(lz4.frame.LZ4FrameCompressor())
+    msg = f"Unsupported compression '{encoding}', expected one of {HTTP_ENCODINGS}."
+    raise ValueError(msg)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a whole body.
+
+    Args:
+        body: The body.
+        encoding: One of `HTTP_ENCODINGS`.
+
+    Returns:
+        The compressed body.
+
+    """
+    compressor = get_compressor(encoding)
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a body lazily, chunk by chunk.
+
+    Args:
+        chunks: The chunks of the body.
+        encoding: One of `HTTP_ENCODINGS`.
+
+    Yields:
+        Compressed chunks. Compressors buffer small inputs, so no chunk is
+        yielded for a chunk that produced no output yet.
+
+    """
+    compressor = get_compressor(encoding)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import contextlib
+import threading
+import time
 import typing
+from functools import cached_property
 from typing import TYPE_CHECKING
 
 import sqlalchemy.types
@@ -11,15 +14,52 @@ from clickhouse_sqlalchemy import (
 from clickhouse_sqlalchemy import (
     types as clickhouse_sqlalchemy_types,
 )
+from clickhouse_sqlalchemy.drivers.http.exceptions import HTTPException
+from clickhouse_sqlalchemy.exceptions import DatabaseException
 from singer_sdk import typing as th
 from singer_sdk.connectors import SQLConnector
-from sqlalchemy import Column, MetaData, create_engine
+from singer_sdk.helpers.capabilities import TargetLoadMethods
+from sqlalchemy import Column, MetaData, create_engine, event
+from sqlalchemy.engine import make_url
 
-from target_clickhouse.engine_class import SupportedEngines, create_engine_wrapper
+from target_clickhouse.codecs import advise_codecs
+from target_clickhouse.compression import NATIVE_ENCODINGS
+from target_clickhouse.engine_class import (
+    REPLACING_ENGINES,
+    SupportedEngines,
+    create_engine_wrapper,
+)
+from target_clickhouse.memory import MemoryAccountant
+from target_clickhouse.metadata import MetadataCache, schema_fingerprint
+from target_clickhouse.metrics import DEFAULT_METRICS_HOST, MetricsRegistry
+from target_clickhouse.nested import get_nested_sql_type
+from target_clickhouse.optimize import OptimizeScheduler
+from target_clickhouse.pool import PoolMetrics, create_http_session
+from target_clickhouse.tracing import Tracer
+from target_clickhouse.type_inference import (
+    get_low_cardinality_columns,
+    narrow_sql_type,
+    widen_narrow_type,
+)
 
 if TYPE_CHECKING:
     from sqlalchemy.engine import Engine
 
+    from target_clickhouse.batching import BatchSizeController
+
+# Same as the singer-sdk default for `SQLTarget.max_parallelism`.
+DEFAULT_MAX_PARALLELISM = 8
+STAGING_TABLE_SUFFIX = "__staging"
+# Columns of tables created for tombstone soft deletes.
+TOMBSTONE_VERSION_COLUMN = "_sdc_row_version"
+IS_DELETED_COLUMN = "_sdc_is_deleted"
+# Seconds between polls of `system.mutations`.
+MUTATION_POLL_INTERVAL = 1.0
+
+# SQLAlchemy's default `QueuePool` size and overflow.
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_MAX_OVERFLOW = 10
+
 
 class ClickhouseConnector(SQLConnector):
     """Clickhouse Meltano Connector.
@@ -34,6 +74,31 @@ class ClickhouseConnector(SQLConnector):
     allow_merge_upsert: bool = False  # Whether MERGE UPSERT is supported.
     allow_temp_tables: bool = True  # Whether temp tables are supported.
 
+    def __init__(
+        self,
+        config: dict | None = None,
+        sqlalchemy_url: str | None = None,
+    ) -> None:
+        """Initialize the connector and the run state its sinks share.
+
+        Args:
+            config: The target's config.
+            sqlalchemy_url: Optional URL for the connection.
+
+        """
+        super().__init__(config, sqlalchemy_url)
+        # Sinks share the target's connector and may be drained from worker threads.
+        self._engine_lock = threading.Lock()
+        self._cleanup_lock = threading.Lock()
+        # The version column and oldest version to keep, by table. Cleanups are
+        # applied by `flush_version_cleanup`, so several versions activated in
+        # between are deleted with a single mutation.
+        self.pending_version_cleanups: dict[str, tuple[str, int]] = {}
+        # The version being loaded into each table's staging table.
+        self.staging_versions: dict[str, int] = {}
+        # The version last activated from each table's staging table.
+        self.activated_versions: dict[str, int] = {}
+
     def get_sqlalchemy_url(self, config: dict) -> str:
         """Generates a SQLAlchemy URL for clickhouse.
 
@@ -57,15 +122,115 @@ class ClickhouseConnector(SQLConnector):
                 secure_options = "protocol=http"
         else:
             secure_options = f"secure={config['secure']}&verify={config['verify']}"
+            if config.get("keepalive", True):
+                secure_options += "&tcp_keepalive=true"
+            if config.get("compression"):
+                if config["compression"] not in NATIVE_ENCODINGS:
+                    msg = (
+                        f"The native driver does not support `compression: "
+                        f"{config['compression']}`, use one of {NATIVE_ENCODINGS}."
+                    )
+                    raise ValueError(msg)
+                secure_options += f"&compression={config['compression']}"
         return (
             f"clickhouse+{config['driver']}://{config['username']}:{config['password']}@"
             f"{config['host']}:{config['port']}/"
             f"{config['database']}?{secure_options}"
         )
 
+    @property
+    def driver_name(self) -> str:
+        """Return the name of the clickhouse-sqlalchemy driver in use."""
+        return self._dialect.driver
+
+    @property
+    def _engine(self) -> Engine:
+        """Return the engine object, creating it once across drain threads."""
+        if not self._cached_engine:
+            with self._engine_lock:
+                if not self._cached_engine:
+                    self._cached_engine = self.create_engine()
+        return self._cached_engine
+
+    @cached_property
+    def pool_metrics(self) -> PoolMetrics:
+        """Return the counters of the engine's connection pool."""
+        return PoolMetrics()
+
+    @cached_property
+    def memory_accountant(self) -> MemoryAccountant:
+        """Return the accountant of memory held by all sinks, for `memory_budget`."""
+        return MemoryAccountant(self.config.get("memory_budget"))
+
+    @cached_property
+    def metrics(self) -> MetricsRegistry:
+        """Return the performance metrics of the tables loaded by this connector."""
+        return MetricsRegistry(
+            pool_metrics=self.pool_metrics,
+            textfile=self.config.get("metrics_textfile"),
+            port=self.config.get("metrics_port"),
+            memory=self.memory_accountant,
+            host=self.config.get("metrics_host") or DEFAULT_METRICS_HOST,
+        )
+
+    @cached_property
+    def tracer(self) -> Tracer:
+        """Return the tracer of the run, a no-op unless `tracing` is set."""
+        return Tracer(self.config)
+
+    @cached_property
+    def batch_controllers(self) -> dict[str, BatchSizeController]:
+        """Return the batch size controller of each table.
+
+        Controllers are kept on the connector, so tuned batch sizes outlive the
+        sinks replaced by SCHEMA messages.
+        """
+        return {}
+
+    @cached_property
+    def metadata_cache(self) -> MetadataCache:
+        """Return the cache of table metadata for this run."""
+        return MetadataCache()
+
     def create_engine(self) -> Engine:
-        """Create a SQLAlchemy engine for clickhouse."""
-        return create_engine(self.get_sqlalchemy_url(self.config))
+        """Create a SQLAlchemy engine for clickhouse.
+
+        By default the pool holds at least one connection per parallel drain worker,
+        so sinks drained concurrently never wait on each other for a connection.
+        With the http driver all pooled connections share one keep-alive session,
+        so sockets and TLS connections outlive recycled pool connections.
+        """
+        url = self.get_sqlalchemy_url(self.config)
+        max_parallelism = self.config.get("max_parallelism", DEFAULT_MAX_PARALLELISM)
+        pool_size = self.config.get("pool_size") or max(
+            DEFAULT_POOL_SIZE,
+            max_parallelism,
+        )
+        max_overflow = self.config.get("pool_max_overflow", DEFAULT_POOL_MAX_OVERFLOW)
+
+        connect_args = {}
+        compression = self.config.get("compression")
+        is_http = make_url(url).get_driver_name() == "http"
+        if is_http and (self.config.get("keepalive", True) or compression):
+            session = create_http_session(
+                pool_maxsize=pool_size + max_overflow,
+                compression=compression,
+                request_bytes=self.metrics.request_bytes,
+            )
+            connect_args["http_session"] = session
+
+        engine = create_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_recycle=self.config.get("pool_recycle", -1),
+            pool_pre_ping=self.config.get("pool_pre_ping", False),
+            connect_args=connect_args,
+        )
+        self.pool_metrics.attach(engine)
+        if is_http and compression:
+            event.listen(engine, "connect", _enable_http_compression)
+        return engine
 
     @contextlib.contextmanager
     def _connect(self) -> typing.Iterator[sqlalchemy.engine.Connection]:
@@ -74,9 +239,233 @@ class ClickhouseConnector(SQLConnector):
             kwargs = {"stream_results": True, "max_row_buffer": 1000}
         else:
             kwargs = {"stream_results": True}
-        with self._engine.connect().execution_options(**kwargs) as conn:
+        start = time.perf_counter()
+        connection = self._engine.connect()
+        self.pool_metrics.record_checkout_wait(time.perf_counter() - start)
+        with connection.execution_options(**kwargs) as conn:
             yield conn
 
+    @property
+    def insert_settings(self) -> dict[str, int]:
+        """Return the ClickHouse settings to send with every insert.
+
+        With `async_insert` enabled the server buffers small inserts and flushes
+        them together. `wait_for_async_insert` makes each insert return only once
+        its data has been flushed, so state is never emitted for unwritten rows.
+        """
+        if not self.config.get("async_insert"):
+            return {}
+        settings = {"async_insert": 1, "wait_for_async_insert": 1}
+        if self.config.get("async_insert_busy_timeout_ms"):
+            settings["async_insert_busy_timeout_ms"] = int(
+                self.config["async_insert_busy_timeout_ms"],
+            )
+        return settings
+
+    @contextlib.contextmanager
+    def _connect_for_insert(self) -> typing.Iterator[sqlalchemy.engine.Connection]:
+        """Connect with `insert_settings` applied to the statements executed."""
+        settings = self.insert_settings
+        with self._connect() as conn:
+            if not settings:
+                yield conn
+            elif self.driver_name == "http":
+                # The HTTP cursor drops execution options for `executemany`, so the
+                # settings are sent as query parameters of the pooled transport.
+                transport = conn.connection.dbapi_connection.transport
+                saved_settings = dict(transport.ch_settings)
+                transport.ch_settings.update(settings)
+                try:
+                    yield conn
+                finally:
+                    transport.ch_settings.clear()
+                    transport.ch_settings.update(saved_settings)
+            else:
+                yield conn.execution_options(settings=dict(settings))
+
+    def insert_columnar(
+        self,
+        full_table_name: str,
+        column_names: list[str],
+        columns: list[list],
+    ) -> int:
+        """Insert column-oriented data using the native driver's block insert.
+
+        The data is handed to the `clickhouse-driver` client directly, so no
+        SQLAlchemy statement is compiled and no per-row bind parameters are built.
+
+        Args:
+            full_table_name: the target table name.
+            column_names: the target column names.
+            columns: one list of values per column, in `column_names` order.
+
+        Returns:
+            The number of rows inserted.
+
+        """
+        quote = self._dialect.identifier_preparer.quote
+        insert_sql = (
+            f"INSERT INTO {full_table_name} "
+            f"({', '.join(quote(name) for name in column_names)}) VALUES"
+        )
+        with self._connect() as conn:
+            client = conn.connection.dbapi_connection.transport
+            return client.execute(
+                insert_sql,
+                columns,
+                columnar=True,
+                settings=self.insert_settings or None,
+            )
+
+    def get_column_type_names(self, full_table_name: str) -> dict[str, str]:
+        """Return the ClickHouse type name of each column in a table.
+
+        Args:
+            full_table_name: the target table name.
+
+        Returns:
+            A mapping of column name to type name, e.g. `Nullable(Date32)`.
+
+        """
+        with self._connect() as conn:
+            result = conn.execute(
+                sqlalchemy.text(f"DESCRIBE TABLE {full_table_name}"),
+            )
+            return {row.name: row.type for row in result}
+
+    def insert_rowbinary(
+        self,
+        full_table_name: str,
+        column_names: list[str],
+        body: bytes | typing.Iterable[bytes],
+    ) -> None:
+        """POST a RowBinary encoded insert body over the HTTP interface.
+
+        The request reuses the HTTP session, credentials and TLS options of a
+        pooled clickhouse-sqlalchemy connection. An iterable body is sent with
+        chunked transfer encoding, each chunk as soon as it is produced.
+
+        Args:
+            full_table_name: the target table name.
+            column_names: the target column names, in encoding order.
+            body: the RowBinary encoded rows, or chunks of them.
+
+        Raises:
+            DatabaseException: if the server rejects the insert.
+
+        """
+        quote = self._dialect.identifier_preparer.quote
+        insert_sql = (
+            f"INSERT INTO {full_table_name} "
+            f"({', '.join(quote(name) for name in column_names)}) FORMAT RowBinary"
+        )
+        with self._connect() as conn:
+            transport = conn.connection.dbapi_connection.transport
+            params = {
+                "database": transport.db_name,
+                **transport.ch_settings,
+                **self.insert_settings,
+            }
+            params["query"] = insert_sql
+            response = transport.http.post(
+                transport.db_url,
+                auth=transport.auth,
+                params=params,
+                data=body,
+                timeout=transport.timeout,
+                headers=transport.headers,
+                verify=transport.verify,
+                cert=transport.cert,
+            )
+        if response.status_code != 200:  # noqa: PLR2004
+            orig = HTTPException(response.text)
+            orig.code = response.status_code
+            raise DatabaseException(orig)
+
+    def insert_rows(
+        self,
+        full_table_name: str,
+        column_names: list[str],
+        rows: typing.Iterator[typing.Sequence],
+        block_size: int,
+    ) -> int:
+        """Insert rows from an iterable in native blocks of bounded size.
+
+        `clickhouse-driver` reads `block_size` rows at a time from the generator,
+        and sends each block before reading the next, so the rows are never all
+        in memory at once. All blocks are sent by a single INSERT query.
+
+        Args:
+            full_table_name: the target table name.
+            column_names: the target column names.
+            rows: a generator of value sequences, in `column_names` order.
+            block_size: the number of rows per block.
+
+        Returns:
+            The number of rows inserted.
+
+        """
+        quote = self._dialect.identifier_preparer.quote
+        insert_sql = (
+            f"INSERT INTO {full_table_name} "
+            f"({', '.join(quote(name) for name in column_names)}) VALUES"
+        )
+        with self._connect() as conn:
+            client = conn.connection.dbapi_connection.transport
+            return client.execute(
+                insert_sql,
+                rows,
+                settings={**self.insert_settings, "insert_block_size": block_size},
+            )
+
+    def table_exists(self, full_table_name: str) -> bool:
+        """Determine if the target table already exists, using the metadata cache.
+
+        Args:
+            full_table_name: the target table name.
+
+        Returns:
+            True if table exists, False if not.
+
+        """
+        exists = self.metadata_cache.get_table_exists(full_table_name)
+        if exists is None:
+            exists = super().table_exists(full_table_name)
+            self.metadata_cache.set_table_exists(full_table_name, exists)
+        return exists
+
+    def get_table_columns(
+        self,
+        full_table_name: str,
+        column_names: list[str] | None = None,
+    ) -> dict[str, Column]:
+        """Return the table columns, using the metadata cache.
+
+        Args:
+            full_table_name: Fully qualified table name.
+            column_names: A list of column names to filter to.
+
+        Returns:
+            An ordered dictionary of column objects.
+
+        """
+        columns = self.metadata_cache.get_columns(full_table_name)
+        if columns is None:
+            columns = super().get_table_columns(full_table_name)
+            self.metadata_cache.set_columns(full_table_name, columns)
+            columns = typing.cast(
+                typing.Dict[str, Column],
+                self.metadata_cache.get_columns(full_table_name),
+            )
+        if column_names:
+            names = {name.casefold() for name in column_names}
+            columns = {
+                name: column
+                for name, column in columns.items()
+                if name.casefold() in names
+            }
+        return columns
+
     def to_sql_type(
         self,
         jsonschema_type: dict,
@@ -87,15 +476,30 @@ class ClickhouseConnector(SQLConnector):
         Developers may override this method to accept additional input argument types,
         to support non-standard types, or to provide custom typing logic.
 
+        With `nested_types` enabled, arrays and objects get native `Array`, `Tuple`
+        and `Map` types where possible. With `narrow_types` enabled, integer,
+        decimal and string types are narrowed using the schema's bounds,
+        `multipleOf`, `enum` and `maxLength`. Date and time columns stay Nullable
+        even for required properties, since values that fail to parse are
+        loaded as NULL.
+
         Args:
             jsonschema_type: The JSON Schema representation of the source type.
+            **kwargs: `is_primary_key` flag of the property.
 
         Returns:
             The SQLAlchemy type representation of the data type.
 
         """
+        if self.config.get("nested_types", False):
+            nested_type = get_nested_sql_type(jsonschema_type)
+            if nested_type is not None:
+                return nested_type
+
         sql_type = th.to_sql_type(jsonschema_type)
         is_primary_key = kwargs.get("is_primary_key", False)
+        if self.config.get("narrow_types", False):
+            sql_type = narrow_sql_type(jsonschema_type, sql_type)
 
         # Clickhouse does not support the DECIMAL type without providing precision,
         # so we need to use the FLOAT type.
@@ -144,7 +548,8 @@ class ClickhouseConnector(SQLConnector):
             full_table_name: the target table name.
             schema: the JSON schema for the new table.
             primary_keys: list of key properties.
-            partition_keys: list of partition keys.
+            partition_keys: list of partition keys, used unless the table's
+                `table_layouts` entry sets `partition_by`.
             as_temp_table: True to create a temp table.
 
         Raises:
@@ -156,8 +561,6 @@ class ClickhouseConnector(SQLConnector):
             msg = "Temporary tables are not supported."
             raise NotImplementedError(msg)
 
-        _ = partition_keys  # Not supported in generic implementation.
-
         _, _, table_name = self.parse_full_table_name(full_table_name)
 
         # If config table name is set, then use it instead of the table name.
@@ -181,6 +584,8 @@ class ClickhouseConnector(SQLConnector):
         except KeyError as e:
             msg = f"Schema for '{full_table_name}' does not define properties: {schema}"
             raise RuntimeError(msg) from e
+        table_layout = self.get_table_layout(table_name, partition_keys)
+        codecs = table_layout.get("codecs") or {}
         for property_name, property_jsonschema in properties.items():
             is_primary_key = property_name in primary_keys
             sql_type = self.to_sql_type(
@@ -192,15 +597,42 @@ class ClickhouseConnector(SQLConnector):
                     property_name,
                     sql_type,
                     primary_key=is_primary_key,
+                    clickhouse_codec=codecs.get(property_name),
                 ),
             )
 
+        tombstone_columns = {}
+        if self.uses_tombstones(engine_type, primary_keys, table_layout):
+            # Tombstone rows supersede live rows with the same key in merges.
+            columns.extend(
+                [
+                    Column(
+                        TOMBSTONE_VERSION_COLUMN,
+                        clickhouse_sqlalchemy_types.UInt64,
+                        server_default=sqlalchemy.text(
+                            "toUnixTimestamp64Micro(now64(6))",
+                        ),
+                    ),
+                    Column(
+                        IS_DELETED_COLUMN,
+                        clickhouse_sqlalchemy_types.UInt8,
+                        server_default=sqlalchemy.text("0"),
+                    ),
+                ],
+            )
+            tombstone_columns = {
+                "version_column": TOMBSTONE_VERSION_COLUMN,
+                "is_deleted_column": IS_DELETED_COLUMN,
+            }
+
         table_engine = create_engine_wrapper(
             engine_type=engine_type,
             primary_keys=primary_keys,
             table_name=table_name,
             config=self.config,
             order_by_keys=self.config.get("order_by_keys"),
+            table_layout=table_layout,
+            **tombstone_columns,
         )
 
         table_args = {}
@@ -209,6 +641,700 @@ class ClickhouseConnector(SQLConnector):
 
         _ = Table(table_name, meta, *columns, table_engine, **table_args)
         meta.create_all(self._engine)
+        self.metadata_cache.invalidate(full_table_name)
+        if self.config.get("narrow_types", False) or self.config.get(
+            "codec_advisor",
+            False,
+        ):
+            self.sampled_tables.add(full_table_name)
+
+    @cached_property
+    def sampled_tables(self) -> set[str]:
+        """Return the new tables whose first batch has not been sampled yet."""
+        return set()
+
+    def sample_column_types(self, full_table_name: str, records: list[dict]) -> None:
+        """Adapt the columns of a new table to the data of its first batch.
+
+        With `narrow_types`, string columns with few distinct values become
+        LowCardinality. With `codec_advisor`, numeric, date and datetime columns
+        get the codec that compresses the batch best, unless the table layout
+        sets their codec. Only the first batch inserted into a table created by
+        this run is sampled, and altering the still empty table does not rewrite
+        any data.
+
+        Args:
+            full_table_name: the target table name.
+            records: the first batch of records.
+
+        """
+        try:
+            self.sampled_tables.remove(full_table_name)
+        except KeyError:
+            return
+
+        column_types = {
+            name: column.type
+            for name, column in self.get_table_columns(full_table_name).items()
+        }
+        new_types = {}
+        if self.config.get("narrow_types", False):
+            string_columns = [
+                name
+                for name, sql_type in column_types.items()
+                if str(sql_type) == "String"
+            ]
+            new_types = {
+                name: clickhouse_sqlalchemy_types.LowCardinality(
+                    clickhouse_sqlalchemy_types.String,
+                )
+                for name in get_low_cardinality_columns(records, string_columns)
+            }
+        codecs = {}
+        if self.config.get("codec_advisor", False):
+            _, _, table_name = self.parse_full_table_name(full_table_name)
+            codecs = advise_codecs(
+                records,
+                column_types,
+                skip=self.get_table_layout(table_name).get("codecs", {}),
+            )
+        if not new_types and not codecs:
+            return
+
+        self.logger.info(
+            "Adapting columns of '%s' to its first batch: types %s, codecs %s",
+            full_table_name,
+            {name: str(sql_type) for name, sql_type in new_types.items()},
+            codecs,
+        )
+        modify_columns = [
+            Column(
+                name,
+                new_types.get(name, sql_type),
+                clickhouse_codec=codecs.get(name),
+            )
+            for name, sql_type in column_types.items()
+            if name in new_types or name in codecs
+        ]
+        with self._connect() as conn, conn.begin():
+            conn.execute(
+                self.get_table_alter_ddl(full_table_name, [], modify_columns),
+            )
+        self.metadata_cache.invalidate(full_table_name)
+
+    def get_table_layout(
+        self,
+        table_name: str,
+        partition_keys: list[str] | None = None,
+    ) -> dict:
+        """Return the `table_layouts` entry of a table.
+
+        Args:
+            table_name: the table name, without the database.
+            partition_keys: columns to partition by if the layout does not set
+                `partition_by`.
+
+        Returns:
+            The table layout, empty if none is configured.
+
+        """
+        table_layouts = self.config.get("table_layouts") or {}
+        table_layout = dict(table_layouts.get(table_name) or {})
+        if partition_keys and not table_layout.get("partition_by"):
+            table_layout["partition_by"] = f"({', '.join(partition_keys)})"
+        return table_layout
+
+    def get_tombstone_fallback(
+        self,
+        engine_type: str,
+        primary_keys: list[str],
+        table_layout: dict,
+    ) -> str | None:
+        """Return how a table soft deletes if it cannot use tombstones.
+
+        Tombstones need a ReplacingMergeTree engine and key properties to identify
+        the rows they replace. Merges only collapse rows with the same sorting key,
+        so a `table_layouts` `order_by`, `order_by_keys` or layout `primary_key`
+        must not sort by other columns than the key properties.
+
+        Args:
+            engine_type: the table engine.
+            primary_keys: list of key properties.
+            table_layout: the table's `table_layouts` entry.
+
+        Returns:
+            `mutation` without a ReplacingMergeTree engine or key properties,
+            `lightweight` if the sorting key is not the key properties, and None
+            if the table can use tombstones.
+
+        """
+        if engine_type not in REPLACING_ENGINES or not primary_keys:
+            return "mutation"
+        sorting_key = (
+            table_layout.get("order_by")
+            or self.config.get("order_by_keys")
+            or table_layout.get("primary_key")
+            or primary_keys
+        )
+        if {key.strip().strip('`"') for key in sorting_key} != set(primary_keys):
+            return "lightweight"
+        return None
+
+    def uses_tombstones(
+        self,
+        engine_type: str,
+        primary_keys: list[str],
+        table_layout: dict | None = None,
+    ) -> bool:
+        """Return True if new tables get the columns for tombstone soft deletes.
+
+        Tombstones need `soft_delete_method: tombstone` and a table they can
+        collapse rows of, see `get_tombstone_fallback`.
+
+        Args:
+            engine_type: the table engine.
+            primary_keys: list of key properties.
+            table_layout: the table's `table_layouts` entry.
+
+        Returns:
+            True if the table is created with version and is_deleted columns.
+
+        """
+        if self.config.get("soft_delete_method") != "tombstone":
+            return False
+        fallback = self.get_tombstone_fallback(
+            engine_type,
+            primary_keys,
+            table_layout or {},
+        )
+        if fallback == "mutation":
+            self.logger.warning(
+                "Tombstone soft deletes need a ReplacingMergeTree engine and key "
+                "properties, using mutations instead.",
+            )
+        elif fallback == "lightweight":
+            self.logger.warning(
+                "Tombstone soft deletes need the sorting key to be the key "
+                "properties, using lightweight deletes instead.",
+            )
+        return fallback is None
+
+    def insert_tombstones(
+        self,
+        full_table_name: str,
+        version_column_name: str,
+        soft_delete_column_name: str,
+        version: int,
+    ) -> None:
+        """Soft delete the rows of older versions by inserting tombstone rows.
+
+        Every key whose latest row belongs to an older version, and is not deleted
+        yet, gets a copy of that row with the soft delete column set and
+        `is_deleted = 1`. Its newer row version makes merges drop the live row, so
+        no UPDATE mutation is needed.
+
+        Args:
+            full_table_name: the target table name.
+            version_column_name: the column holding each row's table version.
+            soft_delete_column_name: the column holding the deletion time.
+            version: rows with a lower version are deleted.
+
+        """
+        quote = self._dialect.identifier_preparer.quote
+        excluded = {TOMBSTONE_VERSION_COLUMN, IS_DELETED_COLUMN}
+        excluded.add(soft_delete_column_name)
+        copied_columns = ", ".join(
+            quote(name)
+            for name in self.get_table_columns(full_table_name)
+            if name not in excluded
+        )
+        self._execute_ddl(
+            f"INSERT INTO {full_table_name} "  # noqa: S608
+            f"({copied_columns}, {soft_delete_column_name}, {IS_DELETED_COLUMN}) "
+            f"SELECT {copied_columns}, now(), 1 FROM {full_table_name} FINAL "
+            f"WHERE {version_column_name} < {int(version)} "
+            f"AND {soft_delete_column_name} IS NULL AND {IS_DELETED_COLUMN} = 0",
+        )
+
+    def prepare_table(
+        self,
+        full_table_name: str,
+        schema: dict,
+        primary_keys: list[str],
+        partition_keys: list[str] | None = None,
+        as_temp_table: bool = False,
+    ) -> None:
+        """Adapt target table to provided schema if possible.
+
+        Conforming the table is skipped if it was already conformed to the same
+        schema during this run, e.g. when a tap re-sends a previous SCHEMA message.
+
+        Args:
+            full_table_name: the target table name.
+            schema: the JSON Schema for the table.
+            primary_keys: list of key properties.
+            partition_keys: list of partition keys, used unless the table's
+                `table_layouts` entry sets `partition_by`.
+            as_temp_table: True to create a temp table.
+
+        """
+        fingerprint = schema_fingerprint(schema, primary_keys)
+        # Overwrite recreates the table, so it is never skipped.
+        overwrite = self.config.get("load_method") == TargetLoadMethods.OVERWRITE
+        if not overwrite and self.metadata_cache.is_conformed(
+            full_table_name,
+            fingerprint,
+        ):
+            self.logger.debug(
+                "Table '%s' already conforms to the schema, skipping.",
+                full_table_name,
+            )
+            return
+
+        if overwrite or not self.table_exists(full_table_name):
+            super().prepare_table(
+                full_table_name=full_table_name,
+                schema=schema,
+                primary_keys=primary_keys,
+                partition_keys=partition_keys,
+                as_temp_table=as_temp_table,
+            )
+        else:
+            self.conform_table(full_table_name, schema)
+            self.prepare_primary_key(
+                full_table_name=full_table_name,
+                primary_keys=primary_keys,
+            )
+        self.metadata_cache.mark_conformed(full_table_name, fingerprint)
+
+    def conform_table(self, full_table_name: str, schema: dict) -> None:
+        """Add and modify the columns of an existing table to match a schema.
+
+        The schema diff is applied with a single ALTER TABLE statement, so a
+        clustered table gets one distributed DDL task instead of one per column.
+
+        Args:
+            full_table_name: the target table name.
+            schema: the JSON Schema for the table.
+
+        """
+        existing_columns = self.get_table_columns(full_table_name)
+        _, _, table_name = self.parse_full_table_name(full_table_name)
+        codecs = self.get_table_layout(table_name).get("codecs") or {}
+        add_columns: list[Column] = []
+        modify_columns: list[Column] = []
+        for property_name, property_def in schema["properties"].items():
+            sql_type = self.to_sql_type(property_def)
+            if property_name not in existing_columns:
+                add_columns.append(
+                    Column(
+                        property_name,
+                        sql_type,
+                        clickhouse_codec=codecs.get(property_name),
+                    ),
+                )
+                continue
+            with contextlib.suppress(NotImplementedError):
+                adapted_type = self._get_adapted_column_type(
+                    full_table_name,
+                    property_name,
+                    existing_columns[property_name].type,
+                    sql_type,
+                )
+                if adapted_type is not None:
+                    modify_columns.append(Column(property_name, adapted_type))
+
+        if not add_columns and not modify_columns:
+            return
+
+        self.logger.info(
+            "Altering table '%s': adding columns %s, modifying columns %s",
+            full_table_name,
+            [column.name for column in add_columns],
+            [column.name for column in modify_columns],
+        )
+        with self._connect() as conn, conn.begin():
+            conn.execute(
+                self.get_table_alter_ddl(full_table_name, add_columns, modify_columns),
+            )
+        self.metadata_cache.invalidate(full_table_name)
+
+    def get_table_alter_ddl(
+        self,
+        table_name: str,
+        add_columns: list[Column],
+        modify_columns: list[Column],
+    ) -> sqlalchemy.DDL:
+        """Get one ALTER TABLE statement adding and modifying several columns.
+
+        Args:
+            table_name: Fully qualified table name of the table to alter.
+            add_columns: Columns to add.
+            modify_columns: Columns to modify, with their new types and, if set
+                with `clickhouse_codec`, their new codecs.
+
+        Returns:
+            A sqlalchemy DDL instance.
+
+        """
+        dialect = self._dialect
+        quote = dialect.identifier_preparer.quote
+        clauses = [
+            "ADD COLUMN IF NOT EXISTS "
+            f"{sqlalchemy.schema.CreateColumn(column).compile(dialect=dialect)}"
+            for column in add_columns
+        ]
+        for column in modify_columns:
+            clause = (
+                f"MODIFY COLUMN {quote(column.name)} "
+                f"{column.type.compile(dialect=dialect)}"
+            )
+            codec = column.dialect_options["clickhouse"]["codec"]
+            if codec is not None:
+                clause += f" CODEC({codec})"
+            clauses.append(clause)
+        return sqlalchemy.DDL(
+            "ALTER TABLE %(table_name)s%(on_cluster)s %(clauses)s",
+            {
+                "table_name": table_name,
+                "on_cluster": self._on_cluster_clause(),
+                "clauses": ", ".join(clauses),
+            },
+        )
+
+    def _on_cluster_clause(self) -> str:
+        """Return the ON CLUSTER clause for DDL, or "" without `cluster_name`."""
+        if self.config.get("cluster_name"):
+            return f" ON CLUSTER {self.config.get('cluster_name')}"
+        return ""
+
+    def _execute_ddl(self, statement: str) -> None:
+        with self._connect() as conn, conn.begin():
+            conn.execute(sqlalchemy.text(statement))
+
+    def request_version_cleanup(
+        self,
+        full_table_name: str,
+        version_column_name: str,
+        version: int,
+    ) -> None:
+        """Schedule deleting rows older than a version, merged with earlier requests.
+
+        Args:
+            full_table_name: the target table name.
+            version_column_name: the column holding each row's table version.
+            version: rows with a lower version are deleted.
+
+        """
+        with self._cleanup_lock:
+            _, pending_version = self.pending_version_cleanups.get(
+                full_table_name,
+                (version_column_name, version),
+            )
+            self.pending_version_cleanups[full_table_name] = (
+                version_column_name,
+                max(version, pending_version),
+            )
+
+    def flush_version_cleanup(self, full_table_name: str) -> None:
+        """Delete the rows of old versions scheduled for a table, if any.
+
+        Uses a lightweight `DELETE FROM` with `delete_method: lightweight`, and an
+        `ALTER TABLE ... DELETE` mutation otherwise. With `mutation_wait_timeout`
+        set, waits for the table's mutations to finish.
+
+        Args:
+            full_table_name: the target table name.
+
+        """
+        with self._cleanup_lock:
+            cleanup = self.pending_version_cleanups.pop(full_table_name, None)
+        if cleanup is None:
+            return
+
+        version_column_name, version = cleanup
+        self.delete_old_versions(
+            full_table_name,
+            version_column_name,
+            version,
+            lightweight=self.config.get("delete_method", "mutation") == "lightweight",
+        )
+
+    def delete_old_versions(
+        self,
+        full_table_name: str,
+        version_column_name: str,
+        version: int,
+        *,
+        lightweight: bool = False,
+    ) -> None:
+        """Delete the rows of a table's versions older than a version.
+
+        Args:
+            full_table_name: the target table name.
+            version_column_name: the column holding each row's table version.
+            version: rows with a lower version are deleted.
+            lightweight: True for a lightweight `DELETE FROM`, False for an
+                `ALTER TABLE ... DELETE` mutation.
+
+        """
+        if lightweight:
+            statement = f"DELETE FROM {full_table_name}"  # noqa: S608
+        else:
+            statement = f"ALTER TABLE {full_table_name} DELETE"
+        self.logger.info(
+            "Deleting versions older than %s from '%s'.",
+            version,
+            full_table_name,
+        )
+        self._execute_ddl(
+            f"{statement} WHERE {version_column_name} < {int(version)}",
+        )
+        self.wait_for_mutations(full_table_name)
+
+    def get_pending_mutations(self, full_table_name: str) -> list[typing.Any]:
+        """Return the unfinished mutations of a table.
+
+        Args:
+            full_table_name: the table name.
+
+        Returns:
+            Rows with the `mutation_id`, `command` and `latest_fail_reason` of each
+            mutation that is not done.
+
+        """
+        _, database, table_name = self.parse_full_table_name(full_table_name)
+        query = sqlalchemy.text(
+            "SELECT mutation_id, command, latest_fail_reason FROM system.mutations "
+            "WHERE NOT is_done AND table = :table_name "
+            "AND database = coalesce(:database, currentDatabase())",
+        ).bindparams(table_name=table_name, database=database)
+        with self._connect() as conn:
+            return list(conn.execute(query))
+
+    def wait_for_mutations(self, full_table_name: str) -> bool:
+        """Wait up to `mutation_wait_timeout` seconds for a table's mutations.
+
+        Args:
+            full_table_name: the table name.
+
+        Returns:
+            True if no mutation is pending, False if the timeout was reached or
+            waiting is disabled.
+
+        """
+        timeout = self.config.get("mutation_wait_timeout") or 0
+        if timeout <= 0:
+            return False
+
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = self.get_pending_mutations(full_table_name)
+            if not pending:
+                return True
+            for mutation in pending:
+                if mutation.latest_fail_reason:
+                    self.logger.warning(
+                        "Mutation %s on '%s' is failing: %s",
+                        mutation.mutation_id,
+                        full_table_name,
+                        mutation.latest_fail_reason,
+                    )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.warning(
+                    "%d mutations on '%s' did not finish within %s seconds: %s",
+                    len(pending),
+                    full_table_name,
+                    timeout,
+                    [mutation.mutation_id for mutation in pending],
+                )
+                return False
+            time.sleep(min(MUTATION_POLL_INTERVAL, remaining))
+
+    @staticmethod
+    def get_staging_table_name(full_table_name: str) -> str:
+        """Return the name of the staging table used to refresh a table.
+
+        Args:
+            full_table_name: the target table name.
+
+        Returns:
+            The staging table name, in the same database as the target table.
+
+        """
+        return f"{full_table_name}{STAGING_TABLE_SUFFIX}"
+
+    def start_staging(self, full_table_name: str, version: int) -> None:
+        """Create an empty staging table with the target table's engine and layout.
+
+        A staging table left behind by an earlier, interrupted run is dropped.
+
+        Args:
+            full_table_name: the target table name.
+            version: the table version loaded into the staging table.
+
+        """
+        staging_table_name = self.get_staging_table_name(full_table_name)
+        self.drop_table(staging_table_name)
+        # The staging table copies the target's column types.
+        self.sampled_tables.discard(full_table_name)
+        self._execute_ddl(
+            f"CREATE TABLE {staging_table_name}{self._on_cluster_clause()} "
+            f"AS {full_table_name}",
+        )
+        self.staging_versions[full_table_name] = version
+
+    def finish_staging(self, full_table_name: str, refresh_mode: str) -> None:
+        """Replace the target table's data with the staging table's, atomically.
+
+        With `exchange` the two tables are swapped with EXCHANGE TABLES, which needs
+        an Atomic database. With `replace_partition` every staged partition replaces
+        the target's, and target partitions missing from the staging table are
+        dropped; each partition is replaced atomically. The staging table, then
+        holding the old data, is dropped.
+
+        Args:
+            full_table_name: the target table name.
+            refresh_mode: `exchange` or `replace_partition`.
+
+        """
+        staging_table_name = self.get_staging_table_name(full_table_name)
+        if refresh_mode == "exchange":
+            self._execute_ddl(
+                f"EXCHANGE TABLES {full_table_name} AND {staging_table_name}"
+                f"{self._on_cluster_clause()}",
+            )
+        else:
+            self.replace_partitions(full_table_name, staging_table_name)
+        self.drop_table(staging_table_name)
+        self.metadata_cache.invalidate(full_table_name)
+        self.activated_versions[full_table_name] = self.staging_versions.pop(
+            full_table_name,
+        )
+
+    def abandon_staging(self, full_table_name: str) -> None:
+        """Append the staged rows to the target table and drop the staging table.
+
+        Used when a stream ends without activating the staged version, so the
+        loaded rows are kept, as they are without a staging table.
+
+        Args:
+            full_table_name: the target table name.
+
+        """
+        staging_table_name = self.get_staging_table_name(full_table_name)
+        self._execute_ddl(
+            f"INSERT INTO {full_table_name} SELECT * FROM {staging_table_name}",  # noqa: S608
+        )
+        self.drop_table(staging_table_name)
+        del self.staging_versions[full_table_name]
+
+    def drop_table(self, full_table_name: str) -> None:
+        """Drop a table if it exists.
+
+        Args:
+            full_table_name: the table name.
+
+        """
+        self._execute_ddl(
+            f"DROP TABLE IF EXISTS {full_table_name}{self._on_cluster_clause()}",
+        )
+        self.metadata_cache.invalidate(full_table_name)
+
+    def get_partition_ids(self, full_table_name: str) -> list[str]:
+        """Return the IDs of the partitions with active parts in a table.
+
+        Args:
+            full_table_name: the table name.
+
+        Returns:
+            The partition IDs, e.g. `["all"]` for an unpartitioned table.
+
+        """
+        _, database, table_name = self.parse_full_table_name(full_table_name)
+        query = sqlalchemy.text(
+            "SELECT DISTINCT partition_id FROM system.parts "
+            "WHERE active AND table = :table_name "
+            "AND database = coalesce(:database, currentDatabase())",
+        ).bindparams(table_name=table_name, database=database)
+        with self._connect() as conn:
+            return sorted(row.partition_id for row in conn.execute(query))
+
+    def get_partition_stats(self, full_table_name: str) -> dict[str, tuple[int, int]]:
+        """Return the active part count and highest block number of each partition.
+
+        Args:
+            full_table_name: the table name.
+
+        Returns:
+            `(active_parts, max_block_number)` by partition ID. Block numbers only
+            grow, so a partition with a higher block number received new parts.
+
+        """
+        _, database, table_name = self.parse_full_table_name(full_table_name)
+        query = sqlalchemy.text(
+            "SELECT partition_id, count() AS active_parts, "
+            "max(max_block_number) AS max_block_number FROM system.parts "
+            "WHERE active AND table = :table_name "
+            "AND database = coalesce(:database, currentDatabase()) "
+            "GROUP BY partition_id",
+        ).bindparams(table_name=table_name, database=database)
+        with self._connect() as conn:
+            return {
+                row.partition_id: (int(row.active_parts), int(row.max_block_number))
+                for row in conn.execute(query)
+            }
+
+    def optimize_partition(
+        self,
+        full_table_name: str,
+        partition_id: str,
+        *,
+        final: bool = False,
+    ) -> None:
+        """Merge the parts of one partition of a table.
+
+        Args:
+            full_table_name: the table name.
+            partition_id: the partition ID, as in `system.parts`.
+            final: also merge partitions that are already a single part.
+
+        """
+        self._execute_ddl(
+            f"OPTIMIZE TABLE {full_table_name}{self._on_cluster_clause()} "
+            f"PARTITION ID {_quote_string(partition_id)}"
+            f"{' FINAL' if final else ''}",
+        )
+
+    @cached_property
+    def optimize_scheduler(self) -> OptimizeScheduler:
+        """Return the scheduler of background OPTIMIZE runs, for `optimize_after`."""
+        return OptimizeScheduler(self)
+
+    def replace_partitions(self, full_table_name: str, source_table_name: str) -> None:
+        """Replace all partitions of a table with the partitions of another table.
+
+        Args:
+            full_table_name: the table whose data is replaced.
+            source_table_name: the table holding the new data.
+
+        """
+        source_partition_ids = self.get_partition_ids(source_table_name)
+        clauses = [
+            f"REPLACE PARTITION ID {_quote_string(partition_id)} "
+            f"FROM {source_table_name}"
+            for partition_id in source_partition_ids
+        ]
+        clauses.extend(
+            f"DROP PARTITION ID {_quote_string(partition_id)}"
+            for partition_id in self.get_partition_ids(full_table_name)
+            if partition_id not in source_partition_ids
+        )
+        for clause in clauses:
+            self._execute_ddl(
+                f"ALTER TABLE {full_table_name}{self._on_cluster_clause()} {clause}",
+            )
 
     def prepare_schema(self, _: str) -> None:
         """Create the target database schema.
@@ -250,6 +1376,101 @@ class ClickhouseConnector(SQLConnector):
                 sql_type=sql_type,
             )
 
+    def _create_empty_column(
+        self,
+        full_table_name: str,
+        column_name: str,
+        sql_type: sqlalchemy.types.TypeEngine,
+    ) -> None:
+        """Create a new column, then drop the table's cached metadata.
+
+        Args:
+            full_table_name: The target table name.
+            column_name: The name of the new column.
+            sql_type: SQLAlchemy type engine to be used in creating the new column.
+
+        """
+        super()._create_empty_column(
+            full_table_name=full_table_name,
+            column_name=column_name,
+            sql_type=sql_type,
+        )
+        self.metadata_cache.invalidate(full_table_name)
+
+    def _adapt_column_type(
+        self,
+        full_table_name: str,
+        column_name: str,
+        sql_type: sqlalchemy.types.TypeEngine,
+    ) -> None:
+        """Adapt table column type to support the new JSON schema type.
+
+        The cached column type is compared first, so the table's cached metadata is
+        only dropped when a MODIFY COLUMN is actually issued.
+
+        Args:
+            full_table_name: The target table name.
+            column_name: The target column name.
+            sql_type: The new SQLAlchemy type.
+
+        """
+        adapted_type = self._get_adapted_column_type(
+            full_table_name,
+            column_name,
+            self._get_column_type(full_table_name, column_name),
+            sql_type,
+        )
+        if adapted_type is None:
+            return
+
+        alter_column_ddl = self.get_column_alter_ddl(
+            table_name=full_table_name,
+            column_name=column_name,
+            column_type=adapted_type,
+        )
+        with self._connect() as conn, conn.begin():
+            conn.execute(alter_column_ddl)
+        self.metadata_cache.invalidate(full_table_name)
+
+    def _get_adapted_column_type(
+        self,
+        full_table_name: str,
+        column_name: str,
+        current_type: sqlalchemy.types.TypeEngine,
+        sql_type: sqlalchemy.types.TypeEngine,
+    ) -> sqlalchemy.types.TypeEngine | None:
+        """Return the type a column must be altered to, or None if it fits already.
+
+        Args:
+            full_table_name: The target table name.
+            column_name: The target column name.
+            current_type: The current column type.
+            sql_type: The type required by the new schema.
+
+        Returns:
+            The compatible column type, or None if no change is needed.
+
+        Raises:
+            NotImplementedError: if altering columns is not supported.
+
+        """
+        if str(sql_type) == str(current_type):
+            return None
+        compatible_type = widen_narrow_type(
+            current_type,
+            sql_type,
+        ) or self.merge_sql_types([current_type, sql_type])
+        if str(compatible_type) == str(current_type):
+            return None
+        if not self.allow_column_alter:
+            msg = (
+                "Altering columns is not supported. Could not convert column "
+                f"'{full_table_name}.{column_name}' from '{current_type}' to "
+                f"'{compatible_type}'."
+            )
+            raise NotImplementedError(msg)
+        return compatible_type
+
     @staticmethod
     def get_column_add_ddl(
         table_name: str,
@@ -309,7 +1530,7 @@ class ClickhouseConnector(SQLConnector):
             return sqlalchemy.DDL(
                 (
                     "ALTER TABLE %(table_name)s ON CLUSTER %(cluster_name)s "
-                    "MODIFY COLUMN %(column_name)s %(column_type)s",
+                    "MODIFY COLUMN %(column_name)s %(column_type)s"
                 ),
                 {
                     "table_name": table_name,
@@ -326,3 +1547,14 @@ class ClickhouseConnector(SQLConnector):
                 "column_type": column_type,
             },
         )
+
+
+def _quote_string(value: str) -> str:
+    """Return a ClickHouse string literal."""
+    escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def _enable_http_compression(dbapi_connection: typing.Any, *_: object) -> None:  # noqa: ANN401
+    """Ask the server for compressed responses on a new http connection."""
+    dbapi_connection.transport.ch_settings["enable_http_compression"] = 1
@@ -0,0 +1,121 @@
+"""Vectorized, batch-level parsing of date and datetime columns.
+
+Requires the optional `numpy` dependency. Values NumPy cannot parse faithfully
+(e.g. non-UTC offsets, empty strings or out of range dates) are handed to the
+per-value parser, so invalid values are repaired exactly as in record mode.
+"""
+
+from __future__ import annotations
+
+import datetime
+from logging import Logger
+
+from singer_sdk.helpers._typing import DatetimeErrorTreatmentEnum
+
+from target_clickhouse.transform_plan import parse_datelike_value
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# Shortest string accepted as a date or datetime, e.g. `2024-03-15`.
+ISO_DATE_LENGTH = 10
+
+DATETIME64_RANGES = {
+    "D": ("0001-01-01", "9999-12-31"),
+    "us": ("0001-01-01T00:00:00", "9999-12-31T23:59:59.999999"),
+}
+
+
+def numpy_available() -> bool:
+    """Return True if NumPy can be imported."""
+    return np is not None
+
+
+def _to_datetime64(values: np.ndarray, unit: str) -> np.ndarray | None:
+    """Convert strings to `datetime64`, or None if any value cannot be parsed."""
+    try:
+        return values.astype(f"datetime64[{unit}]")
+    except ValueError:
+        return None
+
+
+def parse_datelike_column(
+    records: list[dict],
+    key: str,
+    datelike_type: str,
+    treatment: DatetimeErrorTreatmentEnum,
+    logger: Logger,
+) -> None:
+    """Parse one date or datetime property across a batch of records, in place.
+
+    Args:
+        records: The batch of records.
+        key: The property name.
+        datelike_type: One of "date", "date-time" or "time".
+        treatment: How to repair out of range values: MAX, NULL or ERROR.
+        logger: Logger to use for logging.
+
+    """
+    positions = [
+        i for i, record in enumerate(records) if isinstance(record.get(key), str)
+    ]
+    if not positions:
+        return
+
+    valid = None
+    if datelike_type in ("date", "date-time"):
+        raw = np.array([records[i][key] for i in positions], dtype=str)
+        utc = np.zeros(len(raw), dtype=bool)
+        if datelike_type == "date":
+            unit = "D"
+            trimmed = np.char.find(raw, "T") >= 0
+            if trimmed.any():
+                logger.warning(
+                    "Trimmed time value from %d values of date field '%s'",
+                    int(np.count_nonzero(trimmed)),
+                    key,
+                )
+            values = np.char.partition(raw, "T")[:, 0]
+            well_formed = np.char.str_len(values) == ISO_DATE_LENGTH
+        else:
+            unit = "us"
+            zulu = np.char.endswith(raw, "Z")
+            utc_offset = np.char.endswith(raw, "+00:00")
+            utc = zulu | utc_offset
+            values = np.where(zulu, np.char.rstrip(raw, "Z"), raw)
+            values = np.where(utc_offset, np.char.rpartition(values, "+")[:, 0], values)
+            # Any other offset is left to the per-value parser.
+            has_offset = (np.char.rfind(values, "+") >= ISO_DATE_LENGTH) | (
+                np.char.rfind(values, "-") >= ISO_DATE_LENGTH
+            )
+            well_formed = (np.char.str_len(values) >= ISO_DATE_LENGTH) & ~has_offset
+
+        parsed = _to_datetime64(np.where(well_formed, values, "NaT"), unit)
+        if parsed is not None:
+            lower, upper = DATETIME64_RANGES[unit]
+            valid = (
+                well_formed
+                & ~np.isnat(parsed)
+                & (parsed >= np.datetime64(lower, unit))
+                & (parsed <= np.datetime64(upper, unit))
+            )
+            converted = parsed.astype(object)
+
+    for j, i in enumerate(positions):
+        record = records[i]
+        if valid is not None and valid[j]:
+            value = converted[j]
+            if utc[j]:
+                value = value.replace(tzinfo=datetime.timezone.utc)
+            record[key] = value
+        else:
+            record[key] = parse_datelike_value(
+                record,
+                key,
+                record[key],
+                datelike_type,
+                treatment,
+                logger,
+            )
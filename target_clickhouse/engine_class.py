@@ -1,9 +1,11 @@
 from enum import Enum
 from string import Template
-from typing import List, Optional
+from typing import Any, List, Optional
 
 from clickhouse_sqlalchemy import engines
-from sqlalchemy import func
+from clickhouse_sqlalchemy.engines.base import TableCol
+from clickhouse_sqlalchemy.engines.replicated import ReplicatedEngineMixin
+from sqlalchemy import func, text
 
 
 class SupportedEngines(str, Enum):
@@ -17,15 +19,74 @@ class SupportedEngines(str, Enum):
     REPLICATED_AGGREGATING_MERGE_TREE = "ReplicatedAggregatingMergeTree"
 
 
+class IsDeletedMixin:
+    """Adds the `is_deleted` column parameter of ReplacingMergeTree engines.
+
+    Rows whose latest version has `is_deleted = 1` are removed by merges, and
+    hidden by `FINAL`. clickhouse-sqlalchemy only supports the version column.
+    """
+
+    is_deleted_col: Optional[TableCol] = None
+
+    def _init_is_deleted(self, is_deleted: Optional[str]) -> None:
+        if is_deleted is not None:
+            self.is_deleted_col = TableCol(is_deleted)
+
+    def _set_parent(self, table, **kwargs):
+        super()._set_parent(table, **kwargs)
+        if self.is_deleted_col is not None:
+            self.is_deleted_col._set_parent(table, **kwargs)  # noqa: SLF001
+
+    def _replacing_parameters(self):
+        if self.is_deleted_col is None:
+            return engines.ReplacingMergeTree.get_parameters(self)
+        return [self.version_col.get_column(), self.is_deleted_col.get_column()]
+
+
+class ReplacingMergeTree(IsDeletedMixin, engines.ReplacingMergeTree):
+    """`ReplacingMergeTree(version, is_deleted)` engine."""
+
+    def __init__(self, *args: Any, is_deleted: Optional[str] = None, **kwargs) -> None:
+        """Create the engine, see `engines.ReplacingMergeTree`."""
+        super().__init__(*args, **kwargs)
+        self._init_is_deleted(is_deleted)
+
+    def get_parameters(self):
+        """Return the engine parameters."""
+        return self._replacing_parameters()
+
+
+class ReplicatedReplacingMergeTree(
+    IsDeletedMixin,
+    engines.ReplicatedReplacingMergeTree,
+):
+    """`ReplicatedReplacingMergeTree(path, replica, version, is_deleted)` engine."""
+
+    def __init__(self, *args: Any, is_deleted: Optional[str] = None, **kwargs) -> None:
+        """Create the engine, see `engines.ReplicatedReplacingMergeTree`."""
+        super().__init__(*args, **kwargs)
+        self._init_is_deleted(is_deleted)
+
+    def get_parameters(self):
+        """Return the engine parameters."""
+        return self.extend_parameters(
+            ReplicatedEngineMixin.get_parameters(self),
+            self._replacing_parameters(),
+        )
+
+
+REPLACING_ENGINES = (
+    SupportedEngines.REPLACING_MERGE_TREE,
+    SupportedEngines.REPLICATED_REPLACING_MERGE_TREE,
+)
+
 ENGINE_MAPPING = {
     SupportedEngines.MERGE_TREE: engines.MergeTree,
-    SupportedEngines.REPLACING_MERGE_TREE: engines.ReplacingMergeTree,
+    SupportedEngines.REPLACING_MERGE_TREE: ReplacingMergeTree,
     SupportedEngines.SUMMING_MERGE_TREE: engines.SummingMergeTree,
     SupportedEngines.AGGREGATING_MERGE_TREE: engines.AggregatingMergeTree,
     SupportedEngines.REPLICATED_MERGE_TREE: engines.ReplicatedMergeTree,
-    SupportedEngines.REPLICATED_REPLACING_MERGE_TREE: (
-        engines.ReplicatedReplacingMergeTree
-    ),
+    SupportedEngines.REPLICATED_REPLACING_MERGE_TREE: ReplicatedReplacingMergeTree,
     SupportedEngines.REPLICATED_SUMMING_MERGE_TREE: engines.ReplicatedSummingMergeTree,
     SupportedEngines.REPLICATED_AGGREGATING_MERGE_TREE: (
         engines.ReplicatedAggregatingMergeTree
@@ -41,12 +102,47 @@ def get_engine_class(engine_type):
     return ENGINE_MAPPING.get(engine_type)
 
 
-def create_engine_wrapper(
+def get_table_layout_args(table_layout: Optional[dict]) -> dict:
+    """Return MergeTree engine arguments for a table layout.
+
+    Args:
+        table_layout: `partition_by`, `order_by`, `primary_key` and `ttl` SQL
+            expressions, and table `settings`, all optional.
+
+    Returns:
+        The `partition_by`, `order_by`, `primary_key` and `ttl` arguments, and one
+        argument per setting, for the layout entries that are set.
+
+    """
+    if not table_layout:
+        return {}
+
+    layout_args: dict = {}
+    if table_layout.get("partition_by"):
+        layout_args["partition_by"] = text(table_layout["partition_by"])
+    for key in ("order_by", "primary_key", "ttl"):
+        if table_layout.get(key):
+            layout_args[key] = [text(expression) for expression in table_layout[key]]
+    for name, value in (table_layout.get("settings") or {}).items():
+        if isinstance(value, bool):
+            layout_args[name] = int(value)
+        elif isinstance(value, str):
+            escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+            layout_args[name] = f"'{escaped}'"
+        else:
+            layout_args[name] = value
+    return layout_args
+
+
+def create_engine_wrapper(  # noqa: PLR0913, PLR0912
     engine_type,
     primary_keys: List[str],
     table_name: str,
     config: Optional[dict] = None,
     order_by_keys: Optional[List[str]] = None,
+    version_column: Optional[str] = None,
+    is_deleted_column: Optional[str] = None,
+    table_layout: Optional[dict] = None,
 ):
     # check if engine type is in supported engines
     if is_supported_engine(engine_type) is False:
@@ -54,38 +150,48 @@ def create_engine_wrapper(
         raise ValueError(msg)
 
     engine_args: dict = {}
-    if len(primary_keys) > 0:
-        engine_args["primary_key"] = primary_keys
-    else:
-        # If no primary keys are specified,
-        # then Clickhouse expects the data to be indexed on all fields via tuple().
-        engine_args["order_by"] = func.tuple()
-
-    if order_by_keys is not None:
+    layout_args = get_table_layout_args(table_layout)
+    # A layout's sorting and primary keys replace the key properties, and its
+    # sorting key replaces order_by_keys.
+    if "primary_key" not in layout_args and "order_by" not in layout_args:
+        if len(primary_keys) > 0:
+            engine_args["primary_key"] = primary_keys
+        else:
+            # If no primary keys are specified,
+            # then Clickhouse expects the data to be indexed on all fields via tuple().
+            engine_args["order_by"] = func.tuple()
+
+    if order_by_keys is not None and "order_by" not in layout_args:
         engine_args["order_by"] = order_by_keys
-
-    if config is not None:
-        if engine_type in (
-            SupportedEngines.REPLICATED_MERGE_TREE,
-            SupportedEngines.REPLICATED_REPLACING_MERGE_TREE,
-            SupportedEngines.REPLICATED_SUMMING_MERGE_TREE,
-            SupportedEngines.REPLICATED_AGGREGATING_MERGE_TREE,
-        ):
-            table_path: Optional[str] = config.get("table_path")
-            if table_path is not None:
-                if "$" in table_path:
-                    table_path = Template(table_path).substitute(table_name=table_name)
-                engine_args["table_path"] = table_path
-            else:
-                msg = "Table path (table_path) is not defined."
-                raise ValueError(msg)
-            replica_name: Optional[str] = config.get("replica_name")
-            if replica_name is not None:
-                engine_args["replica_name"] = replica_name
-            else:
-                msg = "Replica name (replica_name) is not defined."
-                raise ValueError(msg)
-
-        engine_class = get_engine_class(engine_type)
+    engine_args.update(layout_args)
+
+    if engine_type in REPLACING_ENGINES:
+        if version_column is not None:
+            engine_args["version"] = version_column
+        if is_deleted_column is not None:
+            engine_args["is_deleted"] = is_deleted_column
+
+    if config is not None and engine_type in (
+        SupportedEngines.REPLICATED_MERGE_TREE,
+        SupportedEngines.REPLICATED_REPLACING_MERGE_TREE,
+        SupportedEngines.REPLICATED_SUMMING_MERGE_TREE,
+        SupportedEngines.REPLICATED_AGGREGATING_MERGE_TREE,
+    ):
+        table_path: Optional[str] = config.get("table_path")
+        if table_path is not None:
+            if "$" in table_path:
+                table_path = Template(table_path).substitute(table_name=table_name)
+            engine_args["table_path"] = table_path
+        else:
+            msg = "Table path (table_path) is not defined."
+            raise ValueError(msg)
+        replica_name: Optional[str] = config.get("replica_name")
+        if replica_name is not None:
+            engine_args["replica_name"] = replica_name
+        else:
+            msg = "Replica name (replica_name) is not defined."
+            raise ValueError(msg)
+
+    engine_class = get_engine_class(engine_type)
 
     return engine_class(**engine_args)
@@ -0,0 +1,93 @@
+"""A deadline for buffered records, enforced while the tap is idle.
+
+The SDK only checks the age of buffered records after a RECORD or BATCH
+message, so a stream that goes idle keeps its batch until the next message or
+the end of input. With `max_batch_latency`, `DrainTimer` checks the deadline on
+a background thread, and drains the sinks itself when it passes.
+
+Messages are processed while holding the timer's lock, which is released only
+while waiting for the next line, so drains by the timer never overlap the
+processing of a message.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Iterable, Iterator
+
+# Most seconds between deadline checks.
+MAX_CHECK_INTERVAL = 1.0
+
+
+class DrainTimer:
+    """Calls a check every interval, between the processing of messages."""
+
+    def __init__(self, latency: float, check: Callable[[], None]) -> None:
+        """Create a timer. Checks start with `start`.
+
+        Args:
+            latency: The `max_batch_latency` in seconds.
+            check: Drains the sinks if the deadline passed. Runs on the timer's
+                thread while holding `lock`.
+
+        """
+        self.interval = min(MAX_CHECK_INTERVAL, latency / 4)
+        self.check = check
+        self.lock = threading.Lock()
+        self.error: BaseException | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start checking, unless already started."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name="drain-timer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop checking, waiting for a running check to finish."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def locked_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """Yield input lines, holding the lock until the next line is requested.
+
+        Args:
+            lines: The input lines.
+
+        Yields:
+            The lines.
+
+        Raises:
+            BaseException: the error a drain by the timer failed with.
+
+        """
+        for line in lines:
+            with self.lock:
+                if self.error is not None:
+                    raise self.error
+                yield line
+        if self.error is not None:
+            raise self.error
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            # Skip a check rather than wait for a message being processed.
+            if not self.lock.acquire(timeout=self.interval):
+                continue
+            try:
+                self.check()
+            except BaseException as e:  # noqa: BLE001
+                # Raised on the main thread, with the next line or at the end.
+                self.error = e
+                return
+            finally:
+                self.lock.release()
@@ -0,0 +1,92 @@
+"""Target-wide accounting of the memory held by buffered records.
+
+With `memory_budget` set, each sink reports the approximate size of its pending
+batch after every record: its record count times the average in-memory size of
+one in `RECORD_SAMPLE_INTERVAL` records, measured with `sys.getsizeof`. When the
+total over all sinks exceeds the budget, TargetClickhouse drains the sinks with
+the largest batches first, until the total is back within the budget.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from typing import Any, Hashable
+
+
+def record_memory_size(record: Any) -> int:  # noqa: ANN401
+    """Return the approximate memory size of a record, including nested values.
+
+    Args:
+        record: A record, or a value in one.
+
+    Returns:
+        The size in bytes of the object and of the keys and values it contains.
+
+    """
+    size = sys.getsizeof(record)
+    if isinstance(record, dict):
+        for key, value in record.items():
+            size += sys.getsizeof(key) + record_memory_size(value)
+    elif isinstance(record, (list, tuple)):
+        for value in record:
+            size += record_memory_size(value)
+    return size
+
+
+class MemoryAccountant:
+    """Tracks the bytes held by the pending batch of each sink."""
+
+    def __init__(self, budget: int | None = None) -> None:
+        """Create an accountant with nothing held.
+
+        Args:
+            budget: The bytes all sinks may hold before the largest are drained,
+                None for no limit.
+
+        """
+        self.budget = budget or None
+        self.held_bytes = 0
+        self.peak_bytes = 0
+        # Sinks drained early to stay within the budget.
+        self.budget_drains = 0
+        self._held: dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if a budget is set."""
+        return self.budget is not None
+
+    @property
+    def over_budget(self) -> bool:
+        """Return True if the sinks hold more than the budget."""
+        return self.budget is not None and self.held_bytes > self.budget
+
+    def set(self, sink: Hashable, size: int) -> None:
+        """Set the bytes held by a sink.
+
+        Args:
+            sink: The sink.
+            size: The approximate size of its pending batch.
+
+        """
+        with self._lock:
+            self.held_bytes += size - self._held.get(sink, 0)
+            self._held[sink] = size
+            self.peak_bytes = max(self.peak_bytes, self.held_bytes)
+
+    def release(self, sink: Hashable) -> None:
+        """Forget the bytes held by a sink, after its batch was drained.
+
+        Args:
+            sink: The sink.
+
+        """
+        with self._lock:
+            self.held_bytes -= self._held.pop(sink, 0)
+
+    def largest_first(self) -> list[Hashable]:
+        """Return the sinks holding bytes, the largest batch first."""
+        with self._lock:
+            return sorted(self._held, key=self._held.__getitem__, reverse=True)
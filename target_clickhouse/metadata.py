@@ -0,0 +1,121 @@
+"""Per-run cache of table metadata for ClickhouseConnector.
+
+Table existence and column types are looked up once per run and kept until the
+connector changes the table itself, e.g. with CREATE TABLE, ADD COLUMN or
+MODIFY COLUMN. Tables are assumed not to be altered by other clients while the
+target runs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from typing import Sequence
+
+import sqlalchemy
+
+
+def schema_fingerprint(schema: dict, primary_keys: Sequence[str] | None) -> str:
+    """Return a stable fingerprint of a table schema and its primary keys.
+
+    Args:
+        schema: The conformed JSON schema of the table.
+        primary_keys: The key properties.
+
+    Returns:
+        A hex digest, equal for schemas that differ only in key order.
+
+    """
+    payload = json.dumps(
+        [schema, list(primary_keys or [])],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MetadataCache:
+    """Table existence, column types and conformed schemas, keyed by table name."""
+
+    def __init__(self) -> None:
+        """Create an empty cache."""
+        self._lock = threading.Lock()
+        self._tables: dict[str, bool] = {}
+        # Column type and nullability, by column name.
+        self._columns: dict[
+            str,
+            dict[str, tuple[sqlalchemy.types.TypeEngine, bool]],
+        ] = {}
+        self._fingerprints: dict[str, set[str]] = {}
+
+    def get_table_exists(self, full_table_name: str) -> bool | None:
+        """Return whether the table exists, or None if it is not cached."""
+        with self._lock:
+            return self._tables.get(full_table_name)
+
+    def set_table_exists(self, full_table_name: str, exists: bool) -> None:
+        """Cache whether the table exists."""
+        with self._lock:
+            self._tables[full_table_name] = exists
+
+    def get_columns(self, full_table_name: str) -> dict[str, sqlalchemy.Column] | None:
+        """Return new column objects for the cached columns of a table.
+
+        Args:
+            full_table_name: the target table name.
+
+        Returns:
+            The columns by name, or None if they are not cached.
+
+        """
+        with self._lock:
+            columns = self._columns.get(full_table_name)
+        if columns is None:
+            return None
+        # Column objects are attached to a table when used, so they are not shared.
+        return {
+            name: sqlalchemy.Column(name, sql_type, nullable=nullable)
+            for name, (sql_type, nullable) in columns.items()
+        }
+
+    def set_columns(
+        self,
+        full_table_name: str,
+        columns: dict[str, sqlalchemy.Column],
+    ) -> None:
+        """Cache the columns of a table.
+
+        Args:
+            full_table_name: the target table name.
+            columns: the columns by name.
+
+        """
+        with self._lock:
+            self._columns[full_table_name] = {
+                name: (column.type, bool(column.nullable))
+                for name, column in columns.items()
+            }
+            self._tables[full_table_name] = True
+
+    def is_conformed(self, full_table_name: str, fingerprint: str) -> bool:
+        """Return True if the table was already conformed to a schema fingerprint."""
+        with self._lock:
+            return fingerprint in self._fingerprints.get(full_table_name, ())
+
+    def mark_conformed(self, full_table_name: str, fingerprint: str) -> None:
+        """Record that the table has been conformed to a schema fingerprint."""
+        with self._lock:
+            self._fingerprints.setdefault(full_table_name, set()).add(fingerprint)
+
+    def invalidate(self, full_table_name: str) -> None:
+        """Forget everything cached about a table.
+
+        Args:
+            full_table_name: the target table name.
+
+        """
+        with self._lock:
+            self._tables.pop(full_table_name, None)
+            self._columns.pop(full_table_name, None)
+            self._fingerprints.pop(full_table_name, None)
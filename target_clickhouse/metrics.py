@@ -0,0 +1,473 @@
+"""Per-table performance metrics for ClickhouseSink, and their export.
+
+Each batch is logged as Singer SDK `METRIC` lines: its record count and inserted
+bytes, the network insert time, and the time spent in each stage since the
+previous batch. The totals, an insert latency histogram and the connection pool
+counters can also be exported in the OpenMetrics text format, to a file read by
+e.g. the node_exporter textfile collector (`metrics_textfile`), or from a local
+HTTP scrape endpoint (`metrics_port`).
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import enum
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from singer_sdk.metrics import Point, get_metrics_logger, log
+
+if TYPE_CHECKING:
+    from target_clickhouse.memory import MemoryAccountant
+    from target_clickhouse.pool import PoolMetrics
+
+# Stages timed for each table, in the order they happen.
+# - validate: JSON schema validation of records.
+# - coerce: string coercion, date parsing and nested value encoding of records.
+# - serialize: preparing batches for insert, e.g. RowBinary encoding.
+# - insert: sending inserts, including serialization done by the driver.
+# - alter: table creation and schema changes, type sampling and version cleanup.
+# - optimize: OPTIMIZE statements, run in the background.
+STAGES = ("validate", "coerce", "serialize", "insert", "alter", "optimize")
+
+# Upper bounds of the insert latency histogram buckets, in seconds.
+INSERT_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_PREFIX = "target_clickhouse"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# The metrics endpoint is only reachable locally, unless `metrics_host` is set.
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
+class ClickhouseMetric(str, enum.Enum):
+    """Metrics logged by ClickhouseSink for each batch."""
+
+    BATCH_RECORD_COUNT = "batch_record_count"
+    BATCH_BYTES = "batch_bytes"
+    BATCH_WIRE_BYTES = "batch_wire_bytes"
+    INSERT_DURATION = "insert_duration"
+    STAGE_DURATION = "stage_duration"
+
+
+@dataclass
+class Histogram:
+    """Cumulative histogram of observed values."""
+
+    buckets: tuple[float, ...] = INSERT_LATENCY_BUCKETS
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        """Create a count per bucket, and one for values above the last bucket."""
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        """Count a value in its bucket.
+
+        Args:
+            value: The observed value.
+
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list[tuple[str, int]]:
+        """Return the number of values up to each bucket bound, and `+Inf`."""
+        bounds = [str(bucket) for bucket in self.buckets] + ["+Inf"]
+        cumulative, counts = 0, []
+        for bound, count in zip(bounds, self.counts):
+            cumulative += count
+            counts.append((bound, cumulative))
+        return counts
+
+
+@dataclass
+class TableMetrics:
+    """Counters and stage timings of one target table."""
+
+    table: str
+    stream: str | None = None
+    records: int = 0
+    bytes: int = 0
+    wire_bytes: int = 0
+    batches: int = 0
+    stage_seconds: dict[str, float] = field(
+        default_factory=lambda: dict.fromkeys(STAGES, 0.0),
+    )
+    insert_latency: Histogram = field(default_factory=Histogram)
+    # Stage totals when the previous batch was logged.
+    _logged_seconds: dict[str, float] = field(
+        default_factory=lambda: dict.fromkeys(STAGES, 0.0),
+        repr=False,
+    )
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock,
+        repr=False,
+        compare=False,
+    )
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """Add time spent in a stage.
+
+        Args:
+            stage: One of `STAGES`.
+            seconds: The time spent.
+
+        """
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Add the time spent in the context to a stage.
+
+        Args:
+            stage: One of `STAGES`.
+
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def observe_insert(self, seconds: float) -> None:
+        """Record the latency of one network insert.
+
+        Args:
+            seconds: The time the insert took.
+
+        """
+        with self._lock:
+            self.stage_seconds["insert"] += seconds
+            self.insert_latency.observe(seconds)
+
+    def batch_inserted(
+        self,
+        records: int,
+        size: int,
+        insert_seconds: float,
+        wire_size: int | None = None,
+    ) -> None:
+        """Count an inserted batch, and log its metrics.
+
+        Args:
+            records: The number of records in the batch.
+            size: The number of bytes sent before compression, 0 if not measured.
+            insert_seconds: The time spent sending the batch's inserts.
+            wire_size: The number of bytes sent after compression, `size` if not
+                compressed.
+
+        """
+        wire_size = size if wire_size is None else wire_size
+        with self._lock:
+            self.records += records
+            self.bytes += size
+            self.wire_bytes += wire_size
+            self.batches += 1
+            stage_seconds = {
+                stage: self.stage_seconds[stage] - self._logged_seconds[stage]
+                for stage in STAGES
+            }
+            self._logged_seconds = dict(self.stage_seconds)
+
+        tags = {"stream": self.stream, "table": self.table}
+        logger = get_metrics_logger()
+        points = [
+            Point("counter", ClickhouseMetric.BATCH_RECORD_COUNT, records, tags),
+            Point("counter", ClickhouseMetric.BATCH_BYTES, size, tags),
+            Point("counter", ClickhouseMetric.BATCH_WIRE_BYTES, wire_size, tags),
+            Point(
+                "timer",
+                ClickhouseMetric.INSERT_DURATION,
+                round(insert_seconds, 6),
+                tags,
+            ),
+        ]
+        points.extend(
+            Point(
+                "timer",
+                ClickhouseMetric.STAGE_DURATION,
+                round(seconds, 6),
+                {**tags, "stage": stage},
+            )
+            for stage, seconds in stage_seconds.items()
+            if seconds
+        )
+        for point in points:
+            log(logger, point)  # type: ignore[arg-type]
+
+
+class RequestBytes:
+    """Counts the bytes of HTTP request bodies sent by each thread.
+
+    The adapter of the shared HTTP session counts every body it sends, so a sink
+    can measure the size of its inserts by comparing `current` before and after
+    them. Bodies are counted before compression, which is what batch sizes are
+    estimated in, and separately as sent on the wire.
+    """
+
+    def __init__(self) -> None:
+        """Create a counter with no bytes counted."""
+        self._local = threading.local()
+
+    def current(self) -> int:
+        """Return the number of body bytes sent by the calling thread so far."""
+        return getattr(self._local, "bytes", 0)
+
+    def current_wire(self) -> int:
+        """Return the number of bytes the calling thread sent after compression."""
+        return getattr(self._local, "wire_bytes", 0)
+
+    def add(self, size: int, wire_size: int | None = None) -> None:
+        """Count a body sent by the calling thread.
+
+        Args:
+            size: The number of bytes, before compression.
+            wire_size: The number of bytes sent, `size` if not compressed.
+
+        """
+        self._local.bytes = self.current() + size
+        self._local.wire_bytes = self.current_wire() + (
+            size if wire_size is None else wire_size
+        )
+
+    def count(
+        self,
+        chunks: Iterable[bytes],
+        *,
+        uncompressed: bool = True,
+        wire: bool = True,
+    ) -> Iterator[bytes]:
+        """Count a streamed body as its chunks are sent.
+
+        Args:
+            chunks: The chunks of the body.
+            uncompressed: Whether to count the chunks as bytes before compression.
+            wire: Whether to count the chunks as bytes sent.
+
+        Yields:
+            The chunks.
+
+        """
+        local = self._local
+        for chunk in chunks:
+            if uncompressed:
+                local.bytes = self.current() + len(chunk)
+            if wire:
+                local.wire_bytes = self.current_wire() + len(chunk)
+            yield chunk
+
+
+class MetricsRegistry:
+    """The metrics of every table loaded by a connector."""
+
+    def __init__(
+        self,
+        pool_metrics: PoolMetrics | None = None,
+        textfile: str | None = None,
+        port: int | None = None,
+        memory: MemoryAccountant | None = None,
+        host: str = DEFAULT_METRICS_HOST,
+    ) -> None:
+        """Create an empty registry.
+
+        Args:
+            pool_metrics: Connection pool counters to export with the tables'.
+            textfile: A path to write the metrics to after each batch.
+            port: A port to serve the metrics on, at any path.
+            memory: The memory accountant whose usage is exported.
+            host: The address the metrics are served on, e.g. `0.0.0.0` for all
+                interfaces.
+
+        """
+        self.pool_metrics = pool_metrics
+        self.memory = memory
+        self.textfile = textfile
+        self.request_bytes = RequestBytes()
+        self._tables: dict[str, TableMetrics] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        if port:
+            self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+            self._server.daemon_threads = True
+            threading.Thread(
+                target=self._server.serve_forever,
+                name="metrics",
+                daemon=True,
+            ).start()
+
+    def for_table(self, table: str, stream: str | None = None) -> TableMetrics:
+        """Return the metrics of a table, creating them on first use.
+
+        Args:
+            table: The full table name.
+            stream: The name of the stream loaded into the table, if known.
+
+        Returns:
+            The table's metrics.
+
+        """
+        table = str(table)
+        with self._lock:
+            metrics = self._tables.get(table)
+            if metrics is None:
+                metrics = self._tables[table] = TableMetrics(table=table)
+        if stream is not None:
+            metrics.stream = stream
+        return metrics
+
+    def batch_inserted(self) -> None:
+        """Write the metrics textfile, if one is configured."""
+        if self.textfile:
+            self.write_textfile(self.textfile)
+
+    def write_textfile(self, path: str) -> None:
+        """Write the metrics to a file atomically, so readers never see a partial one.
+
+        Args:
+            path: The file to write.
+
+        """
+        target = Path(path)
+        with tempfile.NamedTemporaryFile(
+            "w",
+            dir=target.parent,
+            prefix=f".{target.name}.",
+            delete=False,
+        ) as file:
+            file.write(self.to_openmetrics())
+        Path(file.name).replace(target)
+
+    def close(self) -> None:
+        """Write the final metrics, and stop the scrape endpoint."""
+        self.batch_inserted()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def to_openmetrics(self) -> str:
+        """Return the metrics in the OpenMetrics text format."""
+        with self._lock:
+            tables = list(self._tables.values())
+        lines: list[str] = []
+
+        def family(name: str, metric_type: str, help_text: str) -> str:
+            name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"# HELP {name} {help_text}")
+            return name
+
+        name = family("records", "counter", "Records inserted.")
+        lines.extend(f"{name}_total{_labels(t)} {t.records}" for t in tables)
+        name = family(
+            "bytes",
+            "counter",
+            "Bytes of HTTP insert bodies, before compression.",
+        )
+        lines.extend(f"{name}_total{_labels(t)} {t.bytes}" for t in tables)
+        name = family(
+            "wire_bytes",
+            "counter",
+            "Bytes of HTTP insert bodies sent, after compression.",
+        )
+        lines.extend(f"{name}_total{_labels(t)} {t.wire_bytes}" for t in tables)
+        name = family("batches", "counter", "Batches inserted.")
+        lines.extend(f"{name}_total{_labels(t)} {t.batches}" for t in tables)
+        name = family("stage_seconds", "counter", "Time spent in each stage.")
+        lines.extend(
+            f"{name}_total{_labels(t, stage=stage)} {seconds:.6f}"
+            for t in tables
+            for stage, seconds in t.stage_seconds.items()
+        )
+        name = family(
+            "insert_duration_seconds",
+            "histogram",
+            "Latency of network inserts.",
+        )
+        for t in tables:
+            histogram = t.insert_latency
+            lines.extend(
+                f"{name}_bucket{_labels(t, le=bound)} {count}"
+                for bound, count in histogram.cumulative_counts()
+            )
+            lines.append(f"{name}_sum{_labels(t)} {histogram.total:.6f}")
+            lines.append(f"{name}_count{_labels(t)} {histogram.count}")
+
+        if self.pool_metrics is not None:
+            pool = self.pool_metrics.as_dict()
+            for key, help_text in (
+                ("checkouts", "Connections checked out of the pool."),
+                ("connects", "New connections, including reconnects."),
+                ("invalidations", "Connections discarded after an error."),
+            ):
+                name = family(f"pool_{key}", "counter", help_text)
+                lines.append(f"{name}_total {pool[key]}")
+            name = family(
+                "pool_checkout_wait_seconds",
+                "counter",
+                "Time spent waiting for a pooled connection.",
+            )
+            lines.append(f"{name}_total {pool['checkout_wait_time']}")
+
+        if self.memory is not None and self.memory.enabled:
+            name = family(
+                "buffered_bytes",
+                "gauge",
+                "Approximate memory held by pending batches.",
+            )
+            lines.append(f"{name} {self.memory.held_bytes}")
+            name = family(
+                "buffered_bytes_peak",
+                "gauge",
+                "Highest approximate memory held by pending batches.",
+            )
+            lines.append(f"{name} {self.memory.peak_bytes}")
+            name = family(
+                "memory_budget_drains",
+                "counter",
+                "Batches drained early to stay within the memory budget.",
+            )
+            lines.append(f"{name}_total {self.memory.budget_drains}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(table_metrics: TableMetrics, **extra: str) -> str:
+    labels = {"table": table_metrics.table, **extra}
+    if table_metrics.stream is not None:
+        labels["stream"] = table_metrics.stream
+    return (
+        "{"
+        + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+        + "}"
+    )
+
+
+def _make_handler(registry: MetricsRegistry) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            body = registry.to_openmetrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+            """Do not log scrapes."""
+
+    return Handler
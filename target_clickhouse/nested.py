@@ -0,0 +1,201 @@
+"""Native ClickHouse types for array and object properties.
+
+Used with `nested_types` enabled, instead of storing nested values as JSON strings:
+arrays become `Array(T)`, objects with known properties become a `Tuple` of their
+property types, in schema order, and free-form objects become
+`Map(String, String)`. Values are converted to lists, tuples and dicts of strings
+before insert, so the driver or the RowBinary encoder writes them natively.
+Columns created as `String` before `nested_types` was enabled keep their type, and
+their values are still JSON encoded.
+
+Only string, integer, number and boolean values are typed natively inside nested
+values; a nested schema containing anything else, e.g. a date-time string or an
+untyped value, is still stored as a JSON string.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import simplejson as json
+import sqlalchemy.types
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+Converter = Callable[[Any], Any]
+
+DATELIKE_FORMATS = ("date", "date-time", "time")
+
+SCALAR_TYPES: dict[str, type[sqlalchemy.types.TypeEngine]] = {
+    "string": clickhouse_sqlalchemy_types.String,
+    "integer": clickhouse_sqlalchemy_types.Int64,
+    "number": clickhouse_sqlalchemy_types.Float64,
+    "boolean": clickhouse_sqlalchemy_types.Boolean,
+}
+
+
+def _split_types(jsonschema_type: dict) -> tuple[set[str], bool] | None:
+    """Return the non-null JSON types of a schema and whether null is allowed."""
+    expected_type = jsonschema_type.get("type")
+    if expected_type is None:
+        return None
+    if not isinstance(expected_type, list):
+        expected_type = [expected_type]
+    return set(expected_type) - {"null"}, "null" in expected_type
+
+
+def _get_kind(jsonschema_type: dict) -> str | None:
+    """Return "array", "tuple", "map" or a scalar type name, None if untyped."""
+    types = _split_types(jsonschema_type)
+    if types is None or len(types[0]) != 1:
+        return None
+    (json_type,) = types[0]
+    if json_type == "object":
+        if not jsonschema_type.get("properties"):
+            return "map"
+        # Properties outside the schema would be lost in a tuple.
+        return None if jsonschema_type.get("additionalProperties") else "tuple"
+    if json_type == "string" and jsonschema_type.get("format") in DATELIKE_FORMATS:
+        return None
+    return json_type if json_type == "array" or json_type in SCALAR_TYPES else None
+
+
+def _get_element_type(
+    jsonschema_type: dict,
+    *,
+    nullable: bool,
+) -> sqlalchemy.types.TypeEngine | None:
+    """Return the type of an array item or tuple element."""
+    kind = _get_kind(jsonschema_type)
+    if kind in SCALAR_TYPES:
+        sql_type = SCALAR_TYPES[kind]()
+        if nullable:
+            return clickhouse_sqlalchemy_types.Nullable(sql_type)
+        return sql_type
+    # Arrays, tuples and maps cannot be Nullable; NULL is stored as empty.
+    return get_nested_sql_type(jsonschema_type)
+
+
+def get_nested_sql_type(jsonschema_type: dict) -> sqlalchemy.types.TypeEngine | None:
+    """Return the native type of an array or object schema.
+
+    Args:
+        jsonschema_type: The JSON schema of a property.
+
+    Returns:
+        An `Array`, `Tuple` or `Map` type, or None if the property is not an array
+        or object, or if its values cannot all be typed natively.
+
+    """
+    kind = _get_kind(jsonschema_type)
+    if kind == "array":
+        items = jsonschema_type.get("items") or {}
+        item_nullable = (_split_types(items) or (set(), True))[1]
+        item_type = _get_element_type(items, nullable=item_nullable)
+        if item_type is None:
+            return None
+        return clickhouse_sqlalchemy_types.Array(item_type)
+    if kind == "tuple":
+        # Elements of missing keys are NULL.
+        element_types = [
+            _get_element_type(property_schema, nullable=True)
+            for property_schema in jsonschema_type["properties"].values()
+        ]
+        if None in element_types:
+            return None
+        return clickhouse_sqlalchemy_types.Tuple(*element_types)
+    if kind == "map":
+        return clickhouse_sqlalchemy_types.Map(
+            clickhouse_sqlalchemy_types.String,
+            clickhouse_sqlalchemy_types.String,
+        )
+    return None
+
+
+def is_native_nested_type(sql_type: Any) -> bool:  # noqa: ANN401
+    """Return True for a reflected `Array`, `Tuple` or `Map` column type.
+
+    Args:
+        sql_type: The type of a table column.
+
+    Returns:
+        Whether values of the column are inserted natively, not as JSON strings.
+
+    """
+    return isinstance(
+        sql_type,
+        (
+            clickhouse_sqlalchemy_types.Array,
+            clickhouse_sqlalchemy_types.Tuple,
+            clickhouse_sqlalchemy_types.Map,
+        ),
+    )
+
+
+def _to_map_value(value: Any) -> str:  # noqa: ANN401
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def get_value_converter(jsonschema_type: dict) -> Converter | None:
+    """Return a function converting values of a nested property for insert.
+
+    Args:
+        jsonschema_type: The JSON schema of a property with a native nested type,
+            see `get_nested_sql_type`.
+
+    Returns:
+        The converter, or None if values are inserted as they are.
+
+    """
+    kind = _get_kind(jsonschema_type)
+    if kind == "array":
+        item_converter = get_value_converter(jsonschema_type.get("items") or {})
+
+        def convert_array(value: Any) -> list:  # noqa: ANN401
+            if value is None:
+                return []
+            if item_converter is None:
+                return list(value)
+            return [item_converter(item) for item in value]
+
+        return convert_array
+
+    if kind == "tuple":
+        elements = [
+            (key, get_value_converter(property_schema))
+            for key, property_schema in jsonschema_type["properties"].items()
+        ]
+
+        def convert_tuple(value: Any) -> tuple:  # noqa: ANN401
+            value = value or {}
+            return tuple(
+                value.get(key) if converter is None else converter(value.get(key))
+                for key, converter in elements
+            )
+
+        return convert_tuple
+
+    if kind == "map":
+
+        def convert_map(value: Any) -> dict:  # noqa: ANN401
+            return {
+                str(key): _to_map_value(item) for key, item in (value or {}).items()
+            }
+
+        return convert_map
+
+    return None
+
+
+def get_native_converter(jsonschema_type: dict) -> Converter | None:
+    """Return the value converter of a property with a native nested type.
+
+    Args:
+        jsonschema_type: The JSON schema of a property.
+
+    Returns:
+        The converter, or None if the property has no native nested type.
+
+    """
+    if get_nested_sql_type(jsonschema_type) is None:
+        return None
+    return get_value_converter(jsonschema_type)
@@ -0,0 +1,180 @@
+"""Background, partition-aware OPTIMIZE scheduling for ClickhouseConnector.
+
+Inserted partitions are found by comparing the highest block number of each
+partition in `system.parts` with a snapshot taken before the table's first batch,
+so only partitions that received new parts are optimized, and partitions with
+fewer active parts than `optimize_min_parts` are skipped. Optimizations run one
+at a time on a background thread, at the end of each stream and optionally every
+`optimize_interval` seconds, so inserts are never blocked by them.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from target_clickhouse.connectors import ClickhouseConnector
+
+# A partition with a single part has nothing left to merge.
+DEFAULT_OPTIMIZE_MIN_PARTS = 2
+
+
+class OptimizeScheduler:
+    """Tracks the partitions inserted into each table and optimizes them."""
+
+    def __init__(self, connector: ClickhouseConnector) -> None:
+        """Create a scheduler for the tables of a connector.
+
+        Args:
+            connector: The connector used to query parts and run OPTIMIZE.
+
+        """
+        self.connector = connector
+        config = connector.config
+        self.enabled = bool(config.get("optimize_after", False))
+        self.interval = config.get("optimize_interval") or 0
+        self.min_parts = config.get("optimize_min_parts") or DEFAULT_OPTIMIZE_MIN_PARTS
+        self.final = bool(config.get("optimize_final", False))
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._futures: list[Future] = []
+        # Highest block number of each partition when it was last optimized.
+        self._block_numbers: dict[str, dict[str, int]] = {}
+        self._last_scheduled: dict[str, float] = {}
+        # Tables with an optimization that has not started yet.
+        self._queued: set[str] = set()
+
+    def track(self, full_table_name: str) -> None:
+        """Snapshot the partitions of a table before its first batch is inserted.
+
+        Args:
+            full_table_name: the target table name.
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if full_table_name in self._block_numbers:
+                return
+        block_numbers = _max_block_numbers(
+            self.connector.get_partition_stats(full_table_name),
+        )
+        with self._lock:
+            self._block_numbers.setdefault(full_table_name, block_numbers)
+            self._last_scheduled.setdefault(full_table_name, time.monotonic())
+
+    def batch_inserted(self, full_table_name: str) -> None:
+        """Schedule an optimization if `optimize_interval` has elapsed.
+
+        Args:
+            full_table_name: the target table name.
+
+        """
+        if not self.enabled or self.interval <= 0:
+            return
+        with self._lock:
+            last_scheduled = self._last_scheduled.get(full_table_name)
+        if last_scheduled is not None and (
+            time.monotonic() - last_scheduled >= self.interval
+        ):
+            self.schedule(full_table_name)
+
+    def schedule(self, full_table_name: str) -> None:
+        """Optimize the partitions inserted into a table, in the background.
+
+        Does nothing if the table was not tracked, or if an optimization of the
+        table is already queued, since it will include the latest inserts.
+
+        Args:
+            full_table_name: the target table name.
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if (
+                full_table_name not in self._block_numbers
+                or full_table_name in self._queued
+            ):
+                return
+            self._queued.add(full_table_name)
+            self._last_scheduled[full_table_name] = time.monotonic()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="optimize",
+                )
+            self._futures.append(
+                self._executor.submit(self.optimize, full_table_name),
+            )
+
+    def optimize(self, full_table_name: str) -> list[str]:
+        """Optimize the partitions of a table that received new parts.
+
+        Args:
+            full_table_name: the target table name.
+
+        Returns:
+            The IDs of the optimized partitions.
+
+        """
+        with self._lock:
+            self._queued.discard(full_table_name)
+            previous_block_numbers = self._block_numbers.get(full_table_name, {})
+        partition_stats = self.connector.get_partition_stats(full_table_name)
+
+        table_metrics = self.connector.metrics.for_table(full_table_name)
+        optimized = []
+        for partition_id, (active_parts, max_block_number) in sorted(
+            partition_stats.items(),
+        ):
+            if max_block_number <= previous_block_numbers.get(partition_id, -1):
+                continue
+            if active_parts < self.min_parts:
+                self.connector.logger.debug(
+                    "Not optimizing partition '%s' of '%s', it has %d active parts.",
+                    partition_id,
+                    full_table_name,
+                    active_parts,
+                )
+                continue
+            self.connector.logger.info(
+                "Optimizing partition '%s' of '%s' (%d active parts).",
+                partition_id,
+                full_table_name,
+                active_parts,
+            )
+            with table_metrics.time("optimize"), self.connector.tracer.span(
+                "optimize_partition",
+                table=full_table_name,
+                partition_id=partition_id,
+            ):
+                self.connector.optimize_partition(
+                    full_table_name,
+                    partition_id,
+                    final=self.final,
+                )
+            optimized.append(partition_id)
+
+        with self._lock:
+            self._block_numbers[full_table_name] = _max_block_numbers(partition_stats)
+        return optimized
+
+    def wait(self) -> None:
+        """Wait for the scheduled optimizations, and log the ones that failed."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            error = future.exception()
+            if error is not None:
+                self.connector.logger.warning("OPTIMIZE failed: %s", error)
+
+
+def _max_block_numbers(partition_stats: dict[str, tuple[int, int]]) -> dict[str, int]:
+    return {
+        partition_id: max_block_number
+        for partition_id, (_, max_block_number) in partition_stats.items()
+    }
@@ -0,0 +1,243 @@
+"""Connection pool helpers for ClickhouseConnector.
+
+Provides a shared keep-alive HTTP session for the http driver, and counters for
+the SQLAlchemy connection pool fed by pool events.
+"""
+
+from __future__ import annotations
+
+import socket
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import event
+from urllib3.connection import HTTPConnection
+
+from target_clickhouse.compression import (
+    MIN_COMPRESS_SIZE,
+    compress,
+    compress_chunks,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+    from target_clickhouse.metrics import RequestBytes
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTP adapter that enables TCP keep-alive on pooled sockets."""
+
+    def __init__(
+        self,
+        *args: Any,
+        request_bytes: RequestBytes | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """Create an adapter.
+
+        Args:
+            *args: Positional arguments of `HTTPAdapter`.
+            request_bytes: Counts the bodies of sent requests.
+            **kwargs: Keyword arguments of `HTTPAdapter`.
+
+        """
+        self.request_bytes = request_bytes
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the urllib3 pool manager with TCP keep-alive enabled."""
+        kwargs["socket_options"] = [
+            *HTTPConnection.default_socket_options,
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        *args: Any,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Count the request body, and send the request.
+
+        Args:
+            request: The request to send.
+            *args: Positional arguments of `HTTPAdapter.send`.
+            **kwargs: Keyword arguments of `HTTPAdapter.send`.
+
+        Returns:
+            The response.
+
+        """
+        if request.body is not None:
+            self.prepare_body(request)
+        return super().send(request, *args, **kwargs)
+
+    def prepare_body(self, request: requests.PreparedRequest) -> None:
+        """Count a request body as it is sent.
+
+        Args:
+            request: The request to send, with a body.
+
+        """
+        if self.request_bytes is None:
+            return
+        if isinstance(request.body, (bytes, str)):
+            self.request_bytes.add(len(request.body))
+        else:
+            request.body = self.request_bytes.count(request.body)
+
+
+class CompressingAdapter(KeepAliveAdapter):
+    """Keep-alive HTTP adapter that compresses POST bodies with an encoding."""
+
+    def __init__(self, encoding: str, *args: Any, **kwargs: Any) -> None:
+        """Create an adapter.
+
+        Args:
+            encoding: The `Content-Encoding` to compress bodies with.
+            *args: Positional arguments of `KeepAliveAdapter`.
+            **kwargs: Keyword arguments of `KeepAliveAdapter`.
+
+        """
+        self.encoding = encoding
+        super().__init__(*args, **kwargs)
+
+    def prepare_body(self, request: requests.PreparedRequest) -> None:
+        """Compress the body, unless it is small or already encoded.
+
+        The body is counted both before and after compression.
+
+        Args:
+            request: The request to send, with a body.
+
+        """
+        body = request.body
+        if "Content-Encoding" in request.headers:
+            super().prepare_body(request)
+            return
+        if isinstance(body, str):
+            body = body.encode()
+        request_bytes = self.request_bytes
+        if not isinstance(body, bytes):
+            if request_bytes is not None:
+                body = request_bytes.count(body, wire=False)
+            body = compress_chunks(body, self.encoding)
+            if request_bytes is not None:
+                body = request_bytes.count(body, uncompressed=False)
+            request.body = body
+            request.headers["Content-Encoding"] = self.encoding
+        elif len(body) >= MIN_COMPRESS_SIZE:
+            request.body = compress(body, self.encoding)
+            request.headers["Content-Encoding"] = self.encoding
+            request.headers["Content-Length"] = str(len(request.body))
+            if request_bytes is not None:
+                request_bytes.add(len(body), len(request.body))
+        else:
+            super().prepare_body(request)
+
+
+def create_http_session(
+    pool_maxsize: int,
+    compression: str | None = None,
+    request_bytes: RequestBytes | None = None,
+) -> requests.Session:
+    """Create an HTTP session to share between all pooled http connections.
+
+    Each clickhouse-sqlalchemy http connection otherwise creates its own session,
+    so sockets and TLS connections are only reused by the connection that opened
+    them, and are lost whenever the pool recycles or replaces it.
+
+    Args:
+        pool_maxsize: Maximum number of sockets kept open to the server.
+        compression: A `Content-Encoding` to compress request bodies with.
+        request_bytes: Counts the bodies of sent requests.
+
+    Returns:
+        The session.
+
+    """
+    session = requests.Session()
+    options = {
+        "pool_connections": 1,
+        "pool_maxsize": pool_maxsize,
+        "request_bytes": request_bytes,
+    }
+    adapter = (
+        CompressingAdapter(compression, **options)
+        if compression
+        else KeepAliveAdapter(**options)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@dataclass
+class PoolMetrics:
+    """Counters for a SQLAlchemy connection pool, safe to update from threads."""
+
+    # Connections checked out of the pool.
+    checkouts: int = 0
+    # New DBAPI connections, including replacements of recycled connections.
+    connects: int = 0
+    # Connections discarded after an error or a failed pre-ping.
+    invalidations: int = 0
+    # Time spent waiting for `Engine.connect`, in seconds.
+    checkout_wait_time: float = 0.0
+    max_checkout_wait_time: float = 0.0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock,
+        repr=False,
+        compare=False,
+    )
+
+    def attach(self, engine: Engine) -> None:
+        """Listen to the pool events of an engine.
+
+        Args:
+            engine: The engine whose pool is measured.
+
+        """
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "soft_invalidate", self._on_invalidate)
+
+    def record_checkout_wait(self, seconds: float) -> None:
+        """Record the time spent waiting for a pooled connection.
+
+        Args:
+            seconds: The wait time.
+
+        """
+        with self._lock:
+            self.checkout_wait_time += seconds
+            self.max_checkout_wait_time = max(self.max_checkout_wait_time, seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the current counter values."""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "checkout_wait_time": round(self.checkout_wait_time, 6),
+                "max_checkout_wait_time": round(self.max_checkout_wait_time, 6),
+            }
+
+    def _on_checkout(self, *_: object) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_connect(self, *_: object) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def _on_invalidate(self, *_: object) -> None:
+        with self._lock:
+            self.invalidations += 1
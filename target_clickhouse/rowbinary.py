@@ -0,0 +1,358 @@
+"""Encoder for ClickHouse's RowBinary input format.
+
+Used by the HTTP driver to send `INSERT INTO t FORMAT RowBinary` bodies instead of
+escaped SQL text. Values are expected to already be python-native types, e.g. as
+produced by `ClickhouseSink._parse_timestamps_in_record`. Dates and datetimes
+outside the range of their column type, e.g. before 1970 for `DateTime`, are
+clamped to it rather than failing the whole batch.
+"""
+
+from __future__ import annotations
+
+import datetime
+import decimal
+import struct
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+Writer = Callable[[bytearray, Any], None]
+
+EPOCH_DATE = datetime.date(1970, 1, 1)
+EPOCH_DATETIME = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+INTEGER_FORMATS = {
+    "Int8": "<b",
+    "UInt8": "<B",
+    "Int16": "<h",
+    "UInt16": "<H",
+    "Int32": "<i",
+    "UInt32": "<I",
+    "Int64": "<q",
+    "UInt64": "<Q",
+}
+FLOAT_FORMATS = {
+    "Float32": "<f",
+    "Float64": "<d",
+}
+# Decimal storage width in bytes, by maximum precision.
+DECIMAL_WIDTHS = ((9, 4), (18, 8), (38, 16), (76, 32))
+# Range of the stored value of `Date` and `Date32` (days since the epoch),
+# `DateTime` (seconds) and `DateTime64` (ticks) columns.
+DATE_RANGE = (0, 2**16 - 1)
+DATE32_RANGE = (-25567, 120529)
+DATETIME_RANGE = (0, 2**32 - 1)
+DATETIME64_RANGE = (-(2**63), 2**63 - 1)
+
+
+class UnsupportedTypeError(ValueError):
+    """Raised when a column type cannot be encoded as RowBinary."""
+
+
+def split_type(type_name: str) -> tuple[str, list[str]]:
+    """Split a ClickHouse type name into its base name and top-level arguments.
+
+    Args:
+        type_name: A ClickHouse type, e.g. `Nullable(DateTime('UTC'))`.
+
+    Returns:
+        The base name and the list of argument strings, e.g.
+        `("Nullable", ["DateTime('UTC')"])`.
+
+    """
+    type_name = type_name.strip()
+    if "(" not in type_name:
+        return type_name, []
+
+    base, _, rest = type_name.partition("(")
+    if not rest.endswith(")"):
+        msg = f"Malformed type name: {type_name}"
+        raise UnsupportedTypeError(msg)
+    rest = rest[:-1]
+
+    args: list[str] = []
+    depth = 0
+    quoted = False
+    current: list[str] = []
+    for char in rest:
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and char == "," and depth == 0:
+            args.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    args.append("".join(current).strip())
+    return base.strip(), args
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    """Append an unsigned LEB128 integer, as used for string and array lengths."""
+    while value >= 0x80:  # noqa: PLR2004
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _struct_writer(fmt: str, default: float = 0) -> Writer:
+    pack = struct.Struct(fmt).pack
+
+    def write(buffer: bytearray, value: object) -> None:
+        buffer += pack(default if value is None else value)
+
+    return write
+
+
+def _write_string(buffer: bytearray, value: object) -> None:
+    if value is None:
+        buffer.append(0)
+        return
+    if not isinstance(value, (str, bytes)):
+        value = str(value)
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    write_varint(buffer, len(data))
+    buffer += data
+
+
+def _write_bool(buffer: bytearray, value: object) -> None:
+    buffer.append(1 if value else 0)
+
+
+def _clamp(value: int, value_range: tuple[int, int]) -> int:
+    low, high = value_range
+    return min(max(value, low), high)
+
+
+def _date_writer(fmt: str, value_range: tuple[int, int]) -> Writer:
+    pack = struct.Struct(fmt).pack
+
+    def write(buffer: bytearray, value: object) -> None:
+        if value is None:
+            buffer += pack(0)
+            return
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        buffer += pack(_clamp((value - EPOCH_DATE).days, value_range))
+
+    return write
+
+
+def _epoch_seconds(value: datetime.date) -> float:
+    """Return seconds since the epoch, treating naive datetimes as UTC."""
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (value - EPOCH_DATETIME).total_seconds()
+
+
+def _datetime_writer() -> Writer:
+    pack = struct.Struct("<I").pack
+
+    def write(buffer: bytearray, value: object) -> None:
+        if value is None:
+            buffer += pack(0)
+            return
+        buffer += pack(_clamp(int(_epoch_seconds(value)), DATETIME_RANGE))
+
+    return write
+
+
+def _datetime64_writer(precision: int) -> Writer:
+    pack = struct.Struct("<q").pack
+    scale = 10**precision
+
+    def write(buffer: bytearray, value: object) -> None:
+        if value is None:
+            buffer += pack(0)
+            return
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.combine(value, datetime.time())
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        delta = value - EPOCH_DATETIME
+        micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+        buffer += pack(_clamp(micros * scale // 1_000_000, DATETIME64_RANGE))
+
+    return write
+
+
+def _decimal_writer(precision: int, scale: int) -> Writer:
+    width = next((w for p, w in DECIMAL_WIDTHS if precision <= p), None)
+    if width is None:
+        msg = f"Decimal precision {precision} is out of range."
+        raise UnsupportedTypeError(msg)
+    quantum = decimal.Decimal(1).scaleb(-scale)
+
+    def write(buffer: bytearray, value: object) -> None:
+        if value is None:
+            value = 0
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value))
+        scaled = int(value.quantize(quantum).scaleb(scale))
+        buffer += scaled.to_bytes(width, "little", signed=True)
+
+    return write
+
+
+def _nullable_writer(inner: Writer) -> Writer:
+    def write(buffer: bytearray, value: object) -> None:
+        if value is None:
+            buffer.append(1)
+            return
+        buffer.append(0)
+        inner(buffer, value)
+
+    return write
+
+
+def _array_writer(inner: Writer) -> Writer:
+    def write(buffer: bytearray, value: object) -> None:
+        items = value or ()
+        write_varint(buffer, len(items))
+        for item in items:
+            inner(buffer, item)
+
+    return write
+
+
+def _map_writer(key_writer: Writer, value_writer: Writer) -> Writer:
+    def write(buffer: bytearray, value: object) -> None:
+        items = value or {}
+        write_varint(buffer, len(items))
+        for key, item in items.items():
+            key_writer(buffer, key)
+            value_writer(buffer, item)
+
+    return write
+
+
+def _tuple_writer(inner: list[Writer]) -> Writer:
+    def write(buffer: bytearray, value: object) -> None:
+        items = value or (None,) * len(inner)
+        for write_item, item in zip(inner, items):
+            write_item(buffer, item)
+
+    return write
+
+
+def _element_type(argument: str) -> str:
+    """Return the type of a tuple element, without the name of a named tuple."""
+    name, space, type_name = argument.partition(" ")
+    if space and "(" not in name:
+        return type_name
+    return argument
+
+
+# Writer factories by base type name, called with the type's arguments.
+WRITER_FACTORIES: dict[str, Callable[[list[str]], Writer]] = {
+    **{
+        name: (lambda _, fmt=fmt: _struct_writer(fmt))
+        for name, fmt in INTEGER_FORMATS.items()
+    },
+    **{
+        name: (lambda _, fmt=fmt: _struct_writer(fmt, 0.0))
+        for name, fmt in FLOAT_FORMATS.items()
+    },
+    "String": lambda _: _write_string,
+    "Bool": lambda _: _write_bool,
+    "Date": lambda _: _date_writer("<H", DATE_RANGE),
+    "Date32": lambda _: _date_writer("<i", DATE32_RANGE),
+    "DateTime": lambda _: _datetime_writer(),
+    "DateTime64": lambda args: _datetime64_writer(int(args[0])),
+    "Decimal": lambda args: _decimal_writer(int(args[0]), int(args[1])),
+    "Nullable": lambda args: _nullable_writer(get_writer(args[0])),
+    # LowCardinality is transparent in the RowBinary format.
+    "LowCardinality": lambda args: get_writer(args[0]),
+    "Array": lambda args: _array_writer(get_writer(args[0])),
+    "Map": lambda args: _map_writer(get_writer(args[0]), get_writer(args[1])),
+    "Tuple": lambda args: _tuple_writer(
+        [get_writer(_element_type(arg)) for arg in args],
+    ),
+}
+
+
+def get_writer(type_name: str) -> Writer:
+    """Return a function that appends a value of the given type to a buffer.
+
+    Args:
+        type_name: The ClickHouse column type, as reported by `DESCRIBE TABLE`.
+
+    Returns:
+        A writer function taking `(buffer, value)`.
+
+    Raises:
+        UnsupportedTypeError: if the type has no RowBinary encoder.
+
+    """
+    base, args = split_type(type_name)
+    factory = WRITER_FACTORIES.get(base)
+    if factory is None:
+        msg = f"RowBinary encoding is not supported for type '{type_name}'."
+        raise UnsupportedTypeError(msg)
+    return factory(args)
+
+
+class RowBinaryEncoder:
+    """Encode rows for a fixed list of column types into RowBinary bytes."""
+
+    def __init__(self, column_types: Sequence[str]) -> None:
+        """Compile the per-column writers.
+
+        Args:
+            column_types: The ClickHouse type of each column, in insert order.
+
+        Raises:
+            UnsupportedTypeError: if any column type cannot be encoded.
+
+        """
+        self.column_types = list(column_types)
+        self._writers = [get_writer(type_name) for type_name in self.column_types]
+
+    def encode(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        """Encode rows into a single RowBinary body.
+
+        Args:
+            rows: Value sequences, ordered like the encoder's column types.
+
+        Returns:
+            The encoded body.
+
+        """
+        buffer = bytearray()
+        writers = self._writers
+        for row in rows:
+            for write, value in zip(writers, row):
+                write(buffer, value)
+        return bytes(buffer)
+
+    def encode_chunks(
+        self,
+        rows: Iterable[Sequence[Any]],
+        chunk_size: int,
+    ) -> Iterator[bytes]:
+        """Encode rows lazily into RowBinary chunks of about `chunk_size` bytes.
+
+        Rows are consumed as chunks are requested, so only one chunk is held in
+        memory, e.g. while it is sent as part of a chunked HTTP request body.
+
+        Args:
+            rows: Value sequences, ordered like the encoder's column types.
+            chunk_size: The size in bytes after which a chunk is yielded.
+
+        Yields:
+            The encoded chunks, each holding whole rows.
+
+        """
+        buffer = bytearray()
+        writers = self._writers
+        for row in rows:
+            for write, value in zip(writers, row):
+                write(buffer, value)
+            if len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
@@ -2,27 +2,42 @@
 
 from __future__ import annotations
 
+import time
+from functools import cached_property
 from logging import Logger
-from typing import Any, Iterable
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, cast
 
 import jsonschema.exceptions as jsonschema_exceptions
 import simplejson as json
 import sqlalchemy
 from pendulum import now
-from singer_sdk.helpers._compat import (
-    date_fromisoformat,
-    datetime_fromisoformat,
-    time_fromisoformat,
-)
-from singer_sdk.helpers._typing import (
-    DatetimeErrorTreatmentEnum,
-    get_datelike_property_type,
-    handle_invalid_timestamp_in_record,
-)
+from singer_sdk.helpers._typing import DatetimeErrorTreatmentEnum
 from singer_sdk.sinks import SQLSink
 from sqlalchemy.sql.expression import bindparam
 
-from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.batching import (
+    RECORD_SAMPLE_INTERVAL,
+    BatchSizeController,
+    moving_average,
+)
+from target_clickhouse.columnar import is_columnar_type, pivot_records
+from target_clickhouse.connectors import IS_DELETED_COLUMN, ClickhouseConnector
+from target_clickhouse.datetimes import numpy_available, parse_datelike_column
+from target_clickhouse.engine_class import SupportedEngines
+from target_clickhouse.memory import record_memory_size
+from target_clickhouse.nested import is_native_nested_type
+from target_clickhouse.rowbinary import RowBinaryEncoder, UnsupportedTypeError
+from target_clickhouse.transform_plan import TransformPlan
+from target_clickhouse.validation import (
+    DEFAULT_VALIDATION_SAMPLE_INTERVAL,
+    RecordValidator,
+)
+
+if TYPE_CHECKING:
+    from singer_sdk.sinks.core import BaseJSONSchemaValidator
+
+    from target_clickhouse.metrics import TableMetrics
+    from target_clickhouse.tracing import Tracer
 
 
 class ClickhouseSink(SQLSink):
@@ -30,6 +45,9 @@ class ClickhouseSink(SQLSink):
 
     connector_class = ClickhouseConnector
 
+    # Moving average of the memory size of sampled records, with `memory_budget`.
+    _record_memory: float | None = None
+
     @property
     def full_table_name(self) -> str:
         """Return the fully qualified table name.
@@ -50,11 +68,178 @@ class ClickhouseSink(SQLSink):
             db_name=self.database_name,
         )
 
+    @property
+    def insert_table_name(self) -> str:
+        """Return the table records are inserted into.
+
+        While a new table version is loaded in a `refresh_mode` other than
+        `mutation`, this is the staging table.
+        """
+        if self.full_table_name in self.connector.staging_versions:
+            return self.connector.get_staging_table_name(self.full_table_name)
+        return self.full_table_name
+
+    @cached_property
+    def metrics(self) -> TableMetrics:
+        """Return the performance metrics of the target table."""
+        return self.connector.metrics.for_table(
+            self.full_table_name,
+            stream=self.stream_name,
+        )
+
+    @cached_property
+    def batch_controller(self) -> BatchSizeController:
+        """Return the batch size controller of the target table."""
+        return self.connector.batch_controllers.setdefault(
+            str(self.full_table_name),
+            BatchSizeController.from_config(self.config, row_limit=self.max_size),
+        )
+
+    @property
+    def is_full(self) -> bool:
+        """Return True if the batch reached its row limit or estimated byte size."""
+        return self.batch_controller.is_full(self.current_size)
+
     @property
     def datetime_error_treatment(self) -> DatetimeErrorTreatmentEnum:
         """Return a treatment to use for datetime parse errors: ERROR. MAX, or NULL."""
         return DatetimeErrorTreatmentEnum.NULL
 
+    def get_validator(self) -> BaseJSONSchemaValidator | None:
+        """Return the record validator selected by `record_validation`.
+
+        Returns
+            A `RecordValidator`, which samples records with `sampled`, the SDK's
+            validator with `jsonschema`, or None if validation is disabled.
+
+        """
+        mode = self.config.get("record_validation") or "compiled"
+        if not self.validate_schema or mode == "jsonschema":
+            return super().get_validator()
+        sample_interval = 1
+        if mode == "sampled":
+            sample_interval = (
+                self.config.get("validation_sample_interval")
+                or DEFAULT_VALIDATION_SAMPLE_INTERVAL
+            )
+        return RecordValidator(
+            self.schema,
+            validate_formats=self.validate_field_string_format,
+            sample_interval=sample_interval,
+        )
+
+    @cached_property
+    def transform_plan(self) -> TransformPlan:
+        """Return the record transformation plan compiled from the stream schema.
+
+        A new sink is created for every changed SCHEMA message, so the plan is
+        compiled once per schema. With `nested_types`, only values of columns
+        that actually have a native nested type are converted; columns created
+        as `String` before it was enabled keep JSON encoded values.
+        """
+        native_nested = self.config.get("nested_types", False)
+        native_columns = None
+        if native_nested and self.connector.table_exists(self.full_table_name):
+            columns = self.connector.get_table_columns(self.full_table_name)
+            native_names = {
+                name.casefold()
+                for name, column in columns.items()
+                if is_native_nested_type(column.type)
+            }
+            native_columns = {
+                key
+                for key in self.schema.get("properties", {})
+                if self.conform_name(key, "column").casefold() in native_names
+            }
+        return TransformPlan.from_schema(
+            self.schema,
+            native_nested=native_nested,
+            native_columns=native_columns,
+        )
+
+    @cached_property
+    def parse_datetimes_in_batch(self) -> bool:
+        """Return True if datelike values are parsed per batch instead of per record.
+
+        Batch parsing requires NumPy; an ImportError is raised if it is configured
+        but NumPy is not installed.
+        """
+        if self.config.get("datetime_parsing", "record") != "batch":
+            return False
+        if not numpy_available():
+            msg = (
+                "NumPy is required for `datetime_parsing: batch`, install the "
+                "`numpy` extra."
+            )
+            raise ImportError(msg)
+        return True
+
+    @cached_property
+    def use_columnar_insert(self) -> bool:
+        """Return True if batches can be sent as native columnar blocks.
+
+        Only the native driver supports block inserts. Tables with a column type
+        the columnar encoder does not handle fall back to the SQLAlchemy insert.
+        The types are those of the existing table, which may differ from the
+        stream schema's if the table was created earlier or altered.
+        """
+        if self.connector.driver_name != "native":
+            return False
+
+        columns = {
+            name.casefold(): column
+            for name, column in self.connector.get_table_columns(
+                self.full_table_name,
+            ).items()
+        }
+        unsupported = [
+            property_name
+            for property_name in self.conform_schema(self.schema)["properties"]
+            if property_name.casefold() not in columns
+            or not is_columnar_type(columns[property_name.casefold()].type)
+        ]
+        if unsupported:
+            self.logger.info(
+                "Using row-based inserts for '%s', unsupported column types: %s",
+                self.stream_name,
+                unsupported,
+            )
+            return False
+        return True
+
+    @cached_property
+    def rowbinary_encoder(self) -> RowBinaryEncoder | None:
+        """Return a RowBinary encoder for the target table, if enabled.
+
+        RowBinary inserts are opt-in for the HTTP driver via `insert_format`, and
+        also used for tables with `Tuple` columns, since tuples cannot be sent as
+        SQL literals by the HTTP driver. Tables with a column type the encoder
+        does not handle fall back to the SQLAlchemy insert.
+        """
+        if self.connector.driver_name != "http":
+            return None
+        if self.config.get("insert_format") != "rowbinary" and not self.config.get(
+            "nested_types",
+            False,
+        ):
+            return None
+
+        column_types = self.connector.get_column_type_names(self.full_table_name)
+        if self.config.get("insert_format") != "rowbinary" and not any(
+            "Tuple(" in type_name for type_name in column_types.values()
+        ):
+            return None
+        property_names = list(self.conform_schema(self.schema)["properties"])
+        try:
+            return RowBinaryEncoder([column_types[name] for name in property_names])
+        except (KeyError, UnsupportedTypeError) as e:
+            self.logger.info(
+                "Using SQL inserts for '%s', cannot encode as RowBinary: %s",
+                self.stream_name,
+                e,
+            )
+            return None
+
     def bulk_insert_records(
         self,
         full_table_name: str,
@@ -77,20 +262,391 @@ class ClickhouseSink(SQLSink):
             True if table exists, False if not, None if unsure or undetectable.
 
         """
-        # Need to convert any records with a dict type to a JSON string.
-        for record in records:
-            for key, value in record.items():
-                if isinstance(value, (dict, list)):
-                    record[key] = json.dumps(value)
+        metrics = self.metrics
+        request_bytes = self.connector.metrics.request_bytes
+        sent_bytes = request_bytes.current()
+        wire_bytes = request_bytes.current_wire()
+        insert_seconds = metrics.stage_seconds["insert"]
+        with self.connector.tracer.span("bulk_insert_records", table=full_table_name):
+            if self.use_columnar_insert:
+                res = self._bulk_insert_columnar(full_table_name, schema, records)
+            elif self.rowbinary_encoder is not None:
+                res = self._bulk_insert_rowbinary(full_table_name, schema, records)
+            else:
+                res = self._bulk_insert_sql(full_table_name, schema, records)
+
+        inserted = len(records) if isinstance(records, list) else res or 0
+        sent_bytes = request_bytes.current() - sent_bytes
+        wire_bytes = request_bytes.current_wire() - wire_bytes
+        insert_seconds = metrics.stage_seconds["insert"] - insert_seconds
+        metrics.batch_inserted(
+            records=inserted,
+            size=sent_bytes,
+            insert_seconds=insert_seconds,
+            wire_size=wire_bytes,
+        )
+        self.connector.metrics.batch_inserted()
+        self._tune_batch_size(full_table_name, inserted, sent_bytes, insert_seconds)
+        return res
 
-        res = super().bulk_insert_records(full_table_name, schema, records)
+    def _tune_batch_size(
+        self,
+        full_table_name: str,
+        records: int,
+        size: int,
+        insert_seconds: float,
+    ) -> None:
+        """Feed an inserted batch back to the batch size controller.
 
-        if self.config.get("optimize_after", False):
-            with self.connector._connect() as conn, conn.begin():  # noqa: SLF001
-                self.logger.info("Optimizing table: %s", self.full_table_name)
-                conn.execute(sqlalchemy.text(f"OPTIMIZE TABLE {self.full_table_name}"))
+        Args:
+            full_table_name: the table the batch was inserted into.
+            records: the number of records inserted.
+            size: the number of bytes sent before compression, 0 if not
+                measured.
+            insert_seconds: the time the inserts took.
 
-        return res
+        """
+        controller = self.batch_controller
+        active_parts = None
+        if controller.adaptive:
+            with self.metrics.time("alter"):
+                partition_stats = self.connector.get_partition_stats(full_table_name)
+            active_parts = max(
+                (parts for parts, _ in partition_stats.values()),
+                default=0,
+            )
+        row_limit = controller.row_limit
+        new_row_limit = controller.batch_inserted(
+            records,
+            size,
+            insert_seconds,
+            active_parts=active_parts,
+        )
+        if new_row_limit != row_limit:
+            self.logger.info(
+                "Batch size of '%s' changed from %d to %d rows (insert took %.2fs, "
+                "%s active parts).",
+                self.stream_name,
+                row_limit,
+                new_row_limit,
+                insert_seconds,
+                active_parts,
+            )
+
+    def setup(self) -> None:
+        """Set up the target table, and the staging table if one is being loaded."""
+        with self.metrics.time("alter"), self.connector.tracer.span(
+            "prepare_table",
+            table=self.full_table_name,
+        ):
+            self._setup_tables()
+
+    def _setup_tables(self) -> None:
+        super().setup()
+        if self.full_table_name in self.connector.staging_versions:
+            # A new sink after a schema change, while a table version is staged.
+            self.connector.prepare_table(
+                full_table_name=self.insert_table_name,
+                schema=self.conform_schema(self.schema),
+                primary_keys=self.key_properties,
+                as_temp_table=False,
+            )
+
+    def start_batch(self, context: dict) -> None:
+        """Start a new batch of records read from RECORD messages.
+
+        Args:
+            context: Stream partition or context dictionary.
+
+        """
+        # Records in this batch are finalized by `_validate_and_parse`.
+        context["finalized"] = True
+
+    def process_record(self, record: dict, context: dict) -> None:
+        """Add a record to the batch, sampling its size for the batch size estimate.
+
+        Args:
+            record: Individual record in the stream.
+            context: Stream partition or context dictionary.
+
+        """
+        # The record is already counted in `current_size`.
+        sampled = (self.current_size - 1) % RECORD_SAMPLE_INTERVAL == 0
+        if sampled:
+            self.batch_controller.observe_record(len(json.dumps(record, default=str)))
+        memory = self.connector.memory_accountant
+        if memory.enabled:
+            if sampled:
+                self._record_memory = moving_average(
+                    self._record_memory,
+                    record_memory_size(record),
+                )
+            memory.set(self, int(self.current_size * (self._record_memory or 0)))
+        super().process_record(record, context)
+
+    def mark_drained(self) -> None:
+        """Reset the batch tallies, and release the batch's memory."""
+        super().mark_drained()
+        self.connector.memory_accountant.release(self)
+
+    def process_batch(self, context: dict) -> None:
+        """Process a batch with the given batch context.
+
+        Args:
+            context: Stream partition or context dictionary.
+
+        """
+        with self.connector.tracer.span(
+            "process_batch",
+            table=self.full_table_name,
+            records=len(context.get("records", [])),
+        ):
+            self._process_batch(context)
+
+    def _process_batch(self, context: dict) -> None:
+        metrics = self.metrics
+        tracer = self.connector.tracer
+        with metrics.time("coerce"):
+            if not context.get("finalized"):
+                # Records from BATCH messages skip `_validate_and_parse`, so dict and
+                # list values still need to be converted to JSON strings.
+                for record in context.get("records", []):
+                    self.transform_plan.encode_json(record)
+            elif self.parse_datetimes_in_batch:
+                self._parse_timestamps_in_batch(context.get("records", []))
+        # Staged partitions replace the target's, they are not sampled or optimized.
+        optimize = self.insert_table_name == self.full_table_name
+        if optimize:
+            with metrics.time("alter"), tracer.span("sample_column_types"):
+                self.connector.sample_column_types(
+                    self.full_table_name,
+                    context.get("records", []),
+                )
+            with metrics.time("optimize"):
+                self.connector.optimize_scheduler.track(self.full_table_name)
+        self.bulk_insert_records(
+            full_table_name=self.insert_table_name,
+            schema=self.schema,
+            records=context["records"],
+        )
+        with metrics.time("alter"), tracer.span("version_cleanup"):
+            self.connector.flush_version_cleanup(self.full_table_name)
+        if optimize:
+            self.connector.optimize_scheduler.batch_inserted(self.full_table_name)
+
+    def clean_up(self) -> None:
+        """Keep the rows of a staged table version that was never activated."""
+        if self.full_table_name in self.connector.staging_versions:
+            self.logger.warning(
+                "Stream '%s' ended before version %s was activated, appending the "
+                "staged rows to '%s'.",
+                self.stream_name,
+                self.connector.staging_versions[self.full_table_name],
+                self.full_table_name,
+            )
+            self.connector.abandon_staging(self.full_table_name)
+        self.connector.flush_version_cleanup(self.full_table_name)
+        self.connector.optimize_scheduler.schedule(self.full_table_name)
+        super().clean_up()
+
+    def _parse_timestamps_in_batch(self, records: list[dict]) -> None:
+        """Parse every datelike property across the whole batch, column by column.
+
+        Args:
+            records: The batch of validated records.
+
+        """
+        for key, datelike_type in self.transform_plan.datelike_keys.items():
+            parse_datelike_column(
+                records,
+                key,
+                datelike_type,
+                self.datetime_error_treatment,
+                self.logger,
+            )
+
+    def _bulk_insert_sql(
+        self,
+        full_table_name: str,
+        schema: dict,
+        records: Iterable[dict[str, Any]],
+    ) -> int:
+        """Insert records with a generic SQLAlchemy bulk insert.
+
+        Same as the SDK implementation, but executed with the connector's insert
+        settings, e.g. `async_insert`.
+
+        Args:
+            full_table_name: the target table name.
+            schema: the JSON schema of the stream.
+            records: the input records.
+
+        Returns:
+            The number of rows inserted, as reported by the driver.
+
+        """
+        insert_sql = self.generate_insert_statement(full_table_name, schema)
+        if isinstance(insert_sql, str):
+            insert_sql = sqlalchemy.text(insert_sql)
+        property_names = list(self.conform_schema(schema)["properties"])
+
+        # Create new record dicts with missing properties filled in with None
+        with self.metrics.time("serialize"):
+            new_records = [
+                {name: record.get(name) for name in property_names}
+                for record in map(self.conform_record, records)
+            ]
+
+        self.logger.info("Inserting with SQL: %s", insert_sql)
+
+        start = time.perf_counter()
+        with self.connector._connect_for_insert() as conn, conn.begin():  # noqa: SLF001
+            result = conn.execute(insert_sql, new_records)
+        self.metrics.observe_insert(time.perf_counter() - start)
+
+        return result.rowcount
+
+    def _bulk_insert_columnar(
+        self,
+        full_table_name: str,
+        schema: dict,
+        records: Iterable[dict[str, Any]],
+    ) -> int:
+        """Pivot records into columns and insert them as a native block.
+
+        Args:
+            full_table_name: the target table name.
+            schema: the JSON schema of the stream.
+            records: the input records.
+
+        Returns:
+            The number of rows inserted.
+
+        """
+        property_names = list(self.conform_schema(schema)["properties"])
+        chunk_bytes = self.config.get("insert_chunk_bytes")
+        if chunk_bytes:
+            return self._stream_insert_native(
+                full_table_name,
+                property_names,
+                records,
+                chunk_bytes,
+            )
+        with self.metrics.time("serialize"):
+            columns = pivot_records(
+                (self.conform_record(record) for record in records),
+                property_names,
+            )
+        start = time.perf_counter()
+        inserted = self.connector.insert_columnar(
+            full_table_name,
+            property_names,
+            columns,
+        )
+        self.metrics.observe_insert(time.perf_counter() - start)
+        return inserted
+
+    def _bulk_insert_rowbinary(
+        self,
+        full_table_name: str,
+        schema: dict,
+        records: Iterable[dict[str, Any]],
+    ) -> int:
+        """Encode records as RowBinary and POST them over HTTP.
+
+        Args:
+            full_table_name: the target table name.
+            schema: the JSON schema of the stream.
+            records: the input records.
+
+        Returns:
+            The number of rows inserted.
+
+        """
+        encoder = cast(RowBinaryEncoder, self.rowbinary_encoder)
+        property_names = list(self.conform_schema(schema)["properties"])
+        chunk_bytes = self.config.get("insert_chunk_bytes")
+        if chunk_bytes:
+            return self._stream_insert_rowbinary(
+                full_table_name,
+                property_names,
+                records,
+                chunk_bytes,
+            )
+        with self.metrics.time("serialize"):
+            rows = [
+                [record.get(name) for name in property_names]
+                for record in map(self.conform_record, records)
+            ]
+            body = encoder.encode(rows)
+        start = time.perf_counter()
+        self.connector.insert_rowbinary(full_table_name, property_names, body)
+        self.metrics.observe_insert(time.perf_counter() - start)
+        return len(rows)
+
+    def _stream_insert_rowbinary(
+        self,
+        full_table_name: str,
+        property_names: list[str],
+        records: Iterable[dict[str, Any]],
+        chunk_bytes: int,
+    ) -> int:
+        """Encode records as RowBinary while POSTing them in a chunked body.
+
+        Args:
+            full_table_name: the target table name.
+            property_names: the target column names.
+            records: the input records.
+            chunk_bytes: the size of the body chunks.
+
+        Returns:
+            The number of rows inserted.
+
+        """
+        encoder = cast(RowBinaryEncoder, self.rowbinary_encoder)
+        rows = _RowStream(map(self.conform_record, records), property_names)
+        serialize_seconds = self.metrics.stage_seconds["serialize"]
+        start = time.perf_counter()
+        self.connector.insert_rowbinary(
+            full_table_name,
+            property_names,
+            _timed(encoder.encode_chunks(rows, chunk_bytes), self.metrics, "serialize"),
+        )
+        # Chunks are encoded while the request is sent, count that time once.
+        serialize_seconds = self.metrics.stage_seconds["serialize"] - serialize_seconds
+        self.metrics.observe_insert(time.perf_counter() - start - serialize_seconds)
+        return rows.count
+
+    def _stream_insert_native(
+        self,
+        full_table_name: str,
+        property_names: list[str],
+        records: Iterable[dict[str, Any]],
+        chunk_bytes: int,
+    ) -> int:
+        """Insert records in native blocks of about `chunk_bytes`, as they are read.
+
+        Args:
+            full_table_name: the target table name.
+            property_names: the target column names.
+            records: the input records.
+            chunk_bytes: the approximate size of a block.
+
+        Returns:
+            The number of rows inserted.
+
+        """
+        record_bytes = self.batch_controller.record_bytes or chunk_bytes
+        rows = _RowStream(map(self.conform_record, records), property_names)
+        start = time.perf_counter()
+        self.connector.insert_rows(
+            full_table_name,
+            property_names,
+            iter(rows),
+            block_size=max(1, int(chunk_bytes // record_bytes)),
+        )
+        self.metrics.observe_insert(time.perf_counter() - start)
+        return rows.count
 
     def activate_version(self, new_version: int) -> None:
         """Bump the active version of the target table.
@@ -99,6 +655,21 @@ class ClickhouseSink(SQLSink):
             new_version: The version number to activate.
 
         """
+        with self.connector.tracer.span(
+            "activate_version",
+            table=self.full_table_name,
+            version=new_version,
+        ):
+            self._activate_version(new_version)
+
+    def _activate_version(self, new_version: int) -> None:
+        refresh_mode = self.config.get("refresh_mode", "mutation")
+        if refresh_mode != "mutation" and self._activate_version_with_staging(
+            new_version,
+            refresh_mode,
+        ):
+            return
+
         # There's nothing to do if the table doesn't exist yet
         # (which it won't the first time the stream is processed)
         if not self.connector.table_exists(self.full_table_name):
@@ -117,13 +688,16 @@ class ClickhouseSink(SQLSink):
             )
 
         if self.config.get("hard_delete", True):
-            with self.connector._connect() as conn, conn.begin():  # noqa: SLF001
-                conn.execute(
-                    sqlalchemy.text(
-                        f"ALTER TABLE {self.full_table_name} DELETE "
-                        f"WHERE {self.version_column_name} <= {new_version}",
-                    ),
-                )
+            # Applied with the pending batch, so versions activated before it is
+            # inserted are deleted by a single mutation. Either way the delete
+            # runs before the next state is emitted.
+            self.connector.request_version_cleanup(
+                self.full_table_name,
+                self.version_column_name,
+                new_version,
+            )
+            if self.current_size == 0:
+                self.connector.flush_version_cleanup(self.full_table_name)
             return
 
         if not self.connector.column_exists(
@@ -136,6 +710,37 @@ class ClickhouseSink(SQLSink):
                 sql_type=sqlalchemy.types.DateTime(),
             )
 
+        if self.config.get("soft_delete_method") == "tombstone":
+            if self.connector.column_exists(
+                full_table_name=self.full_table_name,
+                column_name=IS_DELETED_COLUMN,
+            ):
+                self.connector.insert_tombstones(
+                    self.full_table_name,
+                    self.version_column_name,
+                    self.soft_delete_column_name,
+                    new_version,
+                )
+                return
+            _, _, table_name = self.connector.parse_full_table_name(
+                self.full_table_name,
+            )
+            if (
+                self.connector.get_tombstone_fallback(
+                    self.config.get("engine_type") or SupportedEngines.MERGE_TREE,
+                    self.key_properties,
+                    self.connector.get_table_layout(table_name),
+                )
+                == "lightweight"
+            ):
+                self.connector.delete_old_versions(
+                    self.full_table_name,
+                    self.version_column_name,
+                    new_version,
+                    lightweight=True,
+                )
+                return
+
         query = sqlalchemy.text(
             f"ALTER TABLE {self.full_table_name} \n"
             f"UPDATE {self.soft_delete_column_name} = :deletedate \n"
@@ -148,6 +753,96 @@ class ClickhouseSink(SQLSink):
         )
         with self.connector._connect() as conn, conn.begin():  # noqa: SLF001
             conn.execute(query)
+        self.connector.wait_for_mutations(self.full_table_name)
+
+    def _activate_version_with_staging(
+        self,
+        new_version: int,
+        refresh_mode: str,
+    ) -> bool:
+        """Start or finish loading a table version through a staging table.
+
+        A version is loaded into an empty staging table from its first record, see
+        `start_table_version`, or from an ACTIVATE_VERSION message received before
+        any record of the stream. Receiving the staged version again, after its
+        records, replaces the target table's data with the staged data. A version
+        activated without being started, e.g. from records without a `version`,
+        was loaded into the target table directly, and is handled like `mutation`.
+
+        Args:
+            new_version: The version number to activate.
+            refresh_mode: `exchange` or `replace_partition`.
+
+        Returns:
+            False if the version must instead be activated with mutations.
+
+        """
+        staged_version = self.connector.staging_versions.get(self.full_table_name)
+        if staged_version == new_version:
+            self._drain_pending_batch()
+            self.logger.info(
+                "Activating version %s of '%s' from its staging table.",
+                new_version,
+                self.full_table_name,
+            )
+            self.connector.finish_staging(self.full_table_name, refresh_mode)
+            return True
+
+        if staged_version is None and (
+            self._pending_batch is not None or self._total_records_read
+        ):
+            self.logger.info(
+                "Version %s of '%s' was loaded without a staging table, deleting "
+                "old versions with mutations.",
+                new_version,
+                self.full_table_name,
+            )
+            return False
+
+        self._start_staging(new_version, staged_version)
+        return True
+
+    def start_table_version(self, version: int) -> None:
+        """Start loading a new table version through a staging table, if needed.
+
+        Called with the `version` of every RECORD message. Taps send an
+        ACTIVATE_VERSION message before the records of a version only on the
+        stream's first full table sync, if at all, so later versions are started
+        by their first record instead.
+
+        Args:
+            version: The table version of the record.
+
+        """
+        if self.config.get("refresh_mode", "mutation") == "mutation":
+            return
+        staged_version = self.connector.staging_versions.get(self.full_table_name)
+        if version in (
+            staged_version,
+            self.connector.activated_versions.get(self.full_table_name),
+        ):
+            return
+        self._start_staging(version, staged_version)
+
+    def _start_staging(self, new_version: int, staged_version: int | None) -> None:
+        if staged_version is not None:
+            self.logger.warning(
+                "Discarding version %s staged for '%s', version %s was started.",
+                staged_version,
+                self.full_table_name,
+                new_version,
+            )
+        # Buffered records belong to the table they were read for.
+        self._drain_pending_batch()
+        self.connector.start_staging(self.full_table_name, new_version)
+
+    def _drain_pending_batch(self) -> None:
+        """Insert the records buffered so far, as `Target.drain_one` does."""
+        if self.current_size == 0:
+            return
+        context = self.start_drain()
+        self.process_batch(context)
+        self.mark_drained()
 
     def _validate_and_parse(self, record: dict) -> dict:
         """Pre-validate and repair records for string type mismatches, then validate.
@@ -159,21 +854,34 @@ class ClickhouseSink(SQLSink):
             Validated record.
 
         """
+        tracer = self.connector.tracer
+        with tracer.record_span("validate_and_parse", stream=self.stream_name):
+            return self._validate_and_parse_record(record, tracer)
+
+    def _validate_and_parse_record(self, record: dict, tracer: Tracer) -> dict:
         # Pre-validate and correct string type mismatches.
-        record = pre_validate_for_string_type(record, self.schema, self.logger)
+        start = time.perf_counter()
+        with tracer.record_span("coerce"):
+            record = self.transform_plan.coerce(record, self.logger)
+        coerced = time.perf_counter()
 
         try:
             self._validator.validate(record)
-            self._parse_timestamps_in_record(
-                record=record,
-                schema=self.schema,
-                treatment=self.datetime_error_treatment,
-            )
+            validated = time.perf_counter()
+            with tracer.record_span("parse_timestamps"):
+                self._parse_timestamps_in_record(
+                    record=record,
+                    schema=self.schema,
+                    treatment=self.datetime_error_treatment,
+                )
         except jsonschema_exceptions.ValidationError as e:
             if self.logger:
                 self.logger.exception(f"Record failed validation: {record}")
             raise e  # : RERAISES
 
+        metrics = self.metrics
+        metrics.add_time("validate", validated - coerced)
+        metrics.add_time("coerce", coerced - start + time.perf_counter() - validated)
         return record
 
     def _parse_timestamps_in_record(
@@ -186,7 +894,7 @@ class ClickhouseSink(SQLSink):
 
         Attempts to parse every field that is of type date/datetime/time. If its value
         is out of range, repair logic will be driven by the `treatment` input arg:
-        MAX, NULL, or ERROR.
+        MAX, NULL, or ERROR. Dict and list values are JSON encoded in the same pass.
 
         Args:
             record: Individual record in the stream.
@@ -194,41 +902,49 @@ class ClickhouseSink(SQLSink):
             treatment: TODO
 
         """
-        for key, value in record.items():
-            if key not in schema["properties"]:
-                self.logger.warning("No schema for record field '%s'", key)
-                continue
-            datelike_type = get_datelike_property_type(schema["properties"][key])
-            if datelike_type:
-                date_val = value
-                try:
-                    if value is not None:
-                        if datelike_type == "time":
-                            date_val = time_fromisoformat(date_val)
-                        elif datelike_type == "date":
-                            # Trim time value from date fields.
-                            if "T" in date_val:
-                                # Split on T and get the first part.
-                                date_val = date_val.split("T")[0]
-                                self.logger.warning(
-                                    "Trimmed time value from date field '%s': %s",
-                                    key,
-                                    date_val,
-                                )
-                            date_val = date_fromisoformat(date_val)
-                        else:
-                            date_val = datetime_fromisoformat(date_val)
-                except ValueError as ex:
-                    date_val = handle_invalid_timestamp_in_record(
-                        record,
-                        [key],
-                        date_val,
-                        datelike_type,
-                        ex,
-                        treatment,
-                        self.logger,
-                    )
-                record[key] = date_val
+        plan = (
+            self.transform_plan
+            if schema is self.schema
+            else TransformPlan.from_schema(
+                schema,
+                native_nested=self.config.get("nested_types", False),
+            )
+        )
+        plan.finalize(
+            record,
+            treatment,
+            self.logger,
+            parse_datelike=not self.parse_datetimes_in_batch,
+        )
+
+
+class _RowStream:
+    """Lazily converts records to value lists, counting them."""
+
+    def __init__(self, records: Iterable[dict], property_names: list[str]) -> None:
+        self.records = records
+        self.property_names = property_names
+        self.count = 0
+
+    def __iter__(self) -> Iterator[list]:
+        property_names = self.property_names
+        for record in self.records:
+            self.count += 1
+            yield [record.get(name) for name in property_names]
+
+
+def _timed(
+    chunks: Iterator[bytes],
+    metrics: TableMetrics,
+    stage: str,
+) -> Iterator[bytes]:
+    """Yield chunks, adding the time spent producing each one to a stage."""
+    while True:
+        with metrics.time(stage):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
 
 
 def pre_validate_for_string_type(
@@ -252,43 +968,4 @@ def pre_validate_for_string_type(
             logger.debug("Schema is None, skipping pre-validation.")
         return record
 
-    for key, value in record.items():
-        # Checking if the schema expects a string for this key.
-        key_properties = schema.get("properties", {}).get(key, {})
-        expected_type = key_properties.get("type")
-        if expected_type is None:
-            continue
-        if not isinstance(expected_type, list):
-            expected_type = [expected_type]
-
-        if "null" in expected_type and value is None:
-            continue
-
-        if "object" in expected_type and isinstance(value, dict):
-            pre_validate_for_string_type(
-                value,
-                schema.get("properties", {}).get(key),
-                logger,
-            )
-        elif "array" in expected_type and isinstance(value, list):
-            items_schema = key_properties.get("items")
-            for i, item in enumerate(value):
-                if "object" in items_schema["type"] and isinstance(item, dict):
-                    value[i] = pre_validate_for_string_type(
-                        item,
-                        key_properties.get("items"),
-                        logger,
-                    )
-        elif "string" in expected_type and not isinstance(value, str):
-            # Convert the value to string if it's not already a string.
-            record[key] = (
-                json.dumps(record[key])
-                if isinstance(value, (dict, list))
-                else str(value)
-            )
-            if logger:
-                logger.debug(
-                    f"Converted field {key} to string: {record[key]}",
-                )
-
-    return record
+    return TransformPlan.from_schema(schema).coerce(record, logger)
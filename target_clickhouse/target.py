@@ -1,12 +1,32 @@
 from __future__ import annotations
 
+from typing import IO, TYPE_CHECKING, Counter, cast
+
 from singer_sdk import typing as th
 from singer_sdk.target_base import SQLTarget
 
+from target_clickhouse.batching import (
+    DEFAULT_ADAPTIVE_BATCH_MAX_ROWS,
+    DEFAULT_ADAPTIVE_BATCH_TARGET_SECONDS,
+    DEFAULT_BATCH_MAX_BYTES,
+)
+from target_clickhouse.connectors import DEFAULT_MAX_PARALLELISM
 from target_clickhouse.engine_class import SupportedEngines
+from target_clickhouse.latency import DrainTimer
+from target_clickhouse.metrics import DEFAULT_METRICS_HOST
+from target_clickhouse.optimize import DEFAULT_OPTIMIZE_MIN_PARTS
 from target_clickhouse.sinks import (
     ClickhouseSink,
 )
+from target_clickhouse.tracing import (
+    DEFAULT_PROFILE_INTERVAL,
+    DEFAULT_TRACE_FILE,
+    DEFAULT_TRACE_RECORD_INTERVAL,
+)
+from target_clickhouse.validation import DEFAULT_VALIDATION_SAMPLE_INTERVAL
+
+if TYPE_CHECKING:
+    from target_clickhouse.memory import MemoryAccountant
 
 
 class TargetClickhouse(SQLTarget):
@@ -135,8 +155,394 @@ class TargetClickhouse(SQLTarget):
             th.BooleanType,
             required=False,
             default=False,
-            description="Run 'OPTIMIZE TABLE' after data insert. Useful when"
-                        "table engine removes duplicate rows.",
+            description="Run 'OPTIMIZE TABLE' on the partitions that received "
+                        "inserts, in the background, at the end of each stream. "
+                        "Useful when table engine removes duplicate rows.",
+        ),
+        th.Property(
+            "optimize_interval",
+            th.NumberType,
+            required=False,
+            default=0,
+            description="With `optimize_after`, also optimize the inserted "
+                        "partitions when this many seconds have passed since the "
+                        "table was last optimized. 0 only optimizes at the end of "
+                        "each stream.",
+        ),
+        th.Property(
+            "optimize_min_parts",
+            th.IntegerType,
+            required=False,
+            default=DEFAULT_OPTIMIZE_MIN_PARTS,
+            description="Skip optimizing partitions with fewer active parts than "
+                        "this, according to `system.parts`.",
+        ),
+        th.Property(
+            "optimize_final",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Run `OPTIMIZE TABLE ... FINAL`, which merges each "
+                        "partition into a single part.",
+        ),
+        th.Property(
+            "insert_format",
+            th.StringType,
+            required=False,
+            default="values",
+            allowed_values=["values", "rowbinary"],
+            description="Format used to send inserts with the http driver. `values` "
+                        "sends escaped SQL text, `rowbinary` sends binary "
+                        "`FORMAT RowBinary` bodies. Naive datetimes are written as "
+                        "UTC with `rowbinary`.",
+        ),
+        th.Property(
+            "datetime_parsing",
+            th.StringType,
+            required=False,
+            default="record",
+            allowed_values=["record", "batch"],
+            description="Parse date and datetime values per record, or per batch "
+                        "with vectorized NumPy conversion. `batch` requires NumPy, "
+                        "installed with the `numpy` extra.",
+        ),
+        th.Property(
+            "async_insert",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Send inserts with ClickHouse `async_insert`, so the server "
+                        "coalesces small batches into fewer parts. Inserts wait for "
+                        "the server to flush (`wait_for_async_insert`) before state "
+                        "is emitted.",
+        ),
+        th.Property(
+            "async_insert_busy_timeout_ms",
+            th.IntegerType,
+            required=False,
+            description="Maximum time in milliseconds the server buffers async "
+                        "inserts before flushing them. Uses the server default if "
+                        "not set.",
+        ),
+        th.Property(
+            "max_batch_latency",
+            th.NumberType,
+            required=False,
+            description="Maximum number of seconds records are buffered before all "
+                        "sinks are drained and state is emitted, in addition to the "
+                        "batch size limit. Checked on a timer, so batches of idle "
+                        "streams are drained too. Defaults to 5 minutes, checked "
+                        "only when records arrive.",
+        ),
+        th.Property(
+            "max_parallelism",
+            th.IntegerType,
+            required=False,
+            default=DEFAULT_MAX_PARALLELISM,
+            description="Maximum number of sinks drained in parallel, each on its "
+                        "own pooled connection. State is emitted only after every "
+                        "sink has been drained. Set to 1 to drain sinks one at a "
+                        "time.",
+        ),
+        th.Property(
+            "pool_size",
+            th.IntegerType,
+            required=False,
+            description="Number of connections kept open in the connection pool. "
+                        "Defaults to `max_parallelism`, and at least 5.",
+        ),
+        th.Property(
+            "pool_max_overflow",
+            th.IntegerType,
+            required=False,
+            default=10,
+            description="Number of connections that may be opened beyond "
+                        "`pool_size` when the pool is exhausted.",
+        ),
+        th.Property(
+            "pool_recycle",
+            th.IntegerType,
+            required=False,
+            default=-1,
+            description="Replace pooled connections older than this many seconds. "
+                        "-1 keeps connections open indefinitely.",
+        ),
+        th.Property(
+            "pool_pre_ping",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Test pooled connections with a ping before each use, and "
+                        "reconnect if they were closed by the server or a proxy.",
+        ),
+        th.Property(
+            "keepalive",
+            th.BooleanType,
+            required=False,
+            default=True,
+            description="Enable TCP keep-alive. With the http driver all pooled "
+                        "connections also share one HTTP session, so sockets and "
+                        "TLS connections are reused between batches.",
+        ),
+        th.Property(
+            "refresh_mode",
+            th.StringType,
+            required=False,
+            default="mutation",
+            allowed_values=["mutation", "exchange", "replace_partition"],
+            description="How ACTIVATE_VERSION replaces old table versions. "
+                        "`mutation` deletes or soft-deletes old rows with ALTER "
+                        "TABLE mutations. `exchange` and `replace_partition` load a "
+                        "version started by an ACTIVATE_VERSION message into a "
+                        "staging table, then swap it in with EXCHANGE TABLES "
+                        "(Atomic databases only) or REPLACE PARTITION.",
+        ),
+        th.Property(
+            "delete_method",
+            th.StringType,
+            required=False,
+            default="mutation",
+            allowed_values=["mutation", "lightweight"],
+            description="How `hard_delete` removes old table versions. `mutation` "
+                        "uses `ALTER TABLE ... DELETE`, `lightweight` uses "
+                        "`DELETE FROM`, which marks rows as deleted without "
+                        "rewriting parts.",
+        ),
+        th.Property(
+            "mutation_wait_timeout",
+            th.NumberType,
+            required=False,
+            default=0,
+            description="Seconds to wait for a table's mutations to finish after "
+                        "deleting old versions, polling `system.mutations`. 0 "
+                        "does not wait.",
+        ),
+        th.Property(
+            "soft_delete_method",
+            th.StringType,
+            required=False,
+            default="mutation",
+            allowed_values=["mutation", "tombstone"],
+            description="How old table versions are soft deleted when "
+                        "`hard_delete` is false. `mutation` sets the soft delete "
+                        "column with `ALTER TABLE ... UPDATE`. `tombstone` inserts "
+                        "deleted copies of the rows instead, for tables created "
+                        "with a ReplacingMergeTree engine and sorted by their key "
+                        "properties. Tables sorted by other columns, e.g. with a "
+                        "`table_layouts` `order_by`, use a lightweight `DELETE "
+                        "FROM` instead.",
+        ),
+        th.Property(
+            "narrow_types",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Derive narrower column types for new columns from JSON "
+                        "schema hints: the smallest integer type holding "
+                        "`minimum`/`maximum`, `Decimal(P, S)` for numbers with "
+                        "`multipleOf`, and `LowCardinality(String)` for enums, "
+                        "strings with a `maxLength` of at most 3, and string "
+                        "columns with few distinct values in the first batch of "
+                        "a new table.",
+        ),
+        th.Property(
+            "table_layouts",
+            th.ObjectType(
+                additional_properties=th.ObjectType(
+                    th.Property("partition_by", th.StringType),
+                    th.Property("order_by", th.ArrayType(th.StringType)),
+                    th.Property("primary_key", th.ArrayType(th.StringType)),
+                    th.Property("ttl", th.ArrayType(th.StringType)),
+                    th.Property(
+                        "codecs",
+                        th.ObjectType(additional_properties=th.StringType),
+                    ),
+                    th.Property(
+                        "settings",
+                        th.ObjectType(
+                            additional_properties=th.CustomType(
+                                {"type": ["integer", "number", "string", "boolean"]},
+                            ),
+                        ),
+                    ),
+                ),
+            ),
+            required=False,
+            description="Layout of new MergeTree tables, by table name. "
+                        "`partition_by` is a partition expression, e.g. "
+                        "`toYYYYMM(created_at)`. `order_by` and `primary_key` are "
+                        "lists of sorting and primary key expressions, replacing "
+                        "the key properties and `order_by_keys`; `primary_key` must "
+                        "be a prefix of `order_by`. `ttl` is a list of TTL rules, "
+                        "`settings` are table settings, e.g. `index_granularity`, "
+                        "and `codecs` are column codecs by column name, e.g. "
+                        "`DoubleDelta, ZSTD(1)`.",
+        ),
+        th.Property(
+            "codec_advisor",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Choose the codecs of numeric, date and datetime columns "
+                        "of new tables from their first batch, trying `Delta`, "
+                        "`DoubleDelta` and `Gorilla` with `ZSTD(1)` on the data. "
+                        "Codecs set in `table_layouts` are kept.",
+        ),
+        th.Property(
+            "nested_types",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Create native `Array`, `Tuple` and `Map` columns for "
+                        "array and object properties instead of JSON strings, "
+                        "where their values have string, integer, number or "
+                        "boolean types.",
+        ),
+        th.Property(
+            "metrics_textfile",
+            th.StringType,
+            required=False,
+            description="Write per-table performance metrics in the OpenMetrics "
+                        "text format to this file after each batch, e.g. for the "
+                        "node_exporter textfile collector.",
+        ),
+        th.Property(
+            "metrics_port",
+            th.IntegerType,
+            required=False,
+            description="Serve per-table performance metrics in the OpenMetrics "
+                        "text format on this port, for Prometheus to scrape.",
+        ),
+        th.Property(
+            "metrics_host",
+            th.StringType,
+            required=False,
+            default=DEFAULT_METRICS_HOST,
+            description="The address `metrics_port` is served on. Only local "
+                        "clients can scrape the default; use `0.0.0.0` for all "
+                        "interfaces.",
+        ),
+        th.Property(
+            "tracing",
+            th.StringType,
+            required=False,
+            allowed_values=["json", "opentelemetry"],
+            description="Record trace spans of message parsing, validation, "
+                        "inserts, version activation and DDL, to a JSON trace "
+                        "file or to OpenTelemetry. `opentelemetry` requires the "
+                        "`opentelemetry` extra.",
+        ),
+        th.Property(
+            "trace_file",
+            th.StringType,
+            required=False,
+            default=DEFAULT_TRACE_FILE,
+            description="The file `json` tracing writes Chrome trace events to.",
+        ),
+        th.Property(
+            "trace_record_interval",
+            th.IntegerType,
+            required=False,
+            default=DEFAULT_TRACE_RECORD_INTERVAL,
+            description="Trace the per-record phases of one in this many records.",
+        ),
+        th.Property(
+            "profile_file",
+            th.StringType,
+            required=False,
+            description="Run a sampling profiler, and write the sampled stacks in "
+                        "the collapsed stack format to this file at exit.",
+        ),
+        th.Property(
+            "profile_interval",
+            th.NumberType,
+            required=False,
+            default=DEFAULT_PROFILE_INTERVAL,
+            description="Seconds between samples of the sampling profiler.",
+        ),
+        th.Property(
+            "batch_max_bytes",
+            th.IntegerType,
+            required=False,
+            default=DEFAULT_BATCH_MAX_BYTES,
+            description="Insert a batch once its estimated size reaches this many "
+                        "bytes, even if it has fewer than `batch_size_rows` "
+                        "records. 0, the default, for no limit.",
+        ),
+        th.Property(
+            "adaptive_batching",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Tune the number of rows per batch of each table from "
+                        "insert latency and the active parts of its partitions, "
+                        "starting at `batch_size_rows`.",
+        ),
+        th.Property(
+            "adaptive_batch_max_rows",
+            th.IntegerType,
+            required=False,
+            default=DEFAULT_ADAPTIVE_BATCH_MAX_ROWS,
+            description="The largest number of rows per batch with "
+                        "`adaptive_batching`.",
+        ),
+        th.Property(
+            "adaptive_batch_target_seconds",
+            th.NumberType,
+            required=False,
+            default=DEFAULT_ADAPTIVE_BATCH_TARGET_SECONDS,
+            description="The insert latency `adaptive_batching` aims for. Slower "
+                        "inserts shrink batches.",
+        ),
+        th.Property(
+            "compression",
+            th.StringType,
+            required=False,
+            allowed_values=["gzip", "zstd", "lz4"],
+            description="Compress data sent to the server. The http driver sends "
+                        "compressed request bodies with `gzip`, `zstd` or `lz4` "
+                        "and asks for compressed responses; the native driver "
+                        "compresses blocks with `lz4` or `zstd`. `zstd` and `lz4` "
+                        "require the `compression` extra.",
+        ),
+        th.Property(
+            "insert_chunk_bytes",
+            th.IntegerType,
+            required=False,
+            description="Stream inserts in chunks of about this many bytes, "
+                        "encoding rows while they are sent, instead of building "
+                        "the whole insert in memory first. Used by `RowBinary` "
+                        "inserts of the http driver and block inserts of the "
+                        "native driver.",
+        ),
+        th.Property(
+            "memory_budget",
+            th.IntegerType,
+            required=False,
+            description="Approximate bytes the pending batches of all streams may "
+                        "hold. When exceeded, the largest batches are inserted "
+                        "first, until usage is within the budget.",
+        ),
+        th.Property(
+            "record_validation",
+            th.StringType,
+            required=False,
+            default="compiled",
+            allowed_values=["compiled", "jsonschema", "sampled"],
+            description="How records are validated against the stream schema. "
+                        "`compiled` compiles each schema into a specialized "
+                        "check, `jsonschema` uses the generic validator, and "
+                        "`sampled` validates one in `validation_sample_interval` "
+                        "records, plus records with properties missing from the "
+                        "schema. Invalid records raise the same errors either way.",
+        ),
+        th.Property(
+            "validation_sample_interval",
+            th.IntegerType,
+            required=False,
+            default=DEFAULT_VALIDATION_SAMPLE_INTERVAL,
+            description="With `record_validation: sampled`, validate one in this "
+                        "many records.",
         ),
         th.Property(
             "order_by_keys",
@@ -149,6 +555,161 @@ class TargetClickhouse(SQLTarget):
 
     default_sink_class = ClickhouseSink
 
+    @property
+    def max_parallelism(self) -> int:
+        """Return the maximum number of sinks drained in parallel.
+
+        `SQLTarget.drain_all` drains the active sinks on a thread pool of this
+        size, and only writes the latest state once all of them are drained.
+        """
+        return self.config.get("max_parallelism") or DEFAULT_MAX_PARALLELISM
+
+    def deserialize_json(self, line: str) -> dict:
+        """Deserialize a line of JSON, in a sampled `parse_message` span.
+
+        Args:
+            line: A single line of JSON.
+
+        Returns:
+            The deserialized message.
+
+        """
+        with self.target_connector.tracer.record_span("parse_message"):
+            return super().deserialize_json(line)
+
+    def _process_lines(self, file_input: IO[str]) -> Counter[str]:
+        """Process all input lines, with the profiler running if configured.
+
+        Args:
+            file_input: Readable stream of messages, each on a separate line.
+
+        Returns:
+            A counter object for the processed lines.
+
+        """
+        tracer = self.target_connector.tracer
+        tracer.start()
+        max_batch_latency = self.config.get("max_batch_latency")
+        if not max_batch_latency:
+            with tracer.span("process_lines"):
+                return super()._process_lines(file_input)
+
+        timer = DrainTimer(max_batch_latency, self._drain_expired_batches)
+        lines = timer.locked_lines(file_input)
+        timer.start()
+        try:
+            with tracer.span("process_lines"):
+                return super()._process_lines(lines)
+        finally:
+            timer.stop()
+            lines.close()
+
+    def _drain_expired_batches(self) -> None:
+        """Drain all sinks if buffered records are older than `max_batch_latency`."""
+        if self._has_buffered_records():
+            self._handle_max_record_age()
+
+    def _has_buffered_records(self) -> bool:
+        """Return whether any sink holds records not inserted yet."""
+        sinks = [*self._sinks_to_clear, *self._sinks_active.values()]
+        return any(sink.current_size for sink in sinks)
+
+    def _handle_max_record_age(self) -> None:
+        """Drain all sinks if the oldest buffered record reached its maximum age.
+
+        Overrides the SDK's check only to log the age in seconds, since
+        `max_batch_latency` is often less than a minute.
+        """
+        if self._max_record_age_in_minutes > self._MAX_RECORD_AGE_IN_MINUTES:
+            self.logger.info(
+                "Records were buffered for over %g seconds. Draining all sinks.",
+                self._MAX_RECORD_AGE_IN_MINUTES * 60,
+            )
+            self.drain_all()
+
+    def _process_record_message(self, message_dict: dict) -> None:
+        """Process a RECORD message, then enforce the `memory_budget`.
+
+        The first record of a new table version starts loading it into a staging
+        table, with a `refresh_mode` other than `mutation`. With
+        `max_batch_latency`, the age of buffered records is counted from the
+        first record buffered, rather than from the previous drain.
+
+        Args:
+            message_dict: The RECORD message.
+
+        """
+        if self.config.get("max_batch_latency") and not self._has_buffered_records():
+            self._reset_max_record_age()
+        version = message_dict.get("version")
+        if version is not None:
+            self._start_table_version(message_dict["stream"], version)
+        super()._process_record_message(message_dict)
+        memory = self.target_connector.memory_accountant
+        if memory.over_budget:
+            self._drain_largest_sinks(memory)
+
+    def _start_table_version(self, stream_name: str, version: int) -> None:
+        """Let the sinks of a stream start staging a new table version.
+
+        Args:
+            stream_name: The stream of a RECORD message.
+            version: The table version of the record.
+
+        """
+        for stream_map in self.mapper.stream_maps.get(stream_name, []):
+            sink = self._sinks_active.get(stream_map.stream_alias)
+            if sink is not None:
+                cast(ClickhouseSink, sink).start_table_version(version)
+
+    def _drain_largest_sinks(self, memory: MemoryAccountant) -> None:
+        """Drain the sinks holding the most memory until usage is within budget.
+
+        Args:
+            memory: The target's memory accountant.
+
+        """
+        for sink in memory.largest_first():
+            if not memory.over_budget:
+                break
+            sink = cast(ClickhouseSink, sink)
+            if sink.current_size == 0:
+                memory.release(sink)
+                continue
+            self.logger.info(
+                "Memory budget of %d bytes exceeded (%d bytes held), draining '%s' "
+                "with %d records.",
+                memory.budget,
+                memory.held_bytes,
+                sink.stream_name,
+                sink.current_size,
+            )
+            memory.budget_drains += 1
+            self.drain_one(sink)
+
+    def _process_endofpipe(self) -> None:
+        """Drain all sinks, wait for optimizations, then log the pool metrics."""
+        super()._process_endofpipe()
+        if self._target_connector is not None:
+            self._target_connector.optimize_scheduler.wait()
+            self._target_connector.metrics.close()
+            self._target_connector.tracer.close()
+            self.logger.info(
+                "Connection pool metrics: %s",
+                self._target_connector.pool_metrics.as_dict(),
+            )
+
+    @property
+    def _MAX_RECORD_AGE_IN_MINUTES(self) -> float:  # noqa: N802
+        """Return the maximum age of buffered records before all sinks are drained.
+
+        Overrides the SDK's fixed default with the `max_batch_latency` setting.
+        """
+        max_batch_latency = self.config.get("max_batch_latency")
+        if max_batch_latency:
+            return max_batch_latency / 60
+        return SQLTarget._MAX_RECORD_AGE_IN_MINUTES  # noqa: SLF001
+
 
 if __name__ == "__main__":
     TargetClickhouse.cli()
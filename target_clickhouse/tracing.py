@@ -0,0 +1,246 @@
+"""Opt-in tracing and sampling profiling of the ingestion hot path.
+
+With `tracing` set, the main phases of a run are wrapped in spans: message
+parsing, record validation and coercion, batch inserts, version activation and
+connector DDL. Spans are written to a JSON file in the Chrome trace event format
+(`json`, viewable in Perfetto or chrome://tracing), or sent to OpenTelemetry
+(`opentelemetry`, requires the optional `opentelemetry` extra). Spans of
+per-record phases are only recorded for one in `trace_record_interval` records,
+so tracing a large load stays cheap.
+
+With `profile_file` set, a sampling profiler records the stacks of all threads
+every `profile_interval` seconds, and writes them at exit in the collapsed stack
+format read by `flamegraph.pl`, speedscope and similar tools.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, ContextManager, Iterator
+
+import simplejson as json
+
+DEFAULT_TRACE_FILE = "target-clickhouse-trace.json"
+DEFAULT_TRACE_RECORD_INTERVAL = 1000
+DEFAULT_PROFILE_INTERVAL = 0.01
+
+NULL_SPAN: ContextManager[None] = contextlib.nullcontext()
+
+
+def _get_opentelemetry_tracer() -> Any:  # noqa: ANN401
+    """Return an OpenTelemetry tracer, setting up an OTLP exporter if possible.
+
+    If no tracer provider was configured, e.g. by `opentelemetry-instrument`, and
+    the OpenTelemetry SDK and OTLP exporter are installed, spans are exported
+    with the exporter's `OTEL_EXPORTER_OTLP_*` environment settings.
+    """
+    try:
+        from opentelemetry import trace
+    except ImportError as e:
+        msg = (
+            "`opentelemetry-api` is required for `tracing: opentelemetry`, "
+            "install the `opentelemetry` extra."
+        )
+        raise ImportError(msg) from e
+
+    if isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            pass
+        else:
+            provider = TracerProvider()
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+    return trace.get_tracer("target-clickhouse")
+
+
+class Tracer:
+    """Records spans, and runs the sampling profiler, as configured."""
+
+    def __init__(self, config: dict) -> None:
+        """Create a tracer from the target's config.
+
+        Args:
+            config: The target config, with the `tracing`, `trace_file`,
+                `trace_record_interval`, `profile_file` and `profile_interval`
+                settings.
+
+        """
+        self.exporter = config.get("tracing")
+        self.enabled = self.exporter in ("json", "opentelemetry")
+        self.trace_file = config.get("trace_file") or DEFAULT_TRACE_FILE
+        self.record_interval = max(
+            1,
+            config.get("trace_record_interval") or DEFAULT_TRACE_RECORD_INTERVAL,
+        )
+        self._events: list[dict] = []
+        self._lock = threading.Lock()
+        self._record_counts: dict[str, int] = defaultdict(int)
+        self._otel_tracer = (
+            _get_opentelemetry_tracer() if self.exporter == "opentelemetry" else None
+        )
+        self.profiler = (
+            SamplingProfiler(
+                config["profile_file"],
+                config.get("profile_interval") or DEFAULT_PROFILE_INTERVAL,
+            )
+            if config.get("profile_file")
+            else None
+        )
+
+    def span(self, name: str, **attributes: Any) -> ContextManager[None]:
+        """Return a context manager recording a span, a no-op if tracing is off.
+
+        Args:
+            name: The span name.
+            **attributes: Attributes of the span, e.g. the table name.
+
+        Returns:
+            The span's context manager.
+
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        # Span attributes must be primitive values, e.g. not table name objects.
+        attributes = {
+            key: value if isinstance(value, (str, int, float, bool)) else str(value)
+            for key, value in attributes.items()
+            if value is not None
+        }
+        if self._otel_tracer is not None:
+            return self._otel_tracer.start_as_current_span(name, attributes=attributes)
+        return self._json_span(name, attributes)
+
+    def record_span(self, name: str, **attributes: Any) -> ContextManager[None]:
+        """Return a span for one in `trace_record_interval` calls of a record phase.
+
+        Args:
+            name: The span name.
+            **attributes: Attributes of the span.
+
+        Returns:
+            The span's context manager, a no-op for unsampled calls.
+
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        count = self._record_counts[name]
+        self._record_counts[name] = count + 1
+        if count % self.record_interval:
+            return NULL_SPAN
+        return self.span(name, **attributes)
+
+    @contextlib.contextmanager
+    def _json_span(self, name: str, attributes: dict) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "cat": "target-clickhouse",
+                "ph": "X",
+                "ts": round(start * 1_000_000, 3),
+                "dur": round((end - start) * 1_000_000, 3),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": attributes,
+            }
+            with self._lock:
+                self._events.append(event)
+
+    def start(self) -> None:
+        """Start the sampling profiler, if configured."""
+        if self.profiler is not None:
+            self.profiler.start()
+
+    def close(self) -> None:
+        """Write the JSON trace and the profile, and flush OpenTelemetry spans."""
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self.exporter == "json":
+            with self._lock:
+                events, self._events = self._events, []
+            with Path(self.trace_file).open("w") as file:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        elif self._otel_tracer is not None:
+            from opentelemetry import trace
+
+            force_flush = getattr(trace.get_tracer_provider(), "force_flush", None)
+            if force_flush is not None:
+                force_flush()
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads from a background thread."""
+
+    def __init__(self, path: str, interval: float) -> None:
+        """Create a profiler. Sampling starts with `start`.
+
+        Args:
+            path: The file to write the collapsed stacks to.
+            interval: Seconds between samples.
+
+        """
+        self.path = path
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start sampling, unless already started."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name="profiler",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and write the collapsed stacks."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        with Path(self.path).open("w") as file:
+            for stack, count in sorted(self.samples.items()):
+                file.write(f"{stack} {count}\n")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """Count the current stack of every other thread."""
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():  # noqa: SLF001
+            if ident == own_ident:
+                continue
+            functions = []
+            current = frame
+            while current is not None:
+                code = current.f_code
+                functions.append(
+                    f"{code.co_name} ({Path(code.co_filename).name}:"
+                    f"{code.co_firstlineno})",
+                )
+                current = current.f_back
+            functions.append(names.get(ident, str(ident)))
+            self.samples[";".join(reversed(functions))] += 1
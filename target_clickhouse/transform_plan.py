@@ -0,0 +1,289 @@
+"""Per-stream record transformation plans.
+
+A plan is compiled once from a stream's JSON schema and records which properties
+need string coercion, date/datetime/time parsing, JSON encoding or conversion to
+native nested values, including the nested object and array paths. Records are
+then transformed by walking the plan instead of re-inspecting the schema for every
+field of every record.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from logging import Logger
+from typing import Any, Callable, Collection
+
+import simplejson as json
+from singer_sdk.helpers._compat import (
+    date_fromisoformat,
+    datetime_fromisoformat,
+    time_fromisoformat,
+)
+from singer_sdk.helpers._typing import (
+    DatetimeErrorTreatmentEnum,
+    get_datelike_property_type,
+    handle_invalid_timestamp_in_record,
+)
+
+from target_clickhouse.nested import Converter, get_native_converter
+
+
+def _get_types(property_schema: dict) -> list[str] | None:
+    expected_type = property_schema.get("type")
+    if expected_type is None:
+        return None
+    if not isinstance(expected_type, list):
+        expected_type = [expected_type]
+    return expected_type
+
+
+@dataclass
+class PropertyPlan:
+    """Transformations that apply to a single property."""
+
+    nullable: bool = False
+    # Nested plan for objects; applied when the value is a dict.
+    object_plan: TransformPlan | None = None
+    # Set for array properties; `item_plan` is applied to dict items.
+    is_array: bool = False
+    item_plan: TransformPlan | None = None
+    # Convert non-string values to strings before validation.
+    coerce_string: bool = False
+    # One of "date", "datetime" or "time" if the value must be parsed.
+    datelike_type: str | None = None
+    # Dict and list values must be JSON encoded before insert.
+    json_encode: bool = False
+    # Converts values of native Array, Tuple and Map columns before insert.
+    convert: Converter | None = None
+
+    @property
+    def needs_coercion(self) -> bool:
+        """Return True if the property may need repair before validation."""
+        return self.object_plan is not None or self.is_array or self.coerce_string
+
+
+@dataclass
+class TransformPlan:
+    """Compiled transformations for all properties of an object schema."""
+
+    properties: dict[str, PropertyPlan] = field(default_factory=dict)
+    coercions: dict[str, PropertyPlan] = field(default_factory=dict)
+    json_keys: list[str] = field(default_factory=list)
+    datelike_keys: dict[str, str] = field(default_factory=dict)
+    converters: dict[str, Converter] = field(default_factory=dict)
+
+    @classmethod
+    def from_schema(
+        cls,
+        schema: dict | None,
+        *,
+        native_nested: bool = False,
+        native_columns: Collection[str] | None = None,
+    ) -> TransformPlan:
+        """Compile a plan from a JSON schema.
+
+        Args:
+            schema: JSON schema for the stream, or for a nested object.
+            native_nested: True to convert the values of array and object
+                properties with a native type instead of JSON encoding them.
+            native_columns: With `native_nested`, the properties whose existing
+                columns have a native `Array`, `Tuple` or `Map` type. Other
+                properties are JSON encoded. None if the columns are not known.
+
+        Returns:
+            The compiled plan.
+
+        """
+        plan = cls()
+        if not schema:
+            return plan
+
+        for key, property_schema in schema.get("properties", {}).items():
+            property_plan = PropertyPlan(
+                datelike_type=get_datelike_property_type(property_schema),
+            )
+            if native_nested and (native_columns is None or key in native_columns):
+                property_plan.convert = get_native_converter(property_schema)
+            expected_type = _get_types(property_schema)
+            if expected_type is None:
+                # Untyped properties (e.g. anyOf) may hold any JSON value.
+                property_plan.json_encode = True
+            else:
+                property_plan.nullable = "null" in expected_type
+                if "object" in expected_type:
+                    property_plan.object_plan = cls.from_schema(property_schema)
+                if "array" in expected_type:
+                    property_plan.is_array = True
+                    items_schema = property_schema.get("items") or {}
+                    if "object" in (_get_types(items_schema) or []):
+                        property_plan.item_plan = cls.from_schema(items_schema)
+                property_plan.coerce_string = "string" in expected_type
+                # Values of native Array, Tuple and Map columns are converted instead.
+                property_plan.json_encode = property_plan.convert is None and (
+                    "object" in expected_type or "array" in expected_type
+                )
+
+            plan.properties[key] = property_plan
+            if property_plan.needs_coercion:
+                plan.coercions[key] = property_plan
+            if property_plan.json_encode:
+                plan.json_keys.append(key)
+            if property_plan.convert is not None:
+                plan.converters[key] = property_plan.convert
+            if property_plan.datelike_type:
+                plan.datelike_keys[key] = property_plan.datelike_type
+        return plan
+
+    def coerce(self, record: dict, logger: Logger | None = None) -> dict:
+        """Repair string type mismatches in place, recursing into nested values.
+
+        Args:
+            record: Individual record in the stream.
+            logger: Logger to use for logging.
+
+        Returns:
+            The record, with corrected string type mismatches.
+
+        """
+        for key, property_plan in self.coercions.items():
+            if key not in record:
+                continue
+            value = record[key]
+            if value is None and property_plan.nullable:
+                continue
+
+            if property_plan.object_plan is not None and isinstance(value, dict):
+                property_plan.object_plan.coerce(value, logger)
+            elif property_plan.is_array and isinstance(value, list):
+                item_plan = property_plan.item_plan
+                if item_plan is None:
+                    continue
+                for i, item in enumerate(value):
+                    if isinstance(item, dict):
+                        value[i] = item_plan.coerce(item, logger)
+            elif property_plan.coerce_string and not isinstance(value, str):
+                # Convert the value to string if it's not already a string.
+                record[key] = (
+                    json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+                )
+                if logger:
+                    logger.debug(f"Converted field {key} to string: {record[key]}")
+
+        return record
+
+    def finalize(
+        self,
+        record: dict,
+        treatment: DatetimeErrorTreatmentEnum,
+        logger: Logger,
+        *,
+        parse_datelike: bool = True,
+    ) -> None:
+        """Parse datelike values and JSON encode or convert nested values, in one pass.
+
+        Args:
+            record: Individual (already validated) record in the stream.
+            treatment: How to repair out of range date values.
+            logger: Logger to use for logging.
+            parse_datelike: False to leave datelike values for batch parsing.
+
+        """
+        properties = self.properties
+        for key, value in record.items():
+            property_plan = properties.get(key)
+            if property_plan is None:
+                logger.warning("No schema for record field '%s'", key)
+                continue
+            if property_plan.datelike_type:
+                if not parse_datelike:
+                    continue
+                record[key] = parse_datelike_value(
+                    record,
+                    key,
+                    value,
+                    property_plan.datelike_type,
+                    treatment,
+                    logger,
+                )
+            elif property_plan.json_encode and isinstance(value, (dict, list)):
+                record[key] = json.dumps(value)
+            elif property_plan.convert is not None:
+                record[key] = property_plan.convert(value)
+        self._convert_missing(record)
+
+    def encode_json(self, record: dict) -> None:
+        """JSON encode or convert the values of the properties that may be nested.
+
+        Args:
+            record: Individual record in the stream.
+
+        """
+        for key in self.json_keys:
+            value = record.get(key)
+            if isinstance(value, (dict, list)):
+                record[key] = json.dumps(value)
+        for key, convert in self.converters.items():
+            if key in record:
+                record[key] = convert(record[key])
+        self._convert_missing(record)
+
+    def _convert_missing(self, record: dict) -> None:
+        """Set missing native nested values, which cannot be NULL, to empty values."""
+        for key, convert in self.converters.items():
+            if key not in record:
+                record[key] = convert(None)
+
+
+DATELIKE_PARSERS: dict[str, Callable[[str], Any]] = {
+    "time": time_fromisoformat,
+    "date": date_fromisoformat,
+    "date-time": datetime_fromisoformat,
+}
+
+
+def parse_datelike_value(
+    record: dict,
+    key: str,
+    value: Any,  # noqa: ANN401
+    datelike_type: str,
+    treatment: DatetimeErrorTreatmentEnum,
+    logger: Logger,
+) -> Any:  # noqa: ANN401
+    """Parse a date, datetime or time string, repairing out of range values.
+
+    Args:
+        record: The record holding the value, used for error reporting.
+        key: The property name.
+        value: The raw value.
+        datelike_type: One of "date", "date-time" or "time".
+        treatment: How to repair out of range values: MAX, NULL or ERROR.
+        logger: Logger to use for logging.
+
+    Returns:
+        The parsed value.
+
+    """
+    if value is None:
+        return None
+    date_val = value
+    try:
+        if datelike_type == "date" and "T" in date_val:
+            # Trim time value from date fields, keeping the part before T.
+            date_val = date_val.split("T")[0]
+            logger.warning(
+                "Trimmed time value from date field '%s': %s",
+                key,
+                date_val,
+            )
+        parser = DATELIKE_PARSERS.get(datelike_type, datetime_fromisoformat)
+        return parser(date_val)
+    except ValueError as ex:
+        return handle_invalid_timestamp_in_record(
+            record,
+            [key],
+            date_val,
+            datelike_type,
+            ex,
+            treatment,
+            logger,
+        )
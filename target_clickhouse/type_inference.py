@@ -0,0 +1,223 @@
+"""Narrow ClickHouse column types inferred from JSON schema hints.
+
+Used by `ClickhouseConnector.to_sql_type` with `narrow_types` enabled: bounded
+integers get the smallest integer type holding their range, numbers with a
+`multipleOf` get an exact `Decimal(P, S)`, and enums and short strings become
+`LowCardinality(String)`. String columns of new tables can also be converted to
+`LowCardinality(String)` from the cardinality of their first batch.
+"""
+
+from __future__ import annotations
+
+import decimal
+from typing import Any, Iterable, Sequence
+
+import sqlalchemy.types
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+# Integer types from narrowest to widest, with their value ranges.
+INTEGER_TYPES: list[tuple[type[sqlalchemy.types.TypeEngine], int, int]] = [
+    (clickhouse_sqlalchemy_types.UInt8, 0, 2**8 - 1),
+    (clickhouse_sqlalchemy_types.Int8, -(2**7), 2**7 - 1),
+    (clickhouse_sqlalchemy_types.UInt16, 0, 2**16 - 1),
+    (clickhouse_sqlalchemy_types.Int16, -(2**15), 2**15 - 1),
+    (clickhouse_sqlalchemy_types.UInt32, 0, 2**32 - 1),
+    (clickhouse_sqlalchemy_types.Int32, -(2**31), 2**31 - 1),
+    (clickhouse_sqlalchemy_types.UInt64, 0, 2**64 - 1),
+    (clickhouse_sqlalchemy_types.Int64, -(2**63), 2**63 - 1),
+]
+
+# Precision of decimals without bounds, the widest 128-bit Decimal.
+DEFAULT_DECIMAL_PRECISION = 38
+MAX_DECIMAL_PRECISION = 76
+
+# Strings up to this length, e.g. country, currency or language codes.
+LOW_CARDINALITY_MAX_LENGTH = 3
+# A sampled column becomes LowCardinality if it has at most this many distinct
+# values, and at most this ratio of distinct values to rows.
+LOW_CARDINALITY_MIN_SAMPLE = 1000
+LOW_CARDINALITY_MAX_DISTINCT = 10000
+LOW_CARDINALITY_MAX_RATIO = 0.05
+
+
+def _get_bounds(jsonschema_type: dict) -> tuple[Any, Any]:
+    minimum = jsonschema_type.get("minimum", jsonschema_type.get("exclusiveMinimum"))
+    maximum = jsonschema_type.get("maximum", jsonschema_type.get("exclusiveMaximum"))
+    # Draft 4 uses boolean `exclusiveMinimum` and `exclusiveMaximum` flags.
+    if isinstance(minimum, bool) or isinstance(maximum, bool):
+        return None, None
+    return minimum, maximum
+
+
+def get_integer_type(jsonschema_type: dict) -> sqlalchemy.types.TypeEngine:
+    """Return the narrowest integer type holding the range of an integer schema.
+
+    Args:
+        jsonschema_type: The JSON schema of an integer property.
+
+    Returns:
+        The integer type, `Int64` if the schema does not bound both ends.
+
+    """
+    minimum, maximum = _get_bounds(jsonschema_type)
+    if minimum is not None and maximum is not None:
+        for integer_type, lower, upper in INTEGER_TYPES:
+            if lower <= minimum and maximum <= upper:
+                return integer_type()
+    return clickhouse_sqlalchemy_types.Int64()
+
+
+def get_decimal_type(jsonschema_type: dict) -> sqlalchemy.types.TypeEngine | None:
+    """Return an exact decimal type for a number schema with a `multipleOf`.
+
+    The scale is the number of decimal places of `multipleOf`, and the precision
+    holds the integer digits of the bounds if both are set.
+
+    Args:
+        jsonschema_type: The JSON schema of a number property.
+
+    Returns:
+        The `Decimal(P, S)` type, or None if the schema has no usable `multipleOf`.
+
+    """
+    multiple_of = jsonschema_type.get("multipleOf")
+    if multiple_of is None or isinstance(multiple_of, bool):
+        return None
+    exponent = decimal.Decimal(str(multiple_of)).normalize().as_tuple().exponent
+    if not isinstance(exponent, int):
+        return None
+    scale = max(0, -exponent)
+
+    minimum, maximum = _get_bounds(jsonschema_type)
+    if minimum is not None and maximum is not None:
+        largest = max(
+            abs(decimal.Decimal(str(minimum))),
+            abs(decimal.Decimal(str(maximum))),
+        )
+        precision = max(1, len(str(int(largest)))) + scale
+    else:
+        precision = max(DEFAULT_DECIMAL_PRECISION, scale)
+    if precision > MAX_DECIMAL_PRECISION:
+        return None
+    return clickhouse_sqlalchemy_types.Decimal(precision, scale)
+
+
+def is_low_cardinality_string(jsonschema_type: dict) -> bool:
+    """Return True if a string schema has few possible values.
+
+    Args:
+        jsonschema_type: The JSON schema of a string property.
+
+    Returns:
+        True for enums and strings of at most `LOW_CARDINALITY_MAX_LENGTH`.
+
+    """
+    if jsonschema_type.get("enum"):
+        return True
+    max_length = jsonschema_type.get("maxLength")
+    return max_length is not None and max_length <= LOW_CARDINALITY_MAX_LENGTH
+
+
+def narrow_sql_type(
+    jsonschema_type: dict,
+    sql_type: sqlalchemy.types.TypeEngine,
+) -> sqlalchemy.types.TypeEngine:
+    """Return a narrower type for a property, if its JSON schema allows one.
+
+    Args:
+        jsonschema_type: The JSON schema of the property.
+        sql_type: The type mapped by the singer SDK.
+
+    Returns:
+        The narrower type, or `sql_type` if there is none.
+
+    """
+    if type(sql_type) == sqlalchemy.types.INTEGER:
+        return get_integer_type(jsonschema_type)
+    if type(sql_type) == sqlalchemy.types.DECIMAL:
+        return get_decimal_type(jsonschema_type) or sql_type
+    if type(sql_type) == sqlalchemy.types.VARCHAR and is_low_cardinality_string(
+        jsonschema_type,
+    ):
+        return clickhouse_sqlalchemy_types.LowCardinality(
+            clickhouse_sqlalchemy_types.String,
+        )
+    return sql_type
+
+
+def widen_narrow_type(
+    current_type: sqlalchemy.types.TypeEngine,
+    sql_type: sqlalchemy.types.TypeEngine,
+) -> sqlalchemy.types.TypeEngine | None:
+    """Return a type holding the values of two integer or two decimal types.
+
+    Args:
+        current_type: The current column type.
+        sql_type: The type required by the new schema.
+
+    Returns:
+        `current_type` if it holds the values of `sql_type`, else the narrowest
+        type holding both. None if the types are not both integers or decimals.
+
+    """
+    ranges = {
+        integer_type: (lower, upper) for integer_type, lower, upper in INTEGER_TYPES
+    }
+    if type(current_type) in ranges and type(sql_type) in ranges:
+        current_lower, current_upper = ranges[type(current_type)]
+        lower, upper = ranges[type(sql_type)]
+        if current_lower <= lower and upper <= current_upper:
+            return current_type
+        return get_integer_type(
+            {
+                "minimum": min(current_lower, lower),
+                "maximum": max(current_upper, upper),
+            },
+        )
+
+    decimal_type = clickhouse_sqlalchemy_types.Decimal
+    if isinstance(current_type, decimal_type) and isinstance(sql_type, decimal_type):
+        scale = max(current_type.scale, sql_type.scale)
+        integer_digits = max(
+            current_type.precision - current_type.scale,
+            sql_type.precision - sql_type.scale,
+        )
+        if (
+            scale == current_type.scale
+            and integer_digits == current_type.precision - current_type.scale
+        ):
+            return current_type
+        return decimal_type(min(integer_digits + scale, MAX_DECIMAL_PRECISION), scale)
+    return None
+
+
+def get_low_cardinality_columns(
+    records: Sequence[dict],
+    column_names: Iterable[str],
+) -> list[str]:
+    """Return the string columns of a batch with few distinct values.
+
+    Args:
+        records: The batch of records.
+        column_names: The names of the string columns to sample.
+
+    Returns:
+        The names of the columns that should be `LowCardinality(String)`.
+
+    """
+    if len(records) < LOW_CARDINALITY_MIN_SAMPLE:
+        return []
+    max_distinct = min(
+        LOW_CARDINALITY_MAX_DISTINCT,
+        int(len(records) * LOW_CARDINALITY_MAX_RATIO),
+    )
+    low_cardinality_columns = []
+    for name in column_names:
+        distinct_values = set()
+        for record in records:
+            distinct_values.add(record.get(name))
+            if len(distinct_values) > max_distinct:
+                break
+        else:
+            low_cardinality_columns.append(name)
+    return low_cardinality_columns
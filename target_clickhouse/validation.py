@@ -0,0 +1,343 @@
+"""Compiled JSON schema validation of records.
+
+The generic `jsonschema` validator walks the schema for every record. Instead,
+`RecordValidator` compiles each stream schema once into a specialized Python
+function that returns whether a record is valid, and caches it by schema
+fingerprint, so streams sharing a schema and sinks recreated for an unchanged
+SCHEMA message reuse it.
+
+The compiled function handles the keywords taps commonly emit: `type`,
+`properties`, `required`, `additionalProperties`, `items`, `anyOf`, `enum`, the
+numeric bounds and the string lengths. Subschemas with other validation
+keywords are checked by a `jsonschema` validator for that subschema, and schemas
+with references are not compiled at all. A record the compiled function rejects
+is validated again by the generic validator, so errors are raised exactly as
+before, with the same `InvalidRecord` message.
+
+For trusted taps, `sampled` validation checks one in `validation_sample_interval`
+records, and every record with a property missing from the schema.
+"""
+
+from __future__ import annotations
+
+import numbers
+import threading
+from typing import Any, Callable
+
+import jsonschema.validators
+from singer_sdk.sinks.core import BaseJSONSchemaValidator, JSONSchemaValidator
+from singer_sdk.typing import DEFAULT_JSONSCHEMA_VALIDATOR
+
+from target_clickhouse.metadata import schema_fingerprint
+
+DEFAULT_VALIDATION_SAMPLE_INTERVAL = 100
+
+# Validation keywords compiled into Python code. `format` is only compiled, as a
+# no-op, when formats are not validated.
+COMPILED_KEYWORDS = frozenset(
+    {
+        "type",
+        "properties",
+        "required",
+        "additionalProperties",
+        "items",
+        "anyOf",
+        "enum",
+        "minimum",
+        "maximum",
+        "exclusiveMinimum",
+        "exclusiveMaximum",
+        "minLength",
+        "maxLength",
+        "format",
+    },
+)
+REFERENCE_KEYWORDS = frozenset({"$ref", "$dynamicRef", "$recursiveRef"})
+# Drafts sharing the semantics of the compiled keywords, e.g. integral floats
+# being integers and numeric `exclusiveMinimum`.
+COMPILED_DRAFTS = (
+    jsonschema.Draft6Validator,
+    jsonschema.Draft7Validator,
+    jsonschema.Draft201909Validator,
+    jsonschema.Draft202012Validator,
+)
+
+TYPE_EXPRESSIONS = {
+    "string": "isinstance({0}, str)",
+    "integer": (
+        "(isinstance({0}, int) and not isinstance({0}, bool)"
+        " or isinstance({0}, float) and {0}.is_integer())"
+    ),
+    "number": "(isinstance({0}, _Number) and not isinstance({0}, bool))",
+    "boolean": "isinstance({0}, bool)",
+    "null": "{0} is None",
+    "object": "isinstance({0}, dict)",
+    "array": "isinstance({0}, list)",
+}
+NUMERIC_COMPARISONS = {
+    "minimum": "<",
+    "maximum": ">",
+    "exclusiveMinimum": "<=",
+    "exclusiveMaximum": ">=",
+}
+
+_MISSING = object()
+_cache: dict[tuple[str, bool], tuple[JSONSchemaValidator, Callable]] = {}
+_cache_lock = threading.Lock()
+
+
+def _equal(one: Any, two: Any) -> bool:  # noqa: ANN401
+    """Compare JSON values, where booleans never equal numbers."""
+    if isinstance(one, bool) or isinstance(two, bool):
+        return type(one) is type(two) and one == two
+    if isinstance(one, list) and isinstance(two, list):
+        return len(one) == len(two) and all(map(_equal, one, two))
+    if isinstance(one, dict) and isinstance(two, dict):
+        return one.keys() == two.keys() and all(_equal(one[k], two[k]) for k in one)
+    return one == two
+
+
+def _in_enum(value: Any, options: list) -> bool:  # noqa: ANN401
+    return any(_equal(value, option) for option in options)
+
+
+def _has_reference(schema: Any) -> bool:  # noqa: ANN401
+    if isinstance(schema, dict):
+        return not REFERENCE_KEYWORDS.isdisjoint(schema) or any(
+            _has_reference(value) for value in schema.values()
+        )
+    if isinstance(schema, list):
+        return any(_has_reference(value) for value in schema)
+    return False
+
+
+class _Compiler:
+    """Generates the source of a validity check function for a schema."""
+
+    def __init__(self, validator_class: Any, *, validate_formats: bool) -> None:  # noqa: ANN401
+        self.validator_class = validator_class
+        self.format_checker = (
+            validator_class.FORMAT_CHECKER
+            if validate_formats
+            else jsonschema.FormatChecker(formats=())
+        )
+        self.keywords = set(validator_class.VALIDATORS)
+        self.compiled_keywords = COMPILED_KEYWORDS - (
+            {"format"} if validate_formats else set()
+        )
+        self.namespace: dict[str, Any] = {
+            "_MISSING": _MISSING,
+            "_Number": numbers.Number,
+            "_in_enum": _in_enum,
+        }
+        self.functions: list[str] = []
+
+    def compile(self, schema: dict) -> Callable[[Any], bool]:
+        """Return a function returning True for instances valid against a schema."""
+        name = self._function(schema)
+        exec("\n\n".join(self.functions), self.namespace)  # noqa: S102
+        return self.namespace[name]
+
+    def _constant(self, value: Any) -> str:  # noqa: ANN401
+        name = f"_c{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def _check(self, schema: Any, var: str) -> str:  # noqa: ANN401
+        """Return an expression that is True if `var` is valid against `schema`."""
+        if schema is True or schema == {}:
+            return "True"
+        if schema is False:
+            return "False"
+        keywords = self.keywords.intersection(schema)
+        if not keywords <= self.compiled_keywords or not self._compilable(schema):
+            generic = self.validator_class(schema, format_checker=self.format_checker)
+            return f"{self._constant(generic.is_valid)}({var})"
+        if keywords <= {"type", "format"}:
+            return self._type_check(schema.get("type"), var)
+        return f"{self._function(schema)}({var})"
+
+    def _compilable(self, schema: dict) -> bool:
+        types = schema.get("type", [])
+        types = types if isinstance(types, list) else [types]
+        return all(type_name in TYPE_EXPRESSIONS for type_name in types) and (
+            "items" not in schema or isinstance(schema["items"], (dict, bool))
+        )
+
+    def _type_check(self, types: str | list[str] | None, var: str) -> str:
+        if types is None:
+            return "True"
+        types = types if isinstance(types, list) else [types]
+        if not types:
+            return "False"
+        return "(" + " or ".join(TYPE_EXPRESSIONS[t].format(var) for t in types) + ")"
+
+    def _function(self, schema: dict) -> str:
+        index = len(self.functions)
+        name = f"_check{index}"
+        # Reserve the slot, nested functions are added while generating this one.
+        self.functions.append("")
+        lines = [f"def {name}(x):"]
+        if "type" in schema:
+            lines.append(f"    if not {self._type_check(schema['type'], 'x')}:")
+            lines.append("        return False")
+        lines.extend(self._object_lines(schema))
+        lines.extend(self._value_lines(schema))
+        lines.append("    return True")
+        self.functions[index] = "\n".join(lines)
+        return name
+
+    def _object_lines(self, schema: dict) -> list[str]:
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties", True)
+        if not properties and not schema.get("required") and additional is True:
+            return []
+        lines = ["    if isinstance(x, dict):"]
+        if schema.get("required"):
+            required = self._constant(frozenset(schema["required"]))
+            lines.append(f"        if not {required} <= x.keys():")
+            lines.append("            return False")
+        for property_name, subschema in properties.items():
+            check = self._check(subschema, "v")
+            if check == "True":
+                continue
+            lines.append(f"        v = x.get({property_name!r}, _MISSING)")
+            lines.append(f"        if v is not _MISSING and not {check}:")
+            lines.append("            return False")
+        names = self._constant(frozenset(properties))
+        if additional is False:
+            lines.append(f"        if not x.keys() <= {names}:")
+            lines.append("            return False")
+        elif additional is not True:
+            check = self._check(additional, "v")
+            lines.append("        for k, v in x.items():")
+            lines.append(f"            if k not in {names} and not {check}:")
+            lines.append("                return False")
+        return lines
+
+    def _value_lines(self, schema: dict) -> list[str]:
+        lines = []
+        if "items" in schema:
+            lines.append("    if isinstance(x, list):")
+            lines.append("        for v in x:")
+            lines.append(f"            if not {self._check(schema['items'], 'v')}:")
+            lines.append("                return False")
+        if "anyOf" in schema:
+            checks = " or ".join(self._check(branch, "x") for branch in schema["anyOf"])
+            lines.append(f"    if not ({checks}):")
+            lines.append("        return False")
+        if "enum" in schema:
+            lines.append(f"    if not _in_enum(x, {self._constant(schema['enum'])}):")
+            lines.append("        return False")
+
+        bounds = [
+            (operator, self._constant(schema[keyword]))
+            for keyword, operator in NUMERIC_COMPARISONS.items()
+            if keyword in schema
+        ]
+        if bounds:
+            lines.append(f"    if {TYPE_EXPRESSIONS['number'].format('x')}:")
+            for operator, bound in bounds:
+                lines.append(f"        if x {operator} {bound}:")
+                lines.append("            return False")
+        lengths = [
+            (operator, int(schema[keyword]))
+            for keyword, operator in (("minLength", "<"), ("maxLength", ">"))
+            if keyword in schema
+        ]
+        if lengths:
+            lines.append("    if isinstance(x, str):")
+            for operator, length in lengths:
+                lines.append(f"        if len(x) {operator} {length}:")
+                lines.append("            return False")
+        return lines
+
+
+def compile_schema(
+    schema: dict,
+    *,
+    validate_formats: bool = False,
+) -> tuple[JSONSchemaValidator, Callable[[Any], bool]]:
+    """Return the generic validator and the compiled check of a schema, cached.
+
+    Args:
+        schema: The stream's JSON schema.
+        validate_formats: Whether string formats, e.g. `date-time`, are validated.
+
+    Returns:
+        The SDK's generic validator, which also checks the schema itself, and a
+        function returning True for valid records. Schemas that cannot be
+        compiled get the generic validator's `is_valid`.
+
+    Raises:
+        InvalidJSONSchema: if the schema is invalid.
+
+    """
+    key = (schema_fingerprint(schema, None), validate_formats)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    generic = JSONSchemaValidator(schema, validate_formats=validate_formats)
+    validator_class = jsonschema.validators.validator_for(
+        schema,
+        DEFAULT_JSONSCHEMA_VALIDATOR,
+    )
+    if not issubclass(validator_class, COMPILED_DRAFTS) or _has_reference(schema):
+        check = generic.validator.is_valid
+    else:
+        compiler = _Compiler(validator_class, validate_formats=validate_formats)
+        check = compiler.compile(schema)
+    with _cache_lock:
+        return _cache.setdefault(key, (generic, check))
+
+
+class RecordValidator(BaseJSONSchemaValidator):
+    """Validates records with a compiled check, falling back for error details."""
+
+    def __init__(
+        self,
+        schema: dict,
+        *,
+        validate_formats: bool = False,
+        sample_interval: int = 1,
+    ) -> None:
+        """Compile, or get from the cache, the validator of a schema.
+
+        Args:
+            schema: The stream's JSON schema.
+            validate_formats: Whether string formats are validated.
+            sample_interval: Validate one in this many records, and every record
+                with a property missing from the schema. 1 validates all records.
+
+        """
+        super().__init__(schema)
+        self._generic, self._check = compile_schema(
+            schema,
+            validate_formats=validate_formats,
+        )
+        self.sample_interval = max(1, sample_interval)
+        self._property_names = frozenset(schema.get("properties", {}))
+        self._count = 0
+
+    def validate(self, record: dict) -> None:
+        """Validate a record.
+
+        Args:
+            record: The record.
+
+        Raises:
+            InvalidRecord: if the record is invalid, as raised by the SDK's
+                `JSONSchemaValidator`.
+
+        """
+        if self.sample_interval > 1:
+            self._count += 1
+            if (
+                self._count % self.sample_interval != 1
+                and record.keys() <= self._property_names
+            ):
+                return
+        if not self._check(record):
+            self._generic.validate(record)
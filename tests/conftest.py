@@ -2,11 +2,46 @@
 
 from pathlib import Path
 
+import pytest
 from singer_sdk.testing.templates import TargetFileTestTemplate
 
+from target_clickhouse.connectors import ClickhouseConnector
+
 pytest_plugins = ()
 
 
+@pytest.fixture()
+def connection_config():
+    """Settings of a local server over HTTP, for tests that do not connect."""
+    return {
+        "driver": "http",
+        "username": "default",
+        "password": "",
+        "host": "localhost",
+        "port": 8123,
+        "database": "default",
+        "secure": False,
+        "verify": True,
+    }
+
+
+@pytest.fixture()
+def make_connector(monkeypatch, connection_config):
+    """Return a factory of connectors that record their DDL instead of running it.
+
+    The factory takes settings overriding `connection_config`, and returns the
+    connector and the list of DDL statements it executed.
+    """
+
+    def make(**config):
+        connector = ClickhouseConnector(config={**connection_config, **config})
+        statements = []
+        monkeypatch.setattr(connector, "_execute_ddl", statements.append)
+        return connector, statements
+
+    return make
+
+
 class TargetClickhouseFileTestTemplate(TargetFileTestTemplate):
     """Base Target File Test Template.
 
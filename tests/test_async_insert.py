@@ -0,0 +1,65 @@
+import time
+
+import simplejson as json
+from benchmarks.fake_clickhouse import FakeClickhouse
+from benchmarks.generator import StreamSpec, generate_messages
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.target import TargetClickhouse
+
+
+def test_insert_settings_disabled_by_default(connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    assert connector.insert_settings == {}
+
+
+def test_insert_settings_async_insert(connection_config):
+    connector = ClickhouseConnector(
+        config={
+            **connection_config,
+            "async_insert": True,
+            "async_insert_busy_timeout_ms": 500,
+        },
+    )
+    assert connector.insert_settings == {
+        "async_insert": 1,
+        "wait_for_async_insert": 1,
+        "async_insert_busy_timeout_ms": 500,
+    }
+
+
+def test_max_batch_latency(connection_config):
+    target = TargetClickhouse(config=connection_config)
+    assert target._MAX_RECORD_AGE_IN_MINUTES == 5.0  # noqa: SLF001, PLR2004
+
+    target = TargetClickhouse(config={**connection_config, "max_batch_latency": 30})
+    assert target._MAX_RECORD_AGE_IN_MINUTES == 0.5  # noqa: SLF001, PLR2004
+
+
+def test_idle_batches_are_drained_on_a_timer(capsys, connection_config):
+    spec = StreamSpec(records=3, width=4)
+    messages = [json.dumps(message) for message in generate_messages(spec)]
+    with FakeClickhouse() as fake:
+        target = TargetClickhouse(
+            config={
+                **connection_config,
+                "host": "127.0.0.1",
+                "port": fake.port,
+                "max_batch_latency": 0.2,
+            },
+        )
+
+        def idle_tap():
+            yield from messages
+            # The tap is idle, with its records buffered. State is written once
+            # the drain finished, after the insert.
+            deadline = time.monotonic() + 5
+            out = ""
+            while '{"bookmarks"' not in out and time.monotonic() < deadline:
+                time.sleep(0.05)
+                out += capsys.readouterr().out
+            assert fake.stats.inserts == 1
+            assert '{"bookmarks"' in out
+
+        target.listen(idle_tap())
+    assert fake.stats.inserts == 1
@@ -0,0 +1,77 @@
+from benchmarks.generator import StreamSpec
+from benchmarks.run import run_once
+
+from target_clickhouse.batching import (
+    PARTS_PRESSURE_THRESHOLD,
+    BatchSizeController,
+)
+
+
+def test_batch_is_full_at_row_or_byte_limit():
+    controller = BatchSizeController(row_limit=100, max_bytes=1000)
+    assert not controller.is_full(99)
+    assert controller.is_full(100)
+
+    controller.observe_record(50)
+    assert controller.estimated_bytes(10) == 500  # noqa: PLR2004
+    assert not controller.is_full(19)
+    assert controller.is_full(20)
+
+    # Sent bytes correct the estimate from the JSON sizes.
+    controller.batch_inserted(rows=10, size=1000, insert_seconds=0.1)
+    assert controller.wire_ratio > 1
+    assert controller.is_full(16)
+    assert controller.row_limit == 100  # noqa: PLR2004
+
+
+def test_no_byte_limit():
+    controller = BatchSizeController(row_limit=100, max_bytes=0)
+    controller.observe_record(10**9)
+    assert not controller.is_full(99)
+    # The byte limit is opt-in.
+    assert BatchSizeController.from_config({}, row_limit=100).max_bytes == 0
+
+
+def test_adaptive_row_limit():
+    controller = BatchSizeController(
+        row_limit=10_000,
+        adaptive=True,
+        min_rows=1000,
+        max_rows=40_000,
+        target_seconds=4,
+    )
+    # Fast full batches grow, up to the maximum.
+    assert controller.batch_inserted(10_000, 0, 1) == 20_000  # noqa: PLR2004
+    assert controller.batch_inserted(20_000, 0, 1) == 40_000  # noqa: PLR2004
+    assert controller.batch_inserted(40_000, 0, 1) == 40_000  # noqa: PLR2004
+    # Partial batches do not grow.
+    assert controller.batch_inserted(100, 0, 0.1) == 40_000  # noqa: PLR2004
+    # Slow batches shrink by at most half.
+    assert controller.batch_inserted(40_000, 0, 5) == 32_000  # noqa: PLR2004
+    assert controller.batch_inserted(32_000, 0, 60) == 16_000  # noqa: PLR2004
+    # Too many parts grow batches, even if inserts are slow.
+    assert (
+        controller.batch_inserted(
+            16_000,
+            0,
+            60,
+            active_parts=PARTS_PRESSURE_THRESHOLD,
+        )
+        == 32_000  # noqa: PLR2004
+    )
+
+
+def test_fixed_row_limit_without_adaptive_batching():
+    controller = BatchSizeController(row_limit=10_000)
+    assert controller.batch_inserted(10_000, 0, 0.1, active_parts=1000) == 10_000  # noqa: PLR2004
+
+
+def test_wide_records_are_batched_by_size():
+    spec = StreamSpec(records=50, width=6)
+    result = run_once(spec, "http", 1000, {"batch_max_bytes": 1500})
+    assert result["records"] == 50  # noqa: PLR2004
+    assert result["insert_requests"] > 2  # noqa: PLR2004
+
+    result = run_once(spec, "http", 1000, {"adaptive_batching": True})
+    assert result["insert_requests"] == 1
+    assert result["unhandled_queries"] == []
@@ -0,0 +1,59 @@
+from benchmarks.fake_clickhouse import FakeClickhouse
+from benchmarks.generator import StreamSpec, get_record, get_schema
+from benchmarks.run import run_once
+
+
+def test_generated_records_match_schema():
+    spec = StreamSpec(width=10, depth=2, timestamp_ratio=0.3)
+    schema = get_schema(spec)
+    record = get_record(spec, 5)
+    assert set(record) == set(schema["properties"])
+    assert record["ts_2"] == "2024-01-01T00:00:37+00:00"
+    assert record["nested"]["child"] == {"code": "c6", "value": 0.75}
+
+
+def test_fake_clickhouse_tracks_tables():
+    with FakeClickhouse() as fake:
+        fake.handle(
+            "CREATE TABLE default.t (id Int64, ts Nullable(DATETIME) CODEC(ZSTD(1))) "
+            "ENGINE = MergeTree() ORDER BY (id)",
+            b"",
+        )
+        fake.handle("ALTER TABLE default.t ADD COLUMN IF NOT EXISTS name VARCHAR", b"")
+        assert fake.tables["t"] == [
+            ("id", "Int64"),
+            ("ts", "Nullable(DateTime)"),
+            ("name", "String"),
+        ]
+        assert fake.handle("EXISTS TABLE default.t", b"").endswith(b"1\n")
+        fake.handle("INSERT INTO t (id) FORMAT RowBinary", b"\x01")
+        assert fake.stats.inserts == 1
+        assert fake.stats.insert_bytes == 1
+        assert fake.stats.unhandled == []
+
+
+def test_run_once_against_fake_clickhouse():
+    spec = StreamSpec(records=50, width=6, depth=1)
+    for insert_format in ("values", "rowbinary"):
+        result = run_once(spec, "http", 20, {"insert_format": insert_format})
+        assert result["records"] == 50  # noqa: PLR2004
+        assert result["insert_requests"] == 3  # noqa: PLR2004
+        assert result["unhandled_queries"] == []
+        assert set(result["phases"]) == {
+            "read",
+            "validate",
+            "ddl",
+            "transform",
+            "insert",
+        }
+
+
+def test_streamed_inserts_send_the_same_rows():
+    spec = StreamSpec(records=50, width=6)
+    config = {"insert_format": "rowbinary"}
+    result = run_once(spec, "http", 50, config)
+    streamed = run_once(spec, "http", 50, {**config, "insert_chunk_bytes": 256})
+    assert streamed["insert_requests"] == result["insert_requests"] == 1
+    assert streamed["checksum"] == result["checksum"]
+    assert streamed["unhandled_queries"] == []
+
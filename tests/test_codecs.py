@@ -0,0 +1,105 @@
+import datetime
+import hashlib
+import itertools
+from unittest.mock import MagicMock
+
+import sqlalchemy
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+from target_clickhouse.codecs import CODEC_MIN_SAMPLE, advise_codec, advise_codecs
+from target_clickhouse.connectors import ClickhouseConnector
+
+
+def test_advise_codec():
+    ids = list(range(10**6, 10**6 + CODEC_MIN_SAMPLE))
+    assert advise_codec(ids, "integer") == "DoubleDelta, ZSTD(1)"
+
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    # Irregular, increasing timestamps.
+    offsets = itertools.accumulate((i * 37) % 60 + 1 for i in range(CODEC_MIN_SAMPLE))
+    timestamps = [start + datetime.timedelta(seconds=offset) for offset in offsets]
+    assert advise_codec(timestamps, "integer") in (
+        "Delta, ZSTD(1)",
+        "DoubleDelta, ZSTD(1)",
+    )
+
+    random_values = [
+        int.from_bytes(hashlib.sha256(str(i).encode()).digest()[:5], "little")
+        for i in range(CODEC_MIN_SAMPLE)
+    ]
+    assert advise_codec(random_values, "integer") is None
+    assert advise_codec(ids[:10], "integer") is None
+    assert advise_codec(["a"] * CODEC_MIN_SAMPLE, "integer") is None
+
+
+def test_advise_codecs():
+    records = [
+        {"id": i, "name": f"user {i}", "score": None}
+        for i in range(CODEC_MIN_SAMPLE)
+    ]
+    column_types = {
+        "id": clickhouse_sqlalchemy_types.Int64(),
+        "name": clickhouse_sqlalchemy_types.String(),
+        "score": clickhouse_sqlalchemy_types.Nullable(
+            clickhouse_sqlalchemy_types.Float64(),
+        ),
+    }
+    assert advise_codecs(records, column_types) == {"id": "DoubleDelta, ZSTD(1)"}
+    assert advise_codecs(records, column_types, skip=["id"]) == {}
+
+
+def test_table_layout_codecs(monkeypatch, connection_config):
+    connector = ClickhouseConnector(
+        config={
+            **connection_config,
+            "table_layouts": {"events": {"codecs": {"created_at": "Delta, LZ4"}}},
+        },
+    )
+    created = []
+    monkeypatch.setattr(
+        sqlalchemy.MetaData,
+        "create_all",
+        lambda metadata, _: created.extend(metadata.tables.values()),
+    )
+    connector.create_empty_table(
+        "events",
+        {
+            "properties": {
+                "id": {"type": "integer"},
+                "created_at": {"type": "string", "format": "date-time"},
+            },
+        },
+        primary_keys=["id"],
+    )
+    ddl = str(
+        sqlalchemy.schema.CreateTable(created[0]).compile(
+            dialect=connector._dialect,  # noqa: SLF001
+        ),
+    )
+    assert "created_at Nullable(DATETIME) CODEC(Delta, LZ4)" in ddl
+    assert "id Int64," in ddl
+
+
+def test_sample_column_codecs(monkeypatch, connection_config):
+    connector = ClickhouseConnector(
+        config={**connection_config, "codec_advisor": True},
+    )
+    columns = {
+        "id": sqlalchemy.Column("id", clickhouse_sqlalchemy_types.Int64()),
+        "name": sqlalchemy.Column("name", clickhouse_sqlalchemy_types.String()),
+    }
+    monkeypatch.setattr(connector, "get_table_columns", lambda _: columns)
+    monkeypatch.setattr(connector, "_connect", MagicMock())
+    ddl = []
+    get_table_alter_ddl = connector.get_table_alter_ddl
+    monkeypatch.setattr(
+        connector,
+        "get_table_alter_ddl",
+        lambda *args: ddl.append(str(get_table_alter_ddl(*args))),
+    )
+    connector.sampled_tables.add("t")
+    connector.sample_column_types(
+        "t",
+        [{"id": i, "name": f"user {i}"} for i in range(CODEC_MIN_SAMPLE)],
+    )
+    assert ddl == ["ALTER TABLE t MODIFY COLUMN id Int64 CODEC(DoubleDelta, ZSTD(1))"]
@@ -0,0 +1,61 @@
+import pytest
+import sqlalchemy
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+from target_clickhouse.columnar import is_columnar_type, pivot_records
+from target_clickhouse.sinks import ClickhouseSink
+from target_clickhouse.target import TargetClickhouse
+
+
+@pytest.fixture()
+def connection_config(connection_config):
+    return {**connection_config, "driver": "native", "port": 9000}
+
+
+def test_pivot_records_fills_missing_values():
+    records = [
+        {"id": 1, "name": "a"},
+        {"id": 2},
+        {"name": "c", "extra": True},
+    ]
+    columns = pivot_records(records, ["id", "name"])
+    assert columns == [[1, 2, None], ["a", None, "c"]]
+
+
+def test_columnar_types():
+    assert is_columnar_type(clickhouse_sqlalchemy_types.Int64())
+    assert is_columnar_type(sqlalchemy.types.VARCHAR())
+    assert is_columnar_type(
+        clickhouse_sqlalchemy_types.Nullable(clickhouse_sqlalchemy_types.Date32),
+    )
+    assert is_columnar_type(
+        clickhouse_sqlalchemy_types.Nullable(sqlalchemy.types.DATETIME()),
+    )
+    assert not is_columnar_type(
+        clickhouse_sqlalchemy_types.Nullable(sqlalchemy.types.TIME()),
+    )
+    assert not is_columnar_type(sqlalchemy.types.DECIMAL())
+
+
+def test_columnar_insert_uses_table_types(monkeypatch, connection_config):
+    target = TargetClickhouse(config=connection_config)
+    connector = target.target_connector
+    schema = {"properties": {"id": {"type": "integer"}, "amount": {"type": "number"}}}
+
+    def sink_for(amount_type):
+        columns = {
+            "id": sqlalchemy.Column("id", clickhouse_sqlalchemy_types.Int64),
+            "amount": sqlalchemy.Column("amount", amount_type),
+        }
+        monkeypatch.setattr(connector, "get_table_columns", lambda *_: columns)
+        return ClickhouseSink(
+            target=target,
+            stream_name="events",
+            schema=schema,
+            key_properties=["id"],
+            connector=connector,
+        )
+
+    assert sink_for(clickhouse_sqlalchemy_types.Float64).use_columnar_insert
+    # The stream schema maps `amount` to FLOAT, but the table was altered.
+    assert not sink_for(clickhouse_sqlalchemy_types.Decimal(18, 2)).use_columnar_insert
@@ -0,0 +1,79 @@
+import gzip
+import importlib.util
+
+import pytest
+import requests
+from benchmarks.generator import StreamSpec
+from benchmarks.run import run_once
+
+from target_clickhouse.compression import compress, compress_chunks
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.metrics import RequestBytes
+from target_clickhouse.pool import CompressingAdapter
+
+
+@pytest.fixture()
+def connection_config(connection_config):
+    return {**connection_config, "driver": "native"}
+
+
+def test_gzip_roundtrip():
+    body = b'{"id": 1, "name": "x"}\n' * 1000
+    assert gzip.decompress(compress(body, "gzip")) == body
+
+    chunks = [body[i : i + 1000] for i in range(0, len(body), 1000)]
+    assert gzip.decompress(b"".join(compress_chunks(iter(chunks), "gzip"))) == body
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("zstandard") is not None,
+    reason="zstandard is installed",
+)
+def test_zstd_requires_zstandard():
+    with pytest.raises(ImportError, match="zstandard"):
+        compress(b"", "zstd")
+
+
+def test_native_compression_url(connection_config):
+    connector = ClickhouseConnector(config={**connection_config, "compression": "lz4"})
+    url = connector.get_sqlalchemy_url(connector.config)
+    assert url.endswith("&compression=lz4")
+
+    with pytest.raises(ValueError, match="does not support"):
+        connector.get_sqlalchemy_url({**connection_config, "compression": "gzip"})
+
+
+def test_http_bodies_are_compressed():
+    spec = StreamSpec(records=200, width=10)
+    for insert_format in ("values", "rowbinary"):
+        plain = run_once(spec, "http", 100, {"insert_format": insert_format})
+        compressed = run_once(
+            spec,
+            "http",
+            100,
+            {
+                "insert_format": insert_format,
+                "compression": "gzip",
+                "insert_chunk_bytes": 1024,
+            },
+        )
+        assert compressed["checksum"] == plain["checksum"]
+        assert compressed["wire_mb"] < plain["wire_mb"]
+        assert compressed["unhandled_queries"] == []
+
+
+def test_bodies_are_counted_before_compression():
+    request_bytes = RequestBytes()
+    adapter = CompressingAdapter("gzip", request_bytes=request_bytes)
+    body = b'{"id": 1, "name": "x"}\n' * 1000
+
+    request = requests.Request("POST", "http://localhost", data=body).prepare()
+    adapter.prepare_body(request)
+    assert request_bytes.current() == len(body)
+    assert request_bytes.current_wire() == len(request.body) < len(body)
+
+    request = requests.Request("POST", "http://localhost", data=iter([body])).prepare()
+    adapter.prepare_body(request)
+    assert gzip.decompress(b"".join(request.body)) == body
+    assert request_bytes.current() == 2 * len(body)
+    assert request_bytes.current_wire() < len(body)
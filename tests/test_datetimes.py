@@ -0,0 +1,77 @@
+import datetime
+import logging
+
+import pytest
+from singer_sdk.helpers._typing import DatetimeErrorTreatmentEnum
+
+from target_clickhouse.datetimes import parse_datelike_column
+
+pytest.importorskip("numpy")
+
+logger = logging.getLogger(__name__)
+UTC = datetime.timezone.utc
+
+
+def test_parse_date_column_trims_time_and_nulls_invalid():
+    records = [
+        {"day": "2024-03-15"},
+        {"day": "2024-03-16T10:00:00"},
+        {"day": "10000-01-01"},
+        {"day": None},
+        {},
+    ]
+    parse_datelike_column(
+        records,
+        "day",
+        "date",
+        DatetimeErrorTreatmentEnum.NULL,
+        logger,
+    )
+    assert records == [
+        {"day": datetime.date(2024, 3, 15)},
+        {"day": datetime.date(2024, 3, 16)},
+        {"day": None},
+        {"day": None},
+        {},
+    ]
+
+
+def test_parse_datetime_column_keeps_timezones():
+    records = [
+        {"ts": "2024-03-15T10:00:00"},
+        {"ts": "2024-03-15T10:00:00.5Z"},
+        {"ts": "2024-03-15T10:00:00+02:00"},
+        {"ts": ""},
+    ]
+    parse_datelike_column(
+        records,
+        "ts",
+        "date-time",
+        DatetimeErrorTreatmentEnum.NULL,
+        logger,
+    )
+    assert records[0]["ts"] == datetime.datetime(2024, 3, 15, 10)  # noqa: DTZ001
+    assert records[1]["ts"] == datetime.datetime(2024, 3, 15, 10, 0, 0, 500000, UTC)
+    assert records[2]["ts"] == datetime.datetime(
+        2024,
+        3,
+        15,
+        10,
+        tzinfo=datetime.timezone(datetime.timedelta(hours=2)),
+    )
+    assert records[3]["ts"] is None
+
+
+def test_parse_datetime_column_falls_back_on_unparseable_values():
+    records = [{"ts": "2024-03-15T10:00:00"}, {"ts": "not a datetime"}]
+    parse_datelike_column(
+        records,
+        "ts",
+        "date-time",
+        DatetimeErrorTreatmentEnum.NULL,
+        logger,
+    )
+    assert records == [
+        {"ts": datetime.datetime(2024, 3, 15, 10)},  # noqa: DTZ001
+        {"ts": None},
+    ]
@@ -0,0 +1,58 @@
+import sys
+
+from benchmarks.generator import StreamSpec
+from benchmarks.run import run_once
+
+from target_clickhouse.memory import MemoryAccountant, record_memory_size
+from target_clickhouse.metrics import MetricsRegistry
+
+
+def test_record_memory_size_includes_nested_values():
+    record = {"id": 1, "tags": ["a", "b"], "nested": {"code": "x"}}
+    assert record_memory_size(record) > sys.getsizeof(record) + sys.getsizeof(
+        record["tags"],
+    )
+    assert record_memory_size(1) == sys.getsizeof(1)
+
+
+def test_accountant_tracks_largest_sinks():
+    memory = MemoryAccountant(budget=100)
+    memory.set("small", 10)
+    memory.set("large", 60)
+    assert not memory.over_budget
+    memory.set("large", 95)
+    assert memory.over_budget
+    assert memory.held_bytes == 105  # noqa: PLR2004
+    assert memory.largest_first() == ["large", "small"]
+
+    memory.release("large")
+    assert memory.held_bytes == 10  # noqa: PLR2004
+    assert memory.peak_bytes == 105  # noqa: PLR2004
+    assert memory.largest_first() == ["small"]
+
+
+def test_no_budget():
+    memory = MemoryAccountant()
+    memory.set("sink", 10**12)
+    assert not memory.enabled
+    assert not memory.over_budget
+
+
+def test_buffered_bytes_metric():
+    memory = MemoryAccountant(budget=100)
+    memory.set("sink", 42)
+    text = MetricsRegistry(memory=memory).to_openmetrics()
+    assert "target_clickhouse_buffered_bytes 42" in text
+    assert "target_clickhouse_memory_budget_drains_total 0" in text
+
+    assert "buffered_bytes" not in MetricsRegistry(
+        memory=MemoryAccountant(),
+    ).to_openmetrics()
+
+
+def test_batches_are_drained_within_the_memory_budget():
+    spec = StreamSpec(records=50, width=6)
+    result = run_once(spec, "http", 1000, {"memory_budget": 10_000})
+    assert result["records"] == 50  # noqa: PLR2004
+    assert result["insert_requests"] > 2  # noqa: PLR2004
+    assert result["unhandled_queries"] == []
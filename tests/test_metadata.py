@@ -0,0 +1,68 @@
+import sqlalchemy
+from singer_sdk.connectors import SQLConnector
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.metadata import MetadataCache, schema_fingerprint
+
+
+def test_schema_fingerprint_ignores_key_order():
+    schema = {"properties": {"id": {"type": "integer"}, "name": {"type": "string"}}}
+    reordered = {"properties": {"name": {"type": "string"}, "id": {"type": "integer"}}}
+    assert schema_fingerprint(schema, ["id"]) == schema_fingerprint(reordered, ["id"])
+    assert schema_fingerprint(schema, ["id"]) != schema_fingerprint(schema, [])
+
+
+def test_metadata_cache_returns_new_columns():
+    cache = MetadataCache()
+    assert cache.get_columns("t") is None
+    cache.set_columns("t", {"id": sqlalchemy.Column("id", sqlalchemy.Integer())})
+    assert cache.get_table_exists("t")
+
+    first = cache.get_columns("t")
+    second = cache.get_columns("t")
+    assert first["id"] is not second["id"]
+    assert isinstance(first["id"].type, sqlalchemy.Integer)
+
+    cache.mark_conformed("t", "abc")
+    assert cache.is_conformed("t", "abc")
+    cache.invalidate("t")
+    assert cache.get_columns("t") is None
+    assert cache.get_table_exists("t") is None
+    assert not cache.is_conformed("t", "abc")
+
+
+def test_table_exists_is_cached(monkeypatch, connection_config):
+    calls = []
+
+    def table_exists(_, full_table_name):
+        calls.append(full_table_name)
+        return True
+
+    monkeypatch.setattr(SQLConnector, "table_exists", table_exists)
+    connector = ClickhouseConnector(config=connection_config)
+    assert connector.table_exists("t")
+    assert connector.table_exists("t")
+    assert calls == ["t"]
+
+    connector.metadata_cache.invalidate("t")
+    assert connector.table_exists("t")
+    assert calls == ["t", "t"]
+
+
+def test_table_alter_ddl_coalesces_columns(connection_config):
+    connector = ClickhouseConnector(
+        config={**connection_config, "cluster_name": "main"},
+    )
+    ddl = connector.get_table_alter_ddl(
+        "db.t",
+        add_columns=[
+            sqlalchemy.Column("a", sqlalchemy.types.VARCHAR()),
+            sqlalchemy.Column("b c", sqlalchemy.types.INTEGER()),
+        ],
+        modify_columns=[sqlalchemy.Column("d", sqlalchemy.types.FLOAT())],
+    )
+    assert str(ddl.compile(dialect=connector._dialect)) == (  # noqa: SLF001
+        "ALTER TABLE db.t ON CLUSTER main "
+        'ADD COLUMN IF NOT EXISTS a VARCHAR, ADD COLUMN IF NOT EXISTS "b c" INTEGER, '
+        "MODIFY COLUMN d FLOAT"
+    )
@@ -0,0 +1,93 @@
+import logging
+import socket
+import threading
+import urllib.request
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.metrics import Histogram, MetricsRegistry
+from target_clickhouse.pool import PoolMetrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.cumulative_counts() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.count == 4  # noqa: PLR2004
+
+
+def test_batch_inserted_logs_metric_lines(caplog):
+    metrics = MetricsRegistry().for_table("db.events", stream="events")
+    metrics.add_time("validate", 0.5)
+    metrics.observe_insert(0.2)
+    with caplog.at_level(logging.INFO, logger="singer_sdk.metrics"):
+        metrics.batch_inserted(records=10, size=100, insert_seconds=0.2)
+        metrics.batch_inserted(records=5, size=50, insert_seconds=0)
+    lines = [record.getMessage() for record in caplog.records]
+    assert any('"metric": "batch_bytes", "value": 100' in line for line in lines)
+    assert any('"stage": "validate"' in line for line in lines)
+    # Stage times are logged as the difference since the previous batch.
+    assert sum('"stage": "validate"' in line for line in lines) == 1
+    assert (metrics.records, metrics.bytes, metrics.batches) == (15, 150, 2)
+
+
+def test_openmetrics_export(tmp_path):
+    registry = MetricsRegistry(pool_metrics=PoolMetrics(checkouts=3))
+    metrics = registry.for_table('db."events"', stream="events")
+    metrics.observe_insert(0.03)
+    metrics.batch_inserted(records=10, size=100, insert_seconds=0.03)
+
+    text = registry.to_openmetrics()
+    labels = 'table="db.\\"events\\"",stream="events"'
+    assert f"target_clickhouse_records_total{{{labels}}} 10" in text
+    assert (
+        "target_clickhouse_insert_duration_seconds_bucket"
+        '{table="db.\\"events\\"",le="0.025",stream="events"} 0'
+    ) in text
+    assert "target_clickhouse_pool_checkouts_total 3" in text
+    assert text.endswith("# EOF\n")
+
+    path = tmp_path / "target.prom"
+    registry.write_textfile(str(path))
+    assert path.read_text() == text
+    assert [p.name for p in tmp_path.iterdir()] == ["target.prom"]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_scrape_endpoint():
+    port = _free_port()
+    registry = MetricsRegistry(port=port)
+    try:
+        registry.for_table("db.events")
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:  # noqa: S310
+            body = response.read().decode()
+        assert 'target_clickhouse_batches_total{table="db.events"} 0' in body
+    finally:
+        registry.close()
+
+
+def test_request_bytes_are_counted_per_thread(connection_config):
+    request_bytes = ClickhouseConnector(config=connection_config).metrics.request_bytes
+    request_bytes.add(3)
+    assert list(request_bytes.count([b"de"], wire=False)) == [b"de"]
+    assert request_bytes.current() == 5  # noqa: PLR2004
+    assert request_bytes.current_wire() == 3  # noqa: PLR2004
+
+    counts = []
+    thread = threading.Thread(target=lambda: counts.append(request_bytes.current()))
+    thread.start()
+    thread.join()
+    assert counts == [0]
+
+
+def test_scrape_endpoint_is_local_by_default():
+    registry = MetricsRegistry(port=_free_port())
+    try:
+        assert registry._server.server_address[0] == "127.0.0.1"  # noqa: SLF001
+    finally:
+        registry.close()
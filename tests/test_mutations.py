@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import simplejson as json
+from benchmarks.fake_clickhouse import FakeClickhouse
+from benchmarks.generator import StreamSpec, generate_messages
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.target import TargetClickhouse
+
+
+def test_version_cleanups_are_coalesced(make_connector):
+    connector, statements = make_connector()
+    connector.request_version_cleanup("t", "_sdc_table_version", 3)
+    connector.request_version_cleanup("t", "_sdc_table_version", 5)
+    connector.request_version_cleanup("t", "_sdc_table_version", 4)
+
+    connector.flush_version_cleanup("t")
+    connector.flush_version_cleanup("t")
+    assert statements == ["ALTER TABLE t DELETE WHERE _sdc_table_version < 5"]
+
+
+def test_lightweight_delete(make_connector):
+    connector, statements = make_connector(delete_method="lightweight")
+    connector.request_version_cleanup("t", "_sdc_table_version", 2)
+
+    connector.flush_version_cleanup("t")
+    assert statements == ["DELETE FROM t WHERE _sdc_table_version < 2"]
+
+
+def test_wait_for_mutations(monkeypatch, make_connector):
+    connector, _ = make_connector(mutation_wait_timeout=5)
+    mutation = SimpleNamespace(
+        mutation_id="0000000001",
+        command="DELETE WHERE _sdc_table_version < 2",
+        latest_fail_reason="",
+    )
+    polls = [[mutation], [mutation], []]
+    monkeypatch.setattr(connector, "get_pending_mutations", lambda _: polls.pop(0))
+    monkeypatch.setattr("target_clickhouse.connectors.MUTATION_POLL_INTERVAL", 0)
+
+    assert connector.wait_for_mutations("t")
+    assert polls == []
+
+
+def test_wait_for_mutations_disabled(monkeypatch, make_connector):
+    connector, _ = make_connector()
+    monkeypatch.setattr(connector, "get_pending_mutations", None)
+    assert not connector.wait_for_mutations("t")
+
+
+def test_cleanup_without_pending_batch_is_not_deferred(monkeypatch, connection_config):
+    statements = []
+    execute_ddl = ClickhouseConnector._execute_ddl  # noqa: SLF001
+
+    def record_ddl(connector, statement):
+        statements.append(statement)
+        execute_ddl(connector, statement)
+
+    monkeypatch.setattr(ClickhouseConnector, "_execute_ddl", record_ddl)
+    schema, *_, state = generate_messages(StreamSpec(records=0, width=2))
+    activate = {"type": "ACTIVATE_VERSION", "stream": schema["stream"], "version": 2}
+    with FakeClickhouse() as fake:
+        target = TargetClickhouse(
+            config={
+                **connection_config,
+                "host": "127.0.0.1",
+                "port": fake.port,
+                "hard_delete": True,
+            },
+        )
+
+        def tap():
+            yield from (json.dumps(schema), json.dumps(activate))
+            # Deleted before the next message, which may be STATE.
+            assert statements == [
+                "ALTER TABLE benchmark DELETE WHERE _sdc_table_version < 2",
+            ]
+            yield json.dumps(state)
+
+        target.listen(tap())
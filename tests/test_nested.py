@@ -0,0 +1,172 @@
+import logging
+import zlib
+
+import simplejson as json
+from benchmarks.fake_clickhouse import FakeClickhouse
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+from singer_sdk.helpers._typing import DatetimeErrorTreatmentEnum
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.nested import get_native_converter, get_nested_sql_type
+from target_clickhouse.rowbinary import RowBinaryEncoder
+from target_clickhouse.target import TargetClickhouse
+from target_clickhouse.transform_plan import TransformPlan
+
+logger = logging.getLogger(__name__)
+
+schema = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "tags": {"type": ["array", "null"], "items": {"type": "string"}},
+        "point": {
+            "type": ["object", "null"],
+            "properties": {
+                "x": {"type": "number"},
+                "label": {"type": ["string", "null"]},
+            },
+        },
+        "attributes": {"type": ["object", "null"]},
+        "events": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"at": {"type": "string", "format": "date-time"}},
+            },
+        },
+    },
+}
+
+
+def test_nested_sql_types():
+    properties = schema["properties"]
+    tags_type = get_nested_sql_type(properties["tags"])
+    assert isinstance(tags_type, clickhouse_sqlalchemy_types.Array)
+    assert isinstance(tags_type.item_type_impl, clickhouse_sqlalchemy_types.String)
+
+    point_type = get_nested_sql_type(properties["point"])
+    assert isinstance(point_type, clickhouse_sqlalchemy_types.Tuple)
+    assert [type(t) for t in point_type.nested_types] == [
+        clickhouse_sqlalchemy_types.Nullable,
+        clickhouse_sqlalchemy_types.Nullable,
+    ]
+
+    assert isinstance(
+        get_nested_sql_type(properties["attributes"]),
+        clickhouse_sqlalchemy_types.Map,
+    )
+    # Datelike values inside arrays are not typed natively.
+    assert get_nested_sql_type(properties["events"]) is None
+    assert get_nested_sql_type(properties["id"]) is None
+
+
+def test_to_sql_type_uses_nested_types_only_when_enabled(connection_config):
+    tags = schema["properties"]["tags"]
+    connector = ClickhouseConnector(config=connection_config)
+    assert not isinstance(
+        connector.to_sql_type(tags),
+        clickhouse_sqlalchemy_types.Array,
+    )
+
+    connector = ClickhouseConnector(
+        config={**connection_config, "nested_types": True},
+    )
+    assert isinstance(connector.to_sql_type(tags), clickhouse_sqlalchemy_types.Array)
+
+
+def test_converters():
+    properties = schema["properties"]
+    assert get_native_converter(properties["tags"])(None) == []
+    assert get_native_converter(properties["point"])({"label": "a"}) == (None, "a")
+    assert get_native_converter(properties["attributes"])(
+        {"a": 1, "b": "x", "c": {"d": None}},
+    ) == {"a": "1", "b": "x", "c": '{"d": null}'}
+    assert get_native_converter(properties["events"]) is None
+
+
+def test_plan_converts_native_nested_values():
+    plan = TransformPlan.from_schema(schema, native_nested=True)
+    assert plan.json_keys == ["events"]
+    assert set(plan.converters) == {"tags", "point", "attributes"}
+
+    record = {"id": 1, "point": {"x": 1.5}, "events": [{"at": "2024"}]}
+    plan.finalize(record, DatetimeErrorTreatmentEnum.NULL, logger)
+    assert record == {
+        "id": 1,
+        "tags": [],
+        "point": (1.5, None),
+        "attributes": {},
+        "events": '[{"at": "2024"}]',
+    }
+
+
+def test_plan_encodes_json_without_native_nested():
+    plan = TransformPlan.from_schema(schema)
+    record = {"id": 1, "tags": ["a"]}
+    plan.encode_json(record)
+    assert record == {"id": 1, "tags": '["a"]'}
+
+
+def test_encode_map_and_tuple():
+    encoder = RowBinaryEncoder(
+        [
+            "Map(String, String)",
+            "Tuple(Nullable(Float64), Nullable(String))",
+            "Tuple(a Int8, b String)",
+        ],
+    )
+    body = encoder.encode([[{"k": "v"}, (None, "a"), (1, "b")]])
+    assert body == (
+        b"\x01\x01k\x01v"
+        b"\x01\x00\x01a"
+        b"\x01\x01b"
+    )
+
+
+def test_plan_converts_only_native_columns():
+    plan = TransformPlan.from_schema(
+        schema,
+        native_nested=True,
+        native_columns={"point"},
+    )
+    assert set(plan.converters) == {"point"}
+    assert plan.json_keys == ["tags", "attributes", "events"]
+
+
+def test_existing_string_columns_keep_json_values(connection_config):
+    stream_schema = {
+        "type": "object",
+        "properties": {"id": {"type": "integer"}, "tags": schema["properties"]["tags"]},
+    }
+    messages = [
+        {
+            "type": "SCHEMA",
+            "stream": "t",
+            "schema": stream_schema,
+            "key_properties": ["id"],
+        },
+        {"type": "RECORD", "stream": "t", "record": {"id": 1, "tags": ["a", "b"]}},
+    ]
+    checksums = []
+    for nested_types in (False, True):
+        with FakeClickhouse() as fake:
+            fake.handle(
+                "CREATE TABLE default.t (id Int64, tags Nullable(String)) "
+                "ENGINE = MergeTree() ORDER BY (id)",
+                b"",
+            )
+            target = TargetClickhouse(
+                config={
+                    **connection_config,
+                    "host": "127.0.0.1",
+                    "port": fake.port,
+                    "insert_format": "rowbinary",
+                    "nested_types": nested_types,
+                },
+            )
+            target.listen(json.dumps(message) for message in messages)
+            assert fake.tables["t"] == [("id", "Int64"), ("tags", "Nullable(String)")]
+            checksums.append(fake.stats.checksum)
+
+    body = RowBinaryEncoder(["Int64", "Nullable(String)"]).encode([[1, '["a", "b"]']])
+    assert checksums == [zlib.crc32(body)] * 2
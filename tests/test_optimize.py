@@ -0,0 +1,72 @@
+import pytest
+
+from target_clickhouse.connectors import ClickhouseConnector
+
+
+@pytest.fixture()
+def connection_config(connection_config):
+    return {**connection_config, "optimize_after": True}
+
+
+def test_optimize_partition_ddl(make_connector):
+    connector, statements = make_connector()
+
+    connector.optimize_partition("t", "202401")
+    connector.optimize_partition("t", "202402", final=True)
+    assert statements == [
+        "OPTIMIZE TABLE t PARTITION ID '202401'",
+        "OPTIMIZE TABLE t PARTITION ID '202402' FINAL",
+    ]
+
+
+def test_optimize_only_inserted_partitions(monkeypatch, connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    # Active parts and highest block number, by partition.
+    stats = {"202401": (3, 10), "202402": (4, 20), "202403": (1, 30)}
+    monkeypatch.setattr(connector, "get_partition_stats", lambda _: dict(stats))
+    optimized = []
+    monkeypatch.setattr(
+        connector,
+        "optimize_partition",
+        lambda _, partition_id, final: optimized.append((partition_id, final)),
+    )
+    scheduler = connector.optimize_scheduler
+    scheduler.track("t")
+
+    # New parts in two partitions, one of them below `optimize_min_parts`.
+    stats.update({"202402": (5, 21), "202403": (1, 31), "202404": (2, 40)})
+    scheduler.schedule("t")
+    scheduler.wait()
+    assert optimized == [("202402", False), ("202404", False)]
+
+    # Nothing was inserted since the last run.
+    assert scheduler.optimize("t") == []
+
+
+def test_optimize_disabled(monkeypatch, connection_config):
+    connector = ClickhouseConnector(
+        config={**connection_config, "optimize_after": False},
+    )
+    monkeypatch.setattr(connector, "get_partition_stats", lambda _: {})
+    scheduler = connector.optimize_scheduler
+    scheduler.track("t")
+    scheduler.schedule("t")
+    scheduler.wait()
+    assert scheduler._executor is None  # noqa: SLF001
+
+
+def test_optimize_interval(monkeypatch, connection_config):
+    connector = ClickhouseConnector(
+        config={**connection_config, "optimize_interval": 60},
+    )
+    monkeypatch.setattr(connector, "get_partition_stats", lambda _: {})
+    scheduler = connector.optimize_scheduler
+    scheduled = []
+    monkeypatch.setattr(scheduler, "schedule", scheduled.append)
+    scheduler.track("t")
+
+    scheduler.batch_inserted("t")
+    assert scheduled == []
+    scheduler._last_scheduled["t"] -= 60  # noqa: SLF001
+    scheduler.batch_inserted("t")
+    assert scheduled == ["t"]
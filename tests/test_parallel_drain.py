@@ -0,0 +1,17 @@
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.target import TargetClickhouse
+
+
+def test_max_parallelism(connection_config):
+    assert TargetClickhouse(config=connection_config).max_parallelism == 8  # noqa: PLR2004
+
+    target = TargetClickhouse(config={**connection_config, "max_parallelism": 1})
+    assert target.max_parallelism == 1
+
+
+def test_pool_holds_a_connection_per_drain_worker(connection_config):
+    connector = ClickhouseConnector(config={**connection_config, "max_parallelism": 1})
+    assert connector._engine.pool.size() == 5  # noqa: SLF001, PLR2004
+
+    connector = ClickhouseConnector(config={**connection_config, "max_parallelism": 32})
+    assert connector._engine.pool.size() == 32  # noqa: SLF001, PLR2004
@@ -0,0 +1,50 @@
+import socket
+
+import sqlalchemy
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.pool import PoolMetrics, create_http_session
+
+
+def test_http_session_keeps_sockets_alive():
+    session = create_http_session(pool_maxsize=12)
+    adapter = session.get_adapter("https://localhost:8443")
+    assert adapter._pool_maxsize == 12  # noqa: SLF001, PLR2004
+    socket_options = adapter.poolmanager.connection_pool_kw["socket_options"]
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in socket_options
+    assert session.get_adapter("http://localhost:8123") is adapter
+
+
+def test_pool_metrics():
+    metrics = PoolMetrics()
+    engine = sqlalchemy.create_engine("sqlite://")
+    metrics.attach(engine)
+
+    for _ in range(3):
+        with engine.connect() as conn:
+            conn.execute(sqlalchemy.text("SELECT 1"))
+    metrics.record_checkout_wait(0.5)
+    metrics.record_checkout_wait(0.25)
+
+    assert metrics.as_dict() == {
+        "checkouts": 3,
+        "connects": 1,
+        "invalidations": 0,
+        "checkout_wait_time": 0.75,
+        "max_checkout_wait_time": 0.5,
+    }
+
+
+def test_pool_settings(connection_config):
+    connector = ClickhouseConnector(
+        config={
+            **connection_config,
+            "pool_size": 3,
+            "pool_max_overflow": 2,
+            "pool_recycle": 600,
+        },
+    )
+    pool = connector._engine.pool  # noqa: SLF001
+    assert pool.size() == 3  # noqa: PLR2004
+    assert pool._max_overflow == 2  # noqa: SLF001, PLR2004
+    assert pool._recycle == 600  # noqa: SLF001, PLR2004
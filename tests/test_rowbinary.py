@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+
+from target_clickhouse.rowbinary import (
+    RowBinaryEncoder,
+    UnsupportedTypeError,
+    split_type,
+)
+
+
+def test_split_type():
+    assert split_type("Int64") == ("Int64", [])
+    assert split_type("Nullable(DateTime('UTC'))") == ("Nullable", ["DateTime('UTC')"])
+    assert split_type("Decimal(18, 2)") == ("Decimal", ["18", "2"])
+
+
+def test_encode_scalar_types():
+    encoder = RowBinaryEncoder(["Int64", "Float64", "String", "Nullable(Date32)"])
+    body = encoder.encode(
+        [
+            [1, 1.5, "ab", datetime.date(1970, 1, 2)],
+            [-1, 0, "", None],
+        ],
+    )
+    assert body == (
+        b"\x01\x00\x00\x00\x00\x00\x00\x00"
+        b"\x00\x00\x00\x00\x00\x00\xf8\x3f"
+        b"\x02ab"
+        b"\x00\x01\x00\x00\x00"
+        b"\xff\xff\xff\xff\xff\xff\xff\xff"
+        b"\x00\x00\x00\x00\x00\x00\x00\x00"
+        b"\x00"
+        b"\x01"
+    )
+
+
+def test_encode_datetime_as_utc_seconds():
+    encoder = RowBinaryEncoder(["Nullable(DateTime)"])
+    aware = datetime.datetime(1970, 1, 1, 1, tzinfo=datetime.timezone.utc)
+    naive = datetime.datetime(1970, 1, 1, 0, 0, 2)  # noqa: DTZ001
+    assert encoder.encode([[aware], [naive]]) == (
+        b"\x00\x10\x0e\x00\x00"
+        b"\x00\x02\x00\x00\x00"
+    )
+
+
+def test_encode_out_of_range_datetimes_clamped():
+    encoder = RowBinaryEncoder(["DateTime", "Date"])
+    pre_epoch = datetime.datetime(1960, 5, 1, tzinfo=datetime.timezone.utc)
+    late = datetime.datetime(2200, 1, 1, tzinfo=datetime.timezone.utc)
+    assert encoder.encode([[pre_epoch, pre_epoch], [late, late.date()]]) == (
+        b"\x00\x00\x00\x00\x00\x00"
+        b"\xff\xff\xff\xff\xff\xff"
+    )
+
+
+def test_encode_long_string_length_varint():
+    value = "x" * 300
+    body = RowBinaryEncoder(["String"]).encode([[value]])
+    assert body == b"\xac\x02" + value.encode()
+
+
+def test_encode_chunks_lazily():
+    encoder = RowBinaryEncoder(["Int32", "String"])
+    rows = [[i, "x" * i] for i in range(10)]
+    consumed = []
+    chunks = encoder.encode_chunks(
+        (consumed.append(row) or row for row in rows),
+        chunk_size=16,
+    )
+    first = next(chunks)
+    assert len(first) >= 16  # noqa: PLR2004
+    assert len(consumed) < len(rows)
+    assert first + b"".join(chunks) == encoder.encode(rows)
+
+
+def test_unsupported_type():
+    with pytest.raises(UnsupportedTypeError):
+        RowBinaryEncoder(["IPv4"])
@@ -0,0 +1,90 @@
+import simplejson as json
+from benchmarks.fake_clickhouse import FakeClickhouse
+from benchmarks.generator import StreamSpec, generate_messages
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.target import TargetClickhouse
+
+
+def test_exchange_staging_table(make_connector):
+    connector, statements = make_connector(cluster_name="main")
+    connector.start_staging("db.t", 5)
+    assert connector.staging_versions == {"db.t": 5}
+
+    connector.finish_staging("db.t", "exchange")
+    assert connector.staging_versions == {}
+    assert statements == [
+        "DROP TABLE IF EXISTS db.t__staging ON CLUSTER main",
+        "CREATE TABLE db.t__staging ON CLUSTER main AS db.t",
+        "EXCHANGE TABLES db.t AND db.t__staging ON CLUSTER main",
+        "DROP TABLE IF EXISTS db.t__staging ON CLUSTER main",
+    ]
+
+
+def test_replace_partitions(monkeypatch, make_connector):
+    connector, statements = make_connector()
+    partitions = {"db.t": ["202401", "202402"], "db.t__staging": ["202402", "202403"]}
+    monkeypatch.setattr(connector, "get_partition_ids", partitions.get)
+    connector.staging_versions["db.t"] = 5
+
+    connector.finish_staging("db.t", "replace_partition")
+    assert statements == [
+        "ALTER TABLE db.t REPLACE PARTITION ID '202402' FROM db.t__staging",
+        "ALTER TABLE db.t REPLACE PARTITION ID '202403' FROM db.t__staging",
+        "ALTER TABLE db.t DROP PARTITION ID '202401'",
+        "DROP TABLE IF EXISTS db.t__staging",
+    ]
+
+
+def test_abandon_staging_keeps_rows(make_connector):
+    connector, statements = make_connector()
+    connector.staging_versions["t"] = 5
+
+    connector.abandon_staging("t")
+    assert connector.staging_versions == {}
+    assert statements == [
+        "INSERT INTO t SELECT * FROM t__staging",
+        "DROP TABLE IF EXISTS t__staging",
+    ]
+
+
+def test_record_first_versions_are_staged(monkeypatch, connection_config):
+    statements = []
+    execute_ddl = ClickhouseConnector._execute_ddl  # noqa: SLF001
+
+    def record_ddl(connector, statement):
+        statements.append(statement)
+        execute_ddl(connector, statement)
+
+    monkeypatch.setattr(ClickhouseConnector, "_execute_ddl", record_ddl)
+    schema, *records, state = generate_messages(StreamSpec(records=4, width=2))
+    stream = schema["stream"]
+    messages = [schema]
+    # Two syncs of a full table stream, without leading ACTIVATE_VERSION messages.
+    for version in (7, 8):
+        messages += [{**record, "version": version} for record in records]
+        messages.append(
+            {"type": "ACTIVATE_VERSION", "stream": stream, "version": version},
+        )
+    messages.append(state)
+
+    with FakeClickhouse() as fake:
+        target = TargetClickhouse(
+            config={
+                **connection_config,
+                "host": "127.0.0.1",
+                "port": fake.port,
+                "refresh_mode": "exchange",
+            },
+        )
+        target.listen(json.dumps(message) for message in messages)
+        assert fake.stats.inserts == 2  # noqa: PLR2004
+
+    assert target.target_connector.activated_versions == {"benchmark": 8}
+    staging = [
+        "DROP TABLE IF EXISTS benchmark__staging",
+        "CREATE TABLE benchmark__staging AS benchmark",
+        "EXCHANGE TABLES benchmark AND benchmark__staging",
+        "DROP TABLE IF EXISTS benchmark__staging",
+    ]
+    assert statements == staging * 2
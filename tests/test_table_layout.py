@@ -0,0 +1,75 @@
+import sqlalchemy
+from clickhouse_sqlalchemy import Table
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.engine_class import SupportedEngines, create_engine_wrapper
+
+
+def _engine_ddl(connector, engine):
+    table = Table(
+        "events",
+        sqlalchemy.MetaData(),
+        sqlalchemy.Column("id", clickhouse_sqlalchemy_types.Int64, primary_key=True),
+        sqlalchemy.Column("created_at", clickhouse_sqlalchemy_types.DateTime),
+        engine,
+    )
+    ddl = str(sqlalchemy.schema.CreateTable(table).compile(dialect=connector._dialect))  # noqa: SLF001
+    return " ".join(ddl.split("ENGINE = ")[1].split())
+
+
+def test_table_layout(connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    engine = create_engine_wrapper(
+        SupportedEngines.MERGE_TREE,
+        ["id"],
+        "events",
+        config={},
+        table_layout={
+            "partition_by": "toYYYYMM(created_at)",
+            "order_by": ["id", "toDate(created_at)"],
+            "primary_key": ["id"],
+            "ttl": ["created_at + INTERVAL 1 YEAR"],
+            "settings": {"index_granularity": 4096, "storage_policy": "hot_cold"},
+        },
+    )
+    assert _engine_ddl(connector, engine) == (
+        "MergeTree() PARTITION BY toYYYYMM(created_at) "
+        "ORDER BY (id, toDate(created_at)) PRIMARY KEY id "
+        "TTL created_at + INTERVAL 1 YEAR "
+        "SETTINGS index_granularity=4096, storage_policy='hot_cold'"
+    )
+
+
+def test_table_layout_defaults(connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    engine = create_engine_wrapper(SupportedEngines.MERGE_TREE, ["id"], "events", {})
+    assert _engine_ddl(connector, engine) == "MergeTree() ORDER BY id PRIMARY KEY id"
+
+    engine = create_engine_wrapper(
+        SupportedEngines.MERGE_TREE,
+        [],
+        "events",
+        config={},
+        order_by_keys=["created_at"],
+        table_layout={"primary_key": ["created_at"]},
+    )
+    assert _engine_ddl(connector, engine) == (
+        "MergeTree() ORDER BY created_at PRIMARY KEY created_at"
+    )
+
+
+def test_get_table_layout(connection_config):
+    connector = ClickhouseConnector(
+        config={
+            **connection_config,
+            "table_layouts": {"events": {"partition_by": "toYYYYMM(created_at)"}},
+        },
+    )
+    assert connector.get_table_layout("events", ["id"]) == {
+        "partition_by": "toYYYYMM(created_at)",
+    }
+    assert connector.get_table_layout("users", ["country", "id"]) == {
+        "partition_by": "(country, id)",
+    }
+    assert connector.get_table_layout("users") == {}
@@ -0,0 +1,162 @@
+import sqlalchemy
+from clickhouse_sqlalchemy import Table
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.engine_class import SupportedEngines, create_engine_wrapper
+from target_clickhouse.sinks import ClickhouseSink
+from target_clickhouse.target import TargetClickhouse
+
+
+def _engine_clause(connector, engine):
+    table = Table(
+        "t",
+        sqlalchemy.MetaData(),
+        sqlalchemy.Column("id", clickhouse_sqlalchemy_types.Int64, primary_key=True),
+        sqlalchemy.Column("_sdc_row_version", clickhouse_sqlalchemy_types.UInt64),
+        sqlalchemy.Column("_sdc_is_deleted", clickhouse_sqlalchemy_types.UInt8),
+        engine,
+    )
+    ddl = str(sqlalchemy.schema.CreateTable(table).compile(dialect=connector._dialect))  # noqa: SLF001
+    return ddl.split("ENGINE = ")[1].splitlines()[0]
+
+
+def test_replacing_engines_with_is_deleted(connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    tombstone_columns = {
+        "version_column": "_sdc_row_version",
+        "is_deleted_column": "_sdc_is_deleted",
+    }
+
+    engine = create_engine_wrapper(
+        SupportedEngines.REPLACING_MERGE_TREE,
+        ["id"],
+        "t",
+        config={},
+        **tombstone_columns,
+    )
+    assert _engine_clause(connector, engine) == (
+        "ReplacingMergeTree(_sdc_row_version, _sdc_is_deleted)"
+    )
+
+    engine = create_engine_wrapper(
+        SupportedEngines.REPLICATED_REPLACING_MERGE_TREE,
+        ["id"],
+        "t",
+        config={"table_path": "/tables/$table_name", "replica_name": "r1"},
+        **tombstone_columns,
+    )
+    assert _engine_clause(connector, engine) == (
+        "ReplicatedReplacingMergeTree('/tables/t', 'r1', "
+        "_sdc_row_version, _sdc_is_deleted)"
+    )
+
+    engine = create_engine_wrapper(
+        SupportedEngines.REPLACING_MERGE_TREE,
+        ["id"],
+        "t",
+        config={},
+    )
+    assert _engine_clause(connector, engine) == "ReplacingMergeTree()"
+
+
+def test_uses_tombstones(connection_config):
+    connector = ClickhouseConnector(
+        config={**connection_config, "soft_delete_method": "tombstone"},
+    )
+    assert connector.uses_tombstones(SupportedEngines.REPLACING_MERGE_TREE, ["id"])
+    assert not connector.uses_tombstones(SupportedEngines.REPLACING_MERGE_TREE, [])
+    assert not connector.uses_tombstones(SupportedEngines.MERGE_TREE, ["id"])
+    assert connector.uses_tombstones(
+        SupportedEngines.REPLACING_MERGE_TREE,
+        ["id", "ts"],
+        {"order_by": ["ts", "id"]},
+    )
+    assert not connector.uses_tombstones(
+        SupportedEngines.REPLACING_MERGE_TREE,
+        ["id"],
+        {"order_by": ["id", "created_at"]},
+    )
+
+
+def test_tombstone_fallback(connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    replacing = SupportedEngines.REPLACING_MERGE_TREE
+    assert connector.get_tombstone_fallback(replacing, ["id"], {}) is None
+    assert connector.get_tombstone_fallback(replacing, [], {}) == "mutation"
+    assert connector.get_tombstone_fallback(
+        SupportedEngines.MERGE_TREE,
+        ["id"],
+        {"order_by": ["created_at"]},
+    ) == "mutation"
+    assert connector.get_tombstone_fallback(
+        replacing,
+        ["id"],
+        {"order_by": ["created_at", "id"]},
+    ) == "lightweight"
+    assert connector.get_tombstone_fallback(
+        replacing,
+        ["id"],
+        {"primary_key": ["`id`"]},
+    ) is None
+
+    connector = ClickhouseConnector(
+        config={**connection_config, "order_by_keys": ["id", "created_at"]},
+    )
+    assert connector.get_tombstone_fallback(replacing, ["id"], {}) == "lightweight"
+
+
+def test_insert_tombstones(monkeypatch, make_connector):
+    connector, statements = make_connector()
+    columns = {
+        name: sqlalchemy.Column(name, sqlalchemy.types.INTEGER())
+        for name in (
+            "id",
+            "_sdc_table_version",
+            "_sdc_deleted_at",
+            "_sdc_row_version",
+            "_sdc_is_deleted",
+        )
+    }
+    monkeypatch.setattr(connector, "get_table_columns", lambda _: columns)
+
+    connector.insert_tombstones("t", "_sdc_table_version", "_sdc_deleted_at", 7)
+    assert statements == [
+        "INSERT INTO t (id, _sdc_table_version, _sdc_deleted_at, _sdc_is_deleted) "
+        "SELECT id, _sdc_table_version, now(), 1 FROM t FINAL "
+        "WHERE _sdc_table_version < 7 "
+        "AND _sdc_deleted_at IS NULL AND _sdc_is_deleted = 0",
+    ]
+
+
+def test_tombstones_fall_back_to_lightweight_deletes(monkeypatch, connection_config):
+    target = TargetClickhouse(
+        config={
+            **connection_config,
+            "hard_delete": False,
+            "soft_delete_method": "tombstone",
+            "engine_type": SupportedEngines.REPLACING_MERGE_TREE,
+            "table_layouts": {"events": {"order_by": ["created_at", "id"]}},
+        },
+    )
+    connector = target.target_connector
+    statements = []
+    monkeypatch.setattr(connector, "_execute_ddl", statements.append)
+    monkeypatch.setattr(connector, "table_exists", lambda *_: True)
+    monkeypatch.setattr(
+        connector,
+        "column_exists",
+        lambda **kwargs: kwargs["column_name"] != "_sdc_is_deleted",
+    )
+    sink = ClickhouseSink(
+        target=target,
+        stream_name="events",
+        schema={"properties": {"id": {"type": "integer"}}},
+        key_properties=["id"],
+        connector=connector,
+    )
+
+    sink.activate_version(7)
+    assert statements == [
+        "DELETE FROM events WHERE _sdc_table_version < 7",
+    ]
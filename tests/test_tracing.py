@@ -0,0 +1,67 @@
+import json
+import sys
+import threading
+import time
+
+import pytest
+
+from target_clickhouse.tracing import NULL_SPAN, SamplingProfiler, Tracer
+
+
+def test_tracing_is_off_by_default():
+    tracer = Tracer({})
+    assert tracer.span("process_batch") is NULL_SPAN
+    assert tracer.record_span("coerce") is NULL_SPAN
+    assert tracer.profiler is None
+
+
+def test_json_trace_file(tmp_path):
+    trace_file = tmp_path / "trace.json"
+    tracer = Tracer(
+        {"tracing": "json", "trace_file": str(trace_file), "trace_record_interval": 3},
+    )
+    with tracer.span("process_batch", table=tmp_path, records=5, missing=None):
+        for _ in range(7):
+            with tracer.record_span("coerce"):
+                pass
+    tracer.close()
+
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["coerce"] * 3 + ["process_batch"]
+    batch = events[-1]
+    assert batch["ph"] == "X"
+    assert batch["args"] == {"table": str(tmp_path), "records": 5}
+    assert all(batch["ts"] <= event["ts"] for event in events)
+
+
+def test_opentelemetry_requires_the_api(monkeypatch):
+    monkeypatch.setitem(sys.modules, "opentelemetry", None)
+    with pytest.raises(ImportError, match="opentelemetry-api"):
+        Tracer({"tracing": "opentelemetry"})
+
+
+def test_profiler_writes_collapsed_stacks(tmp_path):
+    profile_file = tmp_path / "profile.txt"
+    profiler = SamplingProfiler(str(profile_file), interval=0.001)
+    done = threading.Event()
+
+    def idle_worker():
+        done.wait(5)
+
+    worker = threading.Thread(target=idle_worker, name="worker")
+    worker.start()
+    profiler.start()
+    while not any(stack.startswith("worker;") for stack in list(profiler.samples)):
+        time.sleep(0.001)
+    profiler.stop()
+    done.set()
+    worker.join()
+
+    lines = profile_file.read_text().splitlines()
+    stack, count = next(line for line in lines if line.startswith("worker;")).rsplit(
+        " ",
+        1,
+    )
+    assert int(count) >= 1
+    assert "idle_worker (test_tracing.py:" in stack
+    assert not any(line.startswith("profiler;") for line in lines)
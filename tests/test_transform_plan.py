@@ -0,0 +1,60 @@
+import datetime
+import logging
+
+from singer_sdk.helpers._typing import DatetimeErrorTreatmentEnum
+
+from target_clickhouse.transform_plan import TransformPlan
+
+logger = logging.getLogger(__name__)
+
+schema = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "name": {"type": ["string", "null"]},
+        "created_at": {"type": ["string", "null"], "format": "date-time"},
+        "day": {"type": ["string", "null"], "format": "date"},
+        "tags": {"type": ["array", "null"], "items": {"type": "string"}},
+        "payload": {
+            "type": ["object", "null"],
+            "properties": {"code": {"type": "string"}},
+        },
+    },
+}
+
+
+def test_plan_only_tracks_relevant_properties():
+    plan = TransformPlan.from_schema(schema)
+    assert set(plan.coercions) == {"name", "created_at", "day", "tags", "payload"}
+    assert plan.json_keys == ["tags", "payload"]
+    assert plan.properties["created_at"].datelike_type == "date-time"
+    assert plan.properties["id"].datelike_type is None
+
+
+def test_coerce_nested_object():
+    plan = TransformPlan.from_schema(schema)
+    record = plan.coerce({"id": 1, "name": 5, "payload": {"code": 200}})
+    assert record == {"id": 1, "name": "5", "payload": {"code": "200"}}
+
+
+def test_finalize_parses_dates_and_encodes_json():
+    plan = TransformPlan.from_schema(schema)
+    record = {
+        "id": 1,
+        "created_at": "2024-03-15T10:00:00",
+        "day": "2024-03-16T00:00:00Z",
+        "tags": ["a", "b"],
+        "payload": {"code": "x"},
+    }
+    plan.finalize(record, DatetimeErrorTreatmentEnum.NULL, logger)
+    assert record["created_at"] == datetime.datetime(2024, 3, 15, 10)  # noqa: DTZ001
+    assert record["day"] == datetime.date(2024, 3, 16)
+    assert record["tags"] == '["a", "b"]'
+    assert record["payload"] == '{"code": "x"}'
+
+
+def test_finalize_nulls_invalid_dates():
+    plan = TransformPlan.from_schema(schema)
+    record = {"id": 1, "day": "not-a-date"}
+    plan.finalize(record, DatetimeErrorTreatmentEnum.NULL, logger)
+    assert record["day"] is None
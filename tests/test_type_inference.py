@@ -0,0 +1,116 @@
+from unittest.mock import MagicMock
+
+import pytest
+import sqlalchemy
+from clickhouse_sqlalchemy import types as clickhouse_sqlalchemy_types
+
+from target_clickhouse.connectors import ClickhouseConnector
+from target_clickhouse.type_inference import (
+    LOW_CARDINALITY_MIN_SAMPLE,
+    get_low_cardinality_columns,
+    widen_narrow_type,
+)
+
+
+@pytest.fixture()
+def connection_config(connection_config):
+    return {**connection_config, "narrow_types": True}
+
+
+def test_narrow_types(connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    cases = [
+        ({"type": "integer", "minimum": 0, "maximum": 200}, "UInt8"),
+        ({"type": "integer", "minimum": -1, "maximum": 200}, "Int16"),
+        ({"type": "integer", "minimum": 0, "maximum": 2**32}, "UInt64"),
+        ({"type": "integer", "minimum": 0}, "Int64"),
+        ({"type": "number", "multipleOf": 0.01, "maximum": 99999.99, "minimum": 0},
+         "Decimal(7, 2)"),
+        ({"type": "number", "multipleOf": 0.0001}, "Decimal(38, 4)"),
+        ({"type": "number"}, "FLOAT"),
+        ({"type": "string", "enum": ["a", "b"]}, "LowCardinality(String)"),
+        ({"type": "string", "maxLength": 3}, "LowCardinality(String)"),
+        ({"type": "string", "maxLength": 255}, "VARCHAR(255)"),
+    ]
+    for jsonschema_type, type_name in cases:
+        assert str(connector.to_sql_type(jsonschema_type)) == type_name
+
+
+def test_narrow_types_disabled(connection_config):
+    connector = ClickhouseConnector(
+        config={**connection_config, "narrow_types": False},
+    )
+    jsonschema_type = {"type": "integer", "minimum": 0, "maximum": 200}
+    assert str(connector.to_sql_type(jsonschema_type)) == "Int64"
+    assert str(connector.to_sql_type({"type": "number", "multipleOf": 0.01})) == (
+        "FLOAT"
+    )
+
+
+def test_dates_stay_nullable(connection_config):
+    # Dates that fail to parse are loaded as NULL, even for required properties.
+    connector = ClickhouseConnector(config=connection_config)
+    jsonschema_type = {"type": "string", "format": "date-time"}
+    assert str(connector.to_sql_type(jsonschema_type)) == "Nullable(DATETIME)"
+    assert str(connector.to_sql_type({"type": "string", "format": "date"})) == (
+        "Nullable(Date32)"
+    )
+    assert str(connector.to_sql_type(jsonschema_type, is_primary_key=True)) == (
+        "DATETIME"
+    )
+
+
+def test_widen_narrow_type(connection_config):
+    types = clickhouse_sqlalchemy_types
+    assert str(widen_narrow_type(types.UInt8(), types.Int8())) == "Int16"
+    assert str(widen_narrow_type(types.Int32(), types.UInt16())) == "Int32"
+    assert str(widen_narrow_type(types.Decimal(7, 2), types.Decimal(6, 4))) == (
+        "Decimal(9, 4)"
+    )
+    assert widen_narrow_type(types.Int64(), sqlalchemy.types.FLOAT()) is None
+
+    connector = ClickhouseConnector(config=connection_config)
+    assert str(
+        connector._get_adapted_column_type("t", "c", types.UInt8(), types.UInt16()),  # noqa: SLF001
+    ) == "UInt16"
+    assert (
+        connector._get_adapted_column_type("t", "c", types.UInt16(), types.UInt8())  # noqa: SLF001
+        is None
+    )
+
+
+def test_low_cardinality_columns():
+    records = [
+        {"country": ["US", "FR"][i % 2], "id": str(i)}
+        for i in range(LOW_CARDINALITY_MIN_SAMPLE)
+    ]
+    assert get_low_cardinality_columns(records, ["country", "id"]) == ["country"]
+    assert get_low_cardinality_columns(records[:10], ["country"]) == []
+
+
+def test_sample_column_types(monkeypatch, connection_config):
+    connector = ClickhouseConnector(config=connection_config)
+    columns = {
+        "country": sqlalchemy.Column("country", clickhouse_sqlalchemy_types.String()),
+        "name": sqlalchemy.Column("name", clickhouse_sqlalchemy_types.String()),
+    }
+    monkeypatch.setattr(connector, "get_table_columns", lambda _: columns)
+    records = [
+        {"country": ["US", "FR"][i % 2], "name": f"user {i}"}
+        for i in range(LOW_CARDINALITY_MIN_SAMPLE)
+    ]
+
+    # Tables that were not created by this run are not sampled.
+    connector.sample_column_types("t", records)
+    connector.sampled_tables.add("t")
+    ddl = []
+    monkeypatch.setattr(
+        connector,
+        "get_table_alter_ddl",
+        lambda _, add, modify: ddl.append((add, [str(c.type) for c in modify])),
+    )
+    monkeypatch.setattr(connector, "_connect", MagicMock())
+    connector.sample_column_types("t", records)
+    connector.sample_column_types("t", records)
+    assert ddl == [([], ["LowCardinality(String)"])]
+
@@ -1,8 +1,12 @@
 import logging
 
+import pytest
 from jsonschema import Draft7Validator
+from singer_sdk.exceptions import InvalidRecord
+from singer_sdk.sinks.core import JSONSchemaValidator
 
 from target_clickhouse.sinks import pre_validate_for_string_type
+from target_clickhouse.validation import RecordValidator, compile_schema
 
 # Schema definitions
 schema = {
@@ -187,3 +191,69 @@ def test_list_of_dicts_conversion():
     assert isinstance(pre_validated_record["variations"][1]["size"], str), (
         "The 'size' should have been converted to a string."
     )
+
+
+def test_compiled_validator_agrees_with_jsonschema():
+    invalid_records = [
+        {"name": "John"},
+        {"name": 1, "age": 30},
+        {"name": "John", "age": True},
+        {"name": "John", "variations": [{"qty": 1.5}]},
+        {"name": "John", "variations": {"qty": 1}},
+        {"name": None, "variations": [None, {"is_number": 0}]},
+    ]
+    valid_records = [
+        {"name": None, "age": 30.5},
+        {"name": "John", "age": 30, "extra": [1]},
+        {"name": "John", "variations": [None, {"qty": 2.0, "is_number": True}]},
+        {"name": "John", "variations": None},
+    ]
+    for test_schema in (schema, list_schema):
+        check = compile_schema(test_schema)[1]
+        for record in invalid_records + valid_records:
+            assert check(record) == Draft7Validator(test_schema).is_valid(record)
+
+
+def test_compiled_validator_raises_jsonschema_errors():
+    record = {"name": "John", "age": "30"}
+    with pytest.raises(InvalidRecord) as compiled:
+        RecordValidator(schema).validate(record)
+    with pytest.raises(InvalidRecord) as generic:
+        JSONSchemaValidator(schema).validate(record)
+    assert compiled.value.error_message == generic.value.error_message
+
+
+def test_compiled_validator_caches_schemas():
+    assert compile_schema(nested_schema) is compile_schema(dict(nested_schema))
+
+
+def test_uncompiled_keywords_fall_back_to_jsonschema():
+    multiple_schema = {
+        "type": "object",
+        "properties": {"qty": {"type": "integer", "multipleOf": 5}},
+    }
+    check = compile_schema(multiple_schema)[1]
+    assert check({"qty": 10})
+    assert not check({"qty": 12})
+
+    ref_schema = {
+        "type": "object",
+        "properties": {"qty": {"$ref": "#/$defs/qty"}},
+        "$defs": {"qty": {"type": "integer"}},
+    }
+    check = compile_schema(ref_schema)[1]
+    assert check({"qty": 10})
+    assert not check({"qty": "10"})
+
+
+def test_sampled_validation():
+    validator = RecordValidator(schema, sample_interval=3)
+    validator.validate({"name": "John", "age": 30})
+    # Not sampled.
+    validator.validate({"name": "John", "age": "30"})
+    # Not sampled, but has a property missing from the schema.
+    with pytest.raises(InvalidRecord):
+        validator.validate({"age": 30, "nickname": "J"})
+    # Sampled.
+    with pytest.raises(InvalidRecord):
+        validator.validate({"name": "John", "age": "30"})